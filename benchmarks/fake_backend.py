@@ -0,0 +1,205 @@
+"""In-memory stand-in for the Supabase client, covering the queries bot.py makes.
+
+Swap it in with `bot.supabase = FakeSupabase(tables)`. Queries go through
+bot.db_execute exactly as real ones do (thread pool, deadlines, metrics);
+only the HTTP round trip is replaced by a lookup plus an optional delay.
+"""
+import json
+import threading
+import time
+
+# Primary keys used for upserts and for keeping rows unique
+PRIMARY_KEYS = {
+    'matches': 'match_id',
+    'player_stats': 'discord_username',
+    'player_aliases': 'alias',
+}
+
+
+class FakeResponse:
+    """The part of postgrest's APIResponse the bot reads."""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _roster(value):
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return [value]
+    return value if isinstance(value, list) else []
+
+
+class FakeQuery:
+    """Chainable query builder mirroring the postgrest builder methods bot.py uses."""
+
+    def __init__(self, backend, table):
+        self.backend = backend
+        self.table = table
+        self.path = f"/{table}"  # read by bot.describe_query
+        self.http_method = 'GET'
+        self.action = 'select'
+        self.columns = '*'
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.key_lookup = None  # primary key value from an eq filter, looked up like an index
+        self.negate_next = False
+        self.order_by = None
+        self.limit_to = None
+
+    # Actions
+    def select(self, *columns, count=None):
+        self.columns = ",".join(columns) or '*'
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.http_method, self.action, self.payload = 'POST', 'insert', rows
+        return self
+
+    def upsert(self, rows, on_conflict='', default_to_null=True, **kwargs):
+        self.http_method, self.action, self.payload = 'POST', 'upsert', rows
+        self.on_conflict = on_conflict or PRIMARY_KEYS[self.table]
+        return self
+
+    def update(self, data, **kwargs):
+        self.http_method, self.action, self.payload = 'PATCH', 'update', data
+        return self
+
+    def delete(self, **kwargs):
+        self.http_method, self.action = 'DELETE', 'delete'
+        return self
+
+    # Filters
+    def _filter(self, test):
+        if self.negate_next:
+            self.negate_next = False
+            self.filters.append(lambda row: not test(row))
+        else:
+            self.filters.append(test)
+        return self
+
+    @property
+    def not_(self):
+        self.negate_next = True
+        return self
+
+    def eq(self, column, value):
+        if column == PRIMARY_KEYS[self.table] and not self.negate_next:
+            self.key_lookup = value
+        return self._filter(lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._filter(lambda row: row.get(column) != value)
+
+    def gte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) >= value)
+
+    def lte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row.get(column) <= value)
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(lambda row: row.get(column) in values)
+
+    def is_(self, column, value):
+        expected = None if value in ('null', None) else value
+        return self._filter(lambda row: row.get(column) is expected)
+
+    def contains(self, column, value):
+        wanted = _roster(value)
+        return self._filter(lambda row: all(item in _roster(row.get(column)) for item in wanted))
+
+    # Modifiers
+    def order(self, column, desc=False, **kwargs):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count, **kwargs):
+        self.limit_to = count
+        return self
+
+    def execute(self):
+        return self.backend.execute(self)
+
+
+class FakeSupabase:
+    """Thread-safe in-memory tables with an optional per-call latency.
+
+    `calls` records (method, table) for every executed query, so benchmarks
+    and budget checks can count round trips.
+    """
+
+    def __init__(self, tables=None, latency=0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.tables = {name: {} for name in PRIMARY_KEYS}
+        self.calls = []
+        for name, rows in (tables or {}).items():
+            key = PRIMARY_KEYS[name]
+            self.tables[name] = {row[key]: dict(row) for row in rows}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def reset_calls(self):
+        self.calls = []
+
+    def execute(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls.append((query.http_method, query.table))
+            rows = self.tables[query.table]
+            if query.action == 'select':
+                return FakeResponse(self._select(rows, query))
+            if query.action in ('insert', 'upsert'):
+                return FakeResponse(self._write(rows, query))
+            matched = self._matching(rows, query)
+            if query.action == 'update':
+                for row in matched:
+                    row.update(query.payload)
+                return FakeResponse([dict(row) for row in matched])
+            key = PRIMARY_KEYS[query.table]
+            for row in matched:
+                del rows[row[key]]
+            return FakeResponse(matched)
+
+    def _matching(self, rows, query):
+        if query.key_lookup is not None:
+            candidates = [rows[query.key_lookup]] if query.key_lookup in rows else []
+        else:
+            candidates = rows.values()
+        return [row for row in candidates if all(test(row) for test in query.filters)]
+
+    def _select(self, rows, query):
+        result = self._matching(rows, query)
+        if query.order_by:
+            column, desc = query.order_by
+            result.sort(key=lambda row: (row.get(column) is not None, row.get(column)), reverse=desc)
+        if query.limit_to is not None:
+            result = result[:query.limit_to]
+        # Hand out copies, like rows decoded from a fresh HTTP response
+        if query.columns == '*':
+            return [dict(row) for row in result]
+        columns = [column.strip() for column in query.columns.split(',')]
+        return [{column: row.get(column) for column in columns} for row in result]
+
+    def _write(self, rows, query):
+        payload = query.payload if isinstance(query.payload, list) else [query.payload]
+        key = query.on_conflict or PRIMARY_KEYS[query.table]
+        written = []
+        for new_row in payload:
+            existing = rows.get(new_row[key])
+            if query.action == 'insert' and existing is not None:
+                raise ValueError(f"duplicate key {new_row[key]!r} in {query.table}")
+            if existing is not None:
+                # Columns missing from the payload keep their values, as in a merge-duplicates upsert
+                existing.update(new_row)
+            else:
+                rows[new_row[key]] = dict(new_row)
+            written.append(dict(rows[new_row[key]]))
+        return written
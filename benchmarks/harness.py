@@ -0,0 +1,122 @@
+"""Shared setup for the benchmarks: importing bot.py offline and synthetic guild data."""
+import itertools
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Small, medium and large guild histories
+SIZES = {
+    'small': {'players': 500, 'matches': 1_000},
+    'medium': {'players': 5_000, 'matches': 10_000},
+    'large': {'players': 50_000, 'matches': 100_000},
+}
+
+
+def load_bot():
+    """Import bot.py without connecting to Discord or Supabase.
+
+    The Supabase client is built from placeholder settings and must be
+    replaced (see use_backend) before any query runs. The write journal,
+    queue snapshot and warm cache go to a temporary directory and the
+    metrics endpoint is turned off.
+    """
+    os.environ.setdefault('DISCORD_TOKEN', 'benchmark')
+    os.environ.setdefault('SUPABASE_URL', 'http://localhost')
+    os.environ.setdefault('SUPABASE_KEY', 'benchmark.key.placeholder')
+    os.environ.setdefault('METRICS_PORT', '0')
+    state_dir = tempfile.mkdtemp(prefix='lof-bench-')
+    os.environ.setdefault('JOURNAL_PATH', os.path.join(state_dir, 'journal.db'))
+    os.environ.setdefault('QUEUE_SNAPSHOT_PATH', os.path.join(state_dir, 'queue.json'))
+    os.environ.setdefault('WARM_CACHE_PATH', os.path.join(state_dir, 'warm_cache.bin'))
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    import bot
+    return bot
+
+
+async def use_backend(bot, backend):
+    """Point bot.py at `backend` and rebuild every in-memory cache from it."""
+    bot.supabase = backend
+    bot.player_identity = bot.PlayerIdentityIndex()
+    bot.player_name_index = bot.PlayerNameIndex()
+    bot.player_stats_cache.clear()
+    bot.player_data_versions.clear()
+    bot.recent_results.clear()
+    bot.recent_match_winners.clear()
+    bot.render_cache = bot.RenderCache()
+    bot.hot_reads.invalidate()
+    await bot.load_player_identities()
+    bot.match_store = bot.MatchStore()
+    await bot.match_store.sync()
+
+
+def generate_history(players, matches, pending=0, seed=0):
+    """Build player_stats and matches rows for a synthetic guild.
+
+    Matches draw 10 players from a skewed activity distribution (a few regulars
+    play most games) and are replayed in order, so recent form and streaks are
+    consistent with the history. The last `pending` matches have no winner yet.
+    Returns {'player_stats': [...], 'matches': [...], 'player_aliases': []}.
+    """
+    rng = random.Random(seed)
+    names = [f"Player{i:05d}" for i in range(players)]
+    player_numbers = {name: number for number, name in enumerate(names)}
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) ** 0.8 for rank in range(players)))
+    stats = {}
+    match_rows = []
+    start = datetime(2025, 1, 1)
+    step = timedelta(days=365) / max(matches, 1)
+
+    for number in range(matches):
+        roster = set()
+        while len(roster) < 10:
+            roster.update(rng.choices(names, cum_weights=cum_weights, k=10 - len(roster)))
+        roster = list(roster)
+        rng.shuffle(roster)
+        created_at = (start + step * number).isoformat()
+        winner = None if number >= matches - pending else rng.choice(('team1', 'team2'))
+        match_rows.append({
+            'match_id': f"M{number:07d}",
+            'team1_name': "Blue Side",
+            'team2_name': "Red Side",
+            'team1_players': roster[:5],
+            'team2_players': roster[5:],
+            'winner': winner,
+            'created_at': created_at,
+            'updated_by': None if winner is None else "Benchmark",
+        })
+        if winner is None:
+            continue
+
+        for index, name in enumerate(roster):
+            won = (index < 5) == (winner == 'team1')
+            row = stats.setdefault(name, {
+                'player_id': f"p{player_numbers[name]:05d}",
+                'discord_username': name,
+                'display_name': name,
+                'total_matches': 0, 'wins': 0, 'losses': 0, 'win_rate': 0.0,
+                'recent_form': '', 'current_streak': 0, 'streak_type': '', 'longest_win_streak': 0,
+            })
+            row['total_matches'] += 1
+            row['wins'] += won
+            row['losses'] += not won
+            row['win_rate'] = round(row['wins'] / row['total_matches'] * 100, 2)
+            row['recent_form'] = (row['recent_form'] + ('W' if won else 'L'))[-5:]
+            streak_type = 'WIN' if won else 'LOSS'
+            row['current_streak'] = row['current_streak'] + 1 if row['streak_type'] == streak_type else 1
+            row['streak_type'] = streak_type
+            if won:
+                row['longest_win_streak'] = max(row['longest_win_streak'], row['current_streak'])
+            row['last_played'] = created_at
+
+    return {'player_stats': list(stats.values()), 'matches': match_rows, 'player_aliases': []}
+
+
+def active_players(history, count):
+    """The `count` players with the most games, most active first."""
+    rows = sorted(history['player_stats'], key=lambda row: row['total_matches'], reverse=True)
+    return [row['discord_username'] for row in rows[:count]]
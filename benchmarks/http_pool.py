@@ -0,0 +1,143 @@
+"""Compare the default httpx client with the bot's tuned Supabase connection pool.
+
+Runs a local mock PostgREST server that charges a fixed cost for every new
+connection (standing in for the TCP + TLS handshake) and a smaller cost per
+request, then replays bursts of concurrent queries separated by idle gaps,
+the way command traffic arrives. Usage:
+
+    python benchmarks/http_pool.py [--bursts 5] [--burst-size 10] [--idle 6]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+
+class MockPostgrestHandler(BaseHTTPRequestHandler):
+    """Answers every GET with an empty JSON array over keep-alive HTTP/1.1."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body are separate writes
+    connect_delay = 0.0
+    request_delay = 0.0
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+        time.sleep(self.connect_delay)
+
+    def do_GET(self):
+        time.sleep(self.request_delay)
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(connect_ms, request_ms):
+    """Start the mock server on a free local port and return it."""
+    handler = type("Handler", (MockPostgrestHandler,), {
+        "connect_delay": connect_ms / 1000,
+        "request_delay": request_ms / 1000
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def default_client(base_url, workers):
+    """The client supabase-py and postgrest-py build when left alone.
+
+    HTTP/2, a 120s timeout and httpx's default pool, whose idle connections
+    expire after 5s. The mock server is plain HTTP/1.1, so neither client
+    negotiates HTTP/2 here and the comparison is about pooling alone.
+    """
+    return httpx.Client(base_url=base_url, timeout=120, http2=True, follow_redirects=True)
+
+
+def tuned_client(base_url, workers, keepalive=60.0):
+    """The client build_http_client in bot.py builds."""
+    return httpx.Client(
+        base_url=base_url,
+        timeout=httpx.Timeout(10.0, connect=5.0),
+        limits=httpx.Limits(max_connections=workers, max_keepalive_connections=workers, keepalive_expiry=keepalive),
+        http2=True,
+        follow_redirects=True
+    )
+
+
+def timed_get(client):
+    start = time.perf_counter()
+    client.get("/rest/v1/player_stats", params={"select": "*"}).raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_scenario(name, client, server, args, warm):
+    """Replay the bursts through `client` on a pool of `args.workers` threads."""
+    latencies = []
+    connections_before = server.connections
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        if warm:
+            list(executor.map(lambda _: timed_get(client), range(args.workers)))
+        warm_connections = server.connections - connections_before
+        for burst in range(args.bursts):
+            if burst:
+                time.sleep(args.idle)
+            latencies.extend(executor.map(lambda _: timed_get(client), range(args.burst_size)))
+    client.close()
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "new_connections": server.connections - connections_before - warm_connections,
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        "max_ms": round(latencies[-1], 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--burst-size", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=10, help="matches DB_MAX_WORKERS")
+    parser.add_argument("--idle", type=float, default=6.0, help="seconds between bursts")
+    parser.add_argument("--connect-ms", type=float, default=40.0, help="simulated handshake cost")
+    parser.add_argument("--request-ms", type=float, default=5.0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    server = start_mock_server(args.connect_ms, args.request_ms)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        results = [
+            run_scenario("default", default_client(base_url, args.workers), server, args, warm=False),
+            run_scenario("tuned+warm", tuned_client(base_url, args.workers), server, args, warm=True)
+        ]
+    finally:
+        server.shutdown()
+
+    for result in results:
+        print(f"{result['scenario']:>12}: mean {result['mean_ms']:7.2f}ms  p50 {result['p50_ms']:7.2f}ms  "
+              f"p95 {result['p95_ms']:7.2f}ms  max {result['max_ms']:7.2f}ms  new connections {result['new_connections']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
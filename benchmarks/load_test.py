@@ -0,0 +1,360 @@
+"""Drive the bot's command and button handlers under load with fake Discord objects.
+
+Operations arrive open-loop (Poisson) at each target rate for `--duration`
+seconds: queue joins by command and by button, queue leaves, result button
+clicks and the read commands. The backend is the in-memory stand-in with a
+per-query delay, so database workers saturate the way they would in
+production. For each rate the harness reports achieved throughput, how long
+handlers took to acknowledge (Discord fails an interaction not acknowledged
+within 3 seconds), and total handler latency. Usage:
+
+    python benchmarks/load_test.py [--rates 10 50 100 200] [--duration 10]
+                                   [--latency-ms 40] [--discord-ms 0] [--output load.json]
+"""
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import random
+import time
+
+from fake_backend import FakeSupabase
+from harness import active_players, generate_history, load_bot, use_backend
+
+bot = load_bot()
+
+INTERACTION_DEADLINE = 3.0  # seconds Discord waits for an acknowledgement
+_ids = itertools.count(10**17)
+
+
+class Probe:
+    """Times one operation: when it was first acknowledged and when it finished."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.acked = None
+
+    def ack(self):
+        if self.acked is None:
+            self.acked = time.perf_counter()
+
+
+class FakeRole:
+    def __init__(self, guild, name):
+        self.guild = guild
+        self.name = name
+        self.id = next(_ids)
+        self.position = len(guild.roles)
+        guild.roles.append(self)
+
+
+class FakeMember:
+    def __init__(self, name, roles):
+        self.id = next(_ids)
+        self.name = name
+        self.display_name = name
+        self.roles = roles
+        self.mention = f"<@{self.id}>"
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class FakeMessage:
+    def __init__(self, channel):
+        self.id = next(_ids)
+        self.channel = channel
+
+    async def edit(self, **kwargs):
+        await self.channel.guild.discord_call()
+
+
+class FakeChannel:
+    def __init__(self, guild, name):
+        self.id = next(_ids)
+        self.guild = guild
+        self.name = name
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        await self.guild.discord_call()
+        self.sent += 1
+        probe = current_probe.get()
+        if probe is not None:
+            probe.ack()
+        return FakeMessage(self)
+
+
+class FakeGuild:
+    def __init__(self, discord_latency):
+        self.id = next(_ids)
+        self.owner_id = next(_ids)
+        self.discord_latency = discord_latency
+        self.channels = []
+        self.roles = []
+        self.queue_channel = self.add_channel("customs-queue")
+        self.results_channel = self.add_channel("customs-results")
+
+    def get_member(self, user_id):
+        return None
+
+    async def query_members(self, user_ids=None, cache=False, **kwargs):
+        await self.discord_call()
+        return []
+
+    def add_channel(self, name):
+        channel = FakeChannel(self, name)
+        self.channels.append(channel)
+        return channel
+
+    async def discord_call(self):
+        """Stand-in for one Discord API request."""
+        if self.discord_latency:
+            await asyncio.sleep(self.discord_latency)
+
+
+class FakeInteractionResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def _respond(self):
+        if self.done:
+            raise RuntimeError("interaction already acknowledged")
+        await self.interaction.guild.discord_call()
+        self.done = True
+        self.interaction.probe.ack()
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond()
+
+    async def defer(self, **kwargs):
+        await self._respond()
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self.interaction.guild.discord_call()
+
+
+class FakeInteraction:
+    def __init__(self, guild, user, probe):
+        self.id = next(_ids)
+        self.guild = guild
+        self.user = user
+        self.channel = guild.queue_channel
+        self.message = FakeMessage(guild.results_channel)
+        self.probe = probe
+        self.response = FakeInteractionResponse(self)
+        self.followup = FakeFollowup(self)
+
+
+class FakeContext:
+    def __init__(self, guild, author, probe):
+        self.guild = guild
+        self.author = author
+        self.channel = guild.queue_channel
+        self.message = FakeMessage(self.channel)
+        self.probe = probe
+        self.interaction = None
+
+    async def send(self, content=None, **kwargs):
+        message = await self.channel.send(content, **kwargs)
+        self.probe.ack()
+        return message
+
+    async def defer(self, **kwargs):
+        # A prefix command has no interaction to defer, so discord.py sends nothing; the first send acks
+        pass
+
+
+# Lets channel sends made on an operation's behalf (e.g. from queue buttons) acknowledge it
+current_probe = contextvars.ContextVar('current_probe', default=None)
+
+
+class Scenario:
+    """A guild with players and pending matches, and the operations to run against it."""
+
+    def __init__(self, history, discord_latency):
+        self.guild = FakeGuild(discord_latency)
+        rank_roles = [FakeRole(self.guild, name) for name in bot.ROLE_TO_RANK]
+        moderator_role = FakeRole(self.guild, "Moderators")
+        self.members = [FakeMember(name, [random.choice(rank_roles)]) for name in active_players(history, 200)]
+        self.moderator = FakeMember("Benchmark Mod", [moderator_role])
+        self.pending = iter([m['match_id'] for m in history['matches'] if m['winner'] is None])
+        self.queue_view = bot.QueueView()
+
+    def member(self):
+        return random.choice(self.members)
+
+    async def join_command(self, probe):
+        ctx = FakeContext(self.guild, self.member(), probe)
+        await bot.join_queue.callback(ctx, None, random.choice(list(bot.TIER_POINTS)))
+
+    async def join_button(self, probe):
+        await self.queue_view.join_queue_button.callback(FakeInteraction(self.guild, self.member(), probe))
+
+    async def leave_button(self, probe):
+        await self.queue_view.leave_queue_button.callback(FakeInteraction(self.guild, self.member(), probe))
+
+    async def result_button(self, probe):
+        match_id = next(self.pending, None)
+        if match_id is None:
+            raise RuntimeError("ran out of pending matches; lower the rate or duration")
+        button = bot.MatchResultButton(match_id, random.choice(('team1', 'team2')))
+        await button.callback(FakeInteraction(self.guild, self.moderator, probe))
+
+    async def stats(self, probe):
+        member = self.member()
+        await bot.show_stats.callback(FakeContext(self.guild, member, probe), player_name=member.display_name)
+
+    async def leaderboard(self, probe):
+        await bot.show_leaderboard.callback(FakeContext(self.guild, self.member(), probe), 'matches')
+
+    async def head_to_head(self, probe):
+        player1, player2 = random.sample(self.members, 2)
+        await bot.head_to_head.callback(FakeContext(self.guild, player1, probe), player1.display_name, player2.display_name)
+
+    async def teammates(self, probe):
+        member = self.member()
+        await bot.show_teammates.callback(FakeContext(self.guild, member, probe), player_name=member.display_name)
+
+
+# Relative frequency of each operation in the traffic mix
+OPERATION_MIX = {
+    'join_command': 10,
+    'join_button': 20,
+    'leave_button': 5,
+    'result_button': 5,
+    'stats': 25,
+    'leaderboard': 15,
+    'head_to_head': 10,
+    'teammates': 10,
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+
+async def run_operation(scenario, name, records):
+    probe = Probe()
+    current_probe.set(probe)
+    error = None
+    try:
+        await getattr(scenario, name)(probe)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finished = time.perf_counter()
+    records.append({
+        'operation': name,
+        'ack': (probe.acked or finished) - probe.started,
+        'total': finished - probe.started,
+        'error': error,
+    })
+
+
+async def run_rate(scenario, rate, duration):
+    """Issue operations at `rate` per second for `duration` seconds and wait for them all."""
+    names, weights = zip(*OPERATION_MIX.items())
+    records = []
+    tasks = []
+    started = time.perf_counter()
+    next_at = started
+    while next_at - started < duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(run_operation(scenario, random.choices(names, weights)[0], records)))
+        next_at += random.expovariate(rate)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    acks = [r['ack'] for r in records]
+    totals = [r['total'] for r in records]
+    summary = {
+        'target_rate': rate,
+        'operations': len(records),
+        'throughput': round(len(records) / elapsed, 1),
+        'ack_p50_ms': percentile(acks, 0.5),
+        'ack_p95_ms': percentile(acks, 0.95),
+        'ack_p99_ms': percentile(acks, 0.99),
+        'total_p95_ms': percentile(totals, 0.95),
+        'total_p99_ms': percentile(totals, 0.99),
+        'ack_timeouts': sum(ack > INTERACTION_DEADLINE for ack in acks),
+        'errors': sum(r['error'] is not None for r in records),
+        'by_operation': {},
+    }
+    for name in names:
+        subset = [r for r in records if r['operation'] == name]
+        if subset:
+            summary['by_operation'][name] = {
+                'count': len(subset),
+                'ack_p95_ms': percentile([r['ack'] for r in subset], 0.95),
+                'total_p95_ms': percentile([r['total'] for r in subset], 0.95),
+                'errors': sorted({r['error'] for r in subset if r['error']}),
+            }
+    return summary
+
+
+async def drain_background_work():
+    """Let result jobs finish and stop queue timers between runs."""
+    while any(job['status'] in ('pending', 'running', 'retrying') for job in bot.result_jobs.values()):
+        await asyncio.sleep(0.05)
+    bot.cancel_queue_timer()
+    bot.player_pool.clear()
+
+
+async def main_async(args):
+    history = generate_history(args.players, args.matches, pending=args.pending)
+    await use_backend(bot, FakeSupabase(history))
+    # Latency only applies to the traffic being measured, not to loading the caches
+    bot.supabase.latency = args.latency_ms / 1000
+    scenario = Scenario(history, args.discord_ms / 1000)
+
+    results = []
+    for rate in args.rates:
+        summary = await run_rate(scenario, rate, args.duration)
+        await drain_background_work()
+        results.append(summary)
+        print(f"rate {rate:>5}/s -> {summary['throughput']:>6}/s  ack p50 {summary['ack_p50_ms']}ms "
+              f"p95 {summary['ack_p95_ms']}ms p99 {summary['ack_p99_ms']}ms  total p99 {summary['total_p99_ms']}ms  "
+              f"timeouts {summary['ack_timeouts']}  errors {summary['errors']}")
+        for name, stats in summary['by_operation'].items():
+            print(f"    {name:<14} n={stats['count']:<5} ack p95 {stats['ack_p95_ms']}ms  total p95 {stats['total_p95_ms']}ms"
+                  + (f"  errors: {'; '.join(stats['errors'])}" if stats['errors'] else ""))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rates', type=float, nargs='+', default=[10, 50, 100, 200], help="operations per second")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per rate")
+    parser.add_argument('--latency-ms', type=float, default=40.0, help="delay per database query")
+    parser.add_argument('--discord-ms', type=float, default=0.0, help="delay per Discord API call")
+    parser.add_argument('--players', type=int, default=2_000)
+    parser.add_argument('--matches', type=int, default=5_000)
+    parser.add_argument('--pending', type=int, default=2_000, help="matches left open for result clicks")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    results = asyncio.run(main_async(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
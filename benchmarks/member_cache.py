@@ -0,0 +1,201 @@
+"""Measure the member cache footprint of a large synthetic guild under each cache profile.
+
+Every profile receives the same gateway traffic, fed through discord.py's own
+ConnectionState parsers with that profile's client options, and the memory
+its Guild and Member objects hold is measured with tracemalloc:
+
+    GUILD_CREATE         a large guild, which carries only the bot's own member
+    GUILD_MEMBERS_CHUNK  the whole member list, if the profile chunks at startup
+                         (with presences if it has that intent), plus a
+                         one-member chunk for each queue player who isn't cached
+                         yet, as cache_queue_member asks for
+    GUILD_MEMBER_UPDATE  renames and role changes for a share of the members;
+                         under lean these add the members they name to the cache
+
+Profiles:
+
+    before  members and presences intents, every member chunked and cached
+    full    MEMBER_CACHE_PROFILE=full: every member chunked, no presences
+    lean    MEMBER_CACHE_PROFILE=lean: no chunking, members cached as events name them
+
+The size of the events each profile receives stands in for its startup and
+steady-state gateway bandwidth. Usage:
+
+    python benchmarks/member_cache.py [--members 100000] [--queue-players 500] [--update-share 0.05]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import tracemalloc
+
+import discord
+from discord.state import ChunkRequest, ConnectionState
+
+from harness import load_bot
+
+bot = load_bot()
+
+GUILD_ID = 900000000000000000
+BOT_USER_ID = 10**17 - 1
+CHUNK_SIZE = 1000  # members per GUILD_MEMBERS_CHUNK, as Discord sends them
+
+
+def client_options(profile):
+    if profile == 'before':
+        intents = discord.Intents.default()
+        intents.message_content = True
+        intents.members = True
+        intents.presences = True
+        return {'intents': intents, 'member_cache_flags': discord.MemberCacheFlags.from_intents(intents)}
+    return bot.build_client_options(profile)
+
+
+def role_payloads():
+    names = ['@everyone', *bot.ROLE_TO_RANK, 'Moderators']
+    return [
+        {'id': str(GUILD_ID + index), 'name': name, 'position': index, 'permissions': '0',
+         'color': 0, 'hoist': False, 'managed': False, 'mentionable': False}
+        for index, name in enumerate(names)
+    ]
+
+
+def member_payload(rng, number, role_ids):
+    user_id = str(10**17 + number)
+    return {
+        'user': {'id': user_id, 'username': f"member{number}", 'discriminator': '0',
+                 'global_name': f"Member {number}", 'avatar': f"{rng.getrandbits(128):032x}"},
+        'nick': f"Nick{number}" if rng.random() < 0.3 else None,
+        'roles': rng.sample(role_ids, rng.randint(1, 3)),
+        'joined_at': '2024-01-01T00:00:00+00:00',
+        'deaf': False,
+        'mute': False,
+        'flags': 0,
+    }
+
+
+def presence_payload(rng, member):
+    activities = []
+    if rng.random() < 0.5:
+        activities.append({'name': 'League of Legends', 'type': 0, 'created_at': 1700000000000,
+                           'state': 'In Game', 'details': "Summoner's Rift (Ranked)"})
+    return {'user': {'id': member['user']['id']}, 'status': rng.choice(('online', 'idle', 'dnd')),
+            'client_status': {'desktop': 'online'}, 'activities': activities}
+
+
+def guild_create_payload(members, roles):
+    """GUILD_CREATE for a guild over the large threshold: only the bot's own member is included."""
+    bot_member = {
+        'user': {'id': str(BOT_USER_ID), 'username': 'leagueofflex', 'discriminator': '0', 'avatar': None, 'bot': True},
+        'roles': [], 'joined_at': '2024-01-01T00:00:00+00:00', 'deaf': False, 'mute': False, 'flags': 0,
+    }
+    return {
+        'id': str(GUILD_ID), 'name': 'Synthetic Guild', 'owner_id': str(10**17), 'member_count': members,
+        'large': True, 'roles': roles, 'channels': [], 'emojis': [], 'stickers': [], 'features': [],
+        'members': [bot_member], 'presences': [],
+    }
+
+
+def chunk_events(rows, presences, nonce):
+    """The GUILD_MEMBERS_CHUNK events answering one member request."""
+    presence_by_id = {presence['user']['id']: presence for presence in presences}
+    count = max(1, -(-len(rows) // CHUNK_SIZE))
+    events = []
+    for index in range(count):
+        part = rows[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+        events.append({
+            'guild_id': str(GUILD_ID), 'members': part, 'chunk_index': index, 'chunk_count': count, 'nonce': nonce,
+            'presences': [presence_by_id[row['user']['id']] for row in part if row['user']['id'] in presence_by_id],
+        })
+    return events
+
+
+def build_traffic(members, queue_players, update_share, online_share, seed=0):
+    """Member rows, presences, queue players' member requests and member updates, shared by every profile."""
+    rng = random.Random(seed)
+    roles = role_payloads()
+    role_ids = [role['id'] for role in roles[1:]]
+    rows = [member_payload(rng, number, role_ids) for number in range(members)]
+    presences = [presence_payload(rng, row) for row in rows if rng.random() < online_share]
+    queue_rows = rng.sample(rows, min(queue_players, members))
+    updates = [dict(row, guild_id=str(GUILD_ID), nick=f"Renamed{row['user']['id'][-6:]}")
+               for row in rng.sample(rows, int(members * update_share))]
+    return {
+        'guild_create': guild_create_payload(members, roles),
+        'rows': rows,
+        'presences': presences,
+        'queue_chunks': {int(row['user']['id']): chunk_events([row], [], f"query-{row['user']['id']}") for row in queue_rows},
+        'updates': updates,
+    }
+
+
+def feed_chunks(state, loop, events):
+    """Deliver the chunks answering one request, cached the way Guild.chunk() and query_members(cache=True) cache them."""
+    request = ChunkRequest(GUILD_ID, 0, loop, state._get_guild, cache=True)
+    request.nonce = events[0]['nonce']
+    state._chunk_requests[request.nonce] = request
+    for event in events:
+        state.parse_guild_members_chunk(event)
+
+
+def measure(profile, traffic, loop):
+    options = client_options(profile)
+    intents = options['intents']
+    state = ConnectionState(dispatch=lambda *args, **kwargs: None, handlers={}, hooks={}, http=None, **options)
+    startup_chunks = []
+    if options.get('chunk_guilds_at_startup', intents.members):
+        startup_chunks = chunk_events(traffic['rows'], traffic['presences'] if intents.presences else [], 'startup')
+
+    received = [traffic['guild_create']]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    guild = discord.Guild(data=traffic['guild_create'], state=state)
+    state._add_guild(guild)
+    if startup_chunks:
+        feed_chunks(state, loop, startup_chunks)
+        received.extend(startup_chunks)
+    for user_id, events in traffic['queue_chunks'].items():
+        if guild.get_member(user_id) is None:
+            feed_chunks(state, loop, events)
+            received.extend(events)
+    for event in traffic['updates']:
+        state.parse_guild_member_update(event)
+    received.extend(traffic['updates'])
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {
+        'profile': profile,
+        'cached_members': len(guild.members),
+        'memory_mb': round(used / 2**20, 1),
+        'gateway_payload_mb': round(sum(len(json.dumps(event)) for event in received) / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=100_000)
+    parser.add_argument('--queue-players', type=int, default=500, help="members who join a queue")
+    parser.add_argument('--update-share', type=float, default=0.05, help="share of members with a member update")
+    parser.add_argument('--online-share', type=float, default=0.3, help="share of members with a presence")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    traffic = build_traffic(args.members, args.queue_players, args.update_share, args.online_share)
+    loop = asyncio.new_event_loop()
+    results = []
+    for profile in ('before', 'full', 'lean'):
+        result = measure(profile, traffic, loop)
+        results.append(result)
+        print(f"{profile:>7}: {result['cached_members']:>7} members cached  {result['memory_mb']:>8.1f} MB  "
+              f"gateway payload {result['gateway_payload_mb']:>6.1f} MB")
+    loop.close()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
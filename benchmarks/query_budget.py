@@ -0,0 +1,162 @@
+"""Check that each operation stays within its database round-trip budget.
+
+Every check runs one operation against the query-counting in-memory backend
+with cold caches, so a query issued per player or per match (an N+1 pattern)
+shows up as a count well above the budget. Exits non-zero when any operation
+goes over, which makes it usable as a CI step. Usage:
+
+    python benchmarks/query_budget.py [--verbose]
+"""
+import argparse
+import asyncio
+import sys
+
+from fake_backend import FakeSupabase
+from harness import active_players, generate_history, use_backend
+from load_test import FakeContext, FakeGuild, FakeInteraction, FakeMember, FakeRole, Probe, bot
+
+BUDGETS = {}  # check name -> (max queries, check)
+
+
+def query_budget(max_queries):
+    """Register an async check that may issue at most `max_queries` queries."""
+    def register(check):
+        BUDGETS[check.__name__] = (max_queries, check)
+        return check
+    return register
+
+
+class Guild:
+    """A fake guild with a moderator, a few regulars and some pending matches."""
+
+    def __init__(self, history):
+        self.guild = FakeGuild(0)
+        self.regulars = active_players(history, 10)
+        self.pending = iter([m['match_id'] for m in history['matches'] if m['winner'] is None])
+        self.moderator = FakeMember("Budget Mod", [FakeRole(self.guild, "Moderators")])
+        self.gold = FakeRole(self.guild, "Gold")
+
+    def context(self, name=None):
+        author = FakeMember(name or self.regulars[0], [self.gold])
+        return FakeContext(self.guild, author, Probe())
+
+    def interaction(self, user=None):
+        return FakeInteraction(self.guild, user or self.moderator, Probe())
+
+
+async def wait_for_result_jobs():
+    while any(job['status'] in ('pending', 'running', 'retrying') for job in bot.result_jobs.values()):
+        await asyncio.sleep(0.01)
+
+
+@query_budget(4)
+async def result_reporting(guild):
+    """update_match_result for a full 10-player match.
+
+    One read each for the match and the ten players' stats, then one write
+    each; with warm caches the stats read is skipped.
+    """
+    success, message = await bot.update_match_result(next(guild.pending), 'team1', "Budget Mod")
+    assert success, message
+
+
+@query_budget(5)
+async def result_button_click(guild):
+    """A moderator clicking a result button, including the message update afterwards."""
+    await bot.MatchResultButton(next(guild.pending), 'team2').callback(guild.interaction())
+    await wait_for_result_jobs()
+
+
+@query_budget(2)
+async def stats_command(guild):
+    await bot.show_stats.callback(guild.context(), player_name=guild.regulars[1])
+
+
+@query_budget(1)
+async def teammates_command(guild):
+    await bot.show_teammates.callback(guild.context(), player_name=guild.regulars[1])
+
+
+@query_budget(1)
+async def head_to_head_command(guild):
+    await bot.head_to_head.callback(guild.context(), guild.regulars[0], guild.regulars[1])
+
+
+@query_budget(1)
+async def leaderboard_command(guild):
+    await bot.show_leaderboard.callback(guild.context(), 'matches')
+
+
+@query_budget(1)
+async def overall_leaderboard_command(guild):
+    await bot.show_overall_leaderboard.callback(guild.context())
+
+
+@query_budget(1)
+async def bulk_player_stats(guild):
+    """Ratings for a full lobby, as used when balancing teams."""
+    await bot.get_players_stats_bulk(guild.regulars)
+
+
+@query_budget(2)
+async def match_creation(guild):
+    match_id, success = await bot.create_match("Team A", guild.regulars[:5], "Team B", guild.regulars[5:])
+    assert success, "match was not created"
+
+
+@query_budget(1)
+async def match_store_sync(guild):
+    """Loading the in-memory match store that head-to-head and teammate lookups read."""
+    assert await bot.match_store.sync(), "match store did not sync"
+
+
+def reset_caches():
+    """Drop every read cache so each check pays for its own queries."""
+    bot.player_stats_cache.clear()
+    bot.render_cache = bot.RenderCache()
+    bot.hot_reads.invalidate()
+    bot.match_store = bot.MatchStore()
+
+
+async def run_checks(verbose):
+    history = generate_history(300, 800, pending=10)
+    backend = FakeSupabase(history)
+    await use_backend(bot, backend)
+    await bot.write_journal.open()
+    guild = Guild(history)
+
+    over_budget = []
+    for name, (budget, check) in BUDGETS.items():
+        reset_caches()
+        backend.reset_calls()
+        try:
+            await check(guild)
+        except Exception as e:
+            over_budget.append(name)
+            print(f"  ERROR {name}: {type(e).__name__}: {e}")
+            continue
+        used = len(backend.calls)
+        status = "ok" if used <= budget else "OVER"
+        if used > budget:
+            over_budget.append(name)
+        print(f"  {status:<5} {name:<30} {used:>3} / {budget} queries")
+        if verbose or used > budget:
+            for method, table in backend.calls:
+                print(f"          {method} {table}")
+    return over_budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--verbose', action='store_true', help="list the queries of every check")
+    args = parser.parse_args()
+
+    over_budget = asyncio.run(run_checks(args.verbose))
+    if over_budget:
+        print(f"\n{len(over_budget)} operation(s) over budget: {', '.join(over_budget)}")
+        sys.exit(1)
+    print(f"\nAll {len(BUDGETS)} operations within budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""Time the bot's hot paths against synthetic guild histories.
+
+Every size preset is loaded into the in-memory backend, the bot's caches are
+rebuilt from it, and each benchmark runs `--repeat` times. Results are written
+as JSON; pass `--compare` with an earlier file to flag regressions. Usage:
+
+    python benchmarks/run.py [--sizes small medium large] [--repeat 5]
+                             [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from fake_backend import FakeSupabase
+from harness import SIZES, REPO_ROOT, active_players, generate_history, load_bot, use_backend
+
+bot = load_bot()
+
+NAME_INPUTS = [
+    'SERVER=EUW "Hide on bush#KR1" Faker#T1 4444#He11 Doublelift',
+    '"Player One#NA1" "Player Two#NA1" PlayerThree#EUW PlayerFour',
+    'SERVER=XX unknown#tag "quoted name" plain',
+    "Caps#EUW",
+] * 250
+
+
+async def bench_balance_teams(ctx):
+    players = [(name, "G", bot.TIER_POINTS["G"] + i % 4) for i, name in enumerate(ctx['regulars'][:10])]
+    return lambda: bot.create_balanced_teams(players)
+
+
+async def bench_overall_rating(ctx):
+    rows = list(ctx['history']['player_stats'])
+
+    async def run():
+        for row in rows:
+            bot.calculate_overall_rating(row)
+    return run
+
+
+async def bench_overall_leaderboard(ctx):
+    async def run():
+        bot.hot_reads.invalidate()
+        await bot.get_overall_leaderboard()
+    return run
+
+
+async def bench_head_to_head(ctx):
+    player1, player2 = ctx['regulars'][:2]
+    return lambda: bot.get_head_to_head_stats(player1, player2)
+
+
+async def bench_most_played_with(ctx):
+    player = ctx['regulars'][0]
+    return lambda: bot.get_most_played_with(player)
+
+
+async def bench_update_match_result(ctx):
+    pending = iter(ctx['pending_ids'])
+    return lambda: bot.update_match_result(next(pending), random.choice(('team1', 'team2')), "Benchmark")
+
+
+async def bench_parse_names(ctx):
+    async def run():
+        for text in NAME_INPUTS:
+            bot.parse_server_and_names(text)
+            bot.parse_server_and_names(text, for_multi_search=True)
+    return run
+
+
+BENCHMARKS = {
+    'create_balanced_teams': bench_balance_teams,
+    'calculate_overall_rating (all players)': bench_overall_rating,
+    'get_overall_leaderboard (uncached)': bench_overall_leaderboard,
+    'get_head_to_head_stats': bench_head_to_head,
+    'get_most_played_with': bench_most_played_with,
+    'update_match_result': bench_update_match_result,
+    'parse_server_and_names (x2000)': bench_parse_names,
+}
+
+
+def summarize(size, name, timings):
+    timings = sorted(timings)
+    return {
+        'size': size,
+        'benchmark': name,
+        'runs': len(timings),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(timings[len(timings) // 2], 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'min_ms': round(timings[0], 3),
+        'max_ms': round(timings[-1], 3),
+    }
+
+
+async def run_size(size, repeat):
+    preset = SIZES[size]
+    started = time.perf_counter()
+    history = generate_history(preset['players'], preset['matches'], pending=repeat + 1)
+    backend = FakeSupabase(history)
+    await use_backend(bot, backend)
+    print(f"[{size}] {preset['matches']} matches, {len(history['player_stats'])} players "
+          f"(setup {time.perf_counter() - started:.1f}s)")
+
+    ctx = {
+        'history': history,
+        'regulars': active_players(history, 10),
+        'pending_ids': [match['match_id'] for match in history['matches'] if match['winner'] is None],
+    }
+    results = []
+    for name, factory in BENCHMARKS.items():
+        run = await factory(ctx)
+        if name != 'update_match_result':
+            await run()  # warm-up
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await run()
+            timings.append((time.perf_counter() - start) * 1000)
+        result = summarize(size, name, timings)
+        results.append(result)
+        print(f"  {name:<40} p50 {result['p50_ms']:>10.2f}ms  p95 {result['p95_ms']:>10.2f}ms")
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """Print the change against a previous run and return the regressions."""
+    with open(baseline_path) as f:
+        baseline = {(r['size'], r['benchmark']): r for r in json.load(f)['results']}
+    regressions = []
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        before = baseline.get((result['size'], result['benchmark']))
+        if not before or not before['p50_ms']:
+            continue
+        change = result['p50_ms'] / before['p50_ms'] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  <-- regression"
+            regressions.append(result)
+        print(f"  [{result['size']}] {result['benchmark']:<40} {change:+7.1%}{flag}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['small', 'medium'], choices=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=os.path.join(REPO_ROOT, 'benchmarks', 'results', 'latest.json'))
+    parser.add_argument('--compare', help="earlier results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="p50 slowdown counted as a regression")
+    args = parser.parse_args()
+
+    async def run_all():
+        results = []
+        for size in args.sizes:
+            results.extend(await run_size(size, args.repeat))
+        return results
+
+    results = asyncio.run(run_all())
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
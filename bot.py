@@ -1,5 +1,6 @@
 
 import discord
+from discord import app_commands
 from discord.ext import commands, tasks
 from discord.ui import Button, View
 import os
@@ -8,13 +9,34 @@ from itertools import combinations
 import random
 import asyncio
 import string
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
 import json
 import urllib.parse
 import re
 import random
+import uuid
+import bisect
+import time
+import functools
+import contextlib
+import contextvars
+import sqlite3
+import importlib.util
+import sys
+import threading
+import traceback
+import weakref
+import cProfile
+import pstats
+import pickle
+import struct
+import array
 
-from supabase import create_client, Client
+import httpx
+from supabase import create_client, Client, ClientOptions
+from postgrest.exceptions import APIError
 
 load_dotenv()
 
@@ -22,19 +44,38 @@ DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Member cache profile. 'lean' caches only members seen through member events
+# and queue joins and never chunks whole guilds; 'full' chunks and caches every
+# member at startup. Nothing reads presences, so that intent is off in both.
+MEMBER_CACHE_PROFILE = os.getenv('MEMBER_CACHE_PROFILE', 'lean')
+MEMBER_CACHE_PROFILES = ('lean', 'full')
+
+def build_client_options(profile=MEMBER_CACHE_PROFILE):
+    """Intents and cache settings for a member cache profile."""
+    if profile not in MEMBER_CACHE_PROFILES:
+        raise ValueError(f"Unknown MEMBER_CACHE_PROFILE {profile!r}; use one of {', '.join(MEMBER_CACHE_PROFILES)}")
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.members = True  # display name changes are recorded as player aliases
+    intents.presences = False
+    if profile == 'full':
+        return {
+            'intents': intents,
+            'member_cache_flags': discord.MemberCacheFlags.from_intents(intents),
+            'chunk_guilds_at_startup': True
+        }
+    return {
+        'intents': intents,
+        'member_cache_flags': discord.MemberCacheFlags(joined=True, voice=False),
+        'chunk_guilds_at_startup': False,
+        'max_messages': None  # nothing handles edits or deletes of cached messages
+    }
 
-intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
-intents.presences = True
-bot = commands.Bot(command_prefix='!lf ', intents=intents, help_command=None)
+bot = commands.Bot(command_prefix='!lf ', help_command=None, **build_client_options())
 
 # Global variables
 player_pool = []
-queue_timer = None
-queue_start_time = None
+slash_commands_synced = False
 
 # Channel IDs for cross-posting
 RESULTS_CHANNEL_NAME = "✅︱customs-results"
@@ -118,23 +159,1148 @@ TEAL_COLOR = 0x1ABC9C
 # Website to plug
 WEBSITE_URL = "https://www.leagueofflex.com"
 
+# ========================= Metrics =========================
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # seconds
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9464'))  # 0 turns the endpoint off
+LOOP_LAG_INTERVAL = 0.1  # seconds
+LOOP_STALL_THRESHOLD = float(os.getenv('LOOP_STALL_THRESHOLD', '0.25'))  # seconds of lag before a stack is captured
+RECENT_STALLS_SIZE = 20
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_MAX_INVOCATIONS = 50
+PROFILE_MAX_SECONDS = 300
+
+class Histogram:
+    """Fixed-bucket histogram in the Prometheus layout, with quantile estimates."""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets  # upper bounds, ascending; the last bucket is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+    
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside the bucket that holds it."""
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return lower + (min(upper, self.max) - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+# The command or button being handled; database calls made on its behalf count against it
+current_operation = contextvars.ContextVar('current_operation', default=None)
+
+class Metrics:
+    """In-process metrics registry rendered in the Prometheus text format."""
+    
+    def __init__(self):
+        self.histograms = {}  # name -> {labels: Histogram}
+        self.counters = {}    # name -> {labels: value}
+        self.gauges = {}      # name -> (type, callable), read at render time
+        self.active_operations = weakref.WeakKeyDictionary()  # task -> operation name
+    
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(buckets)
+        histogram.observe(value)
+    
+    def inc(self, name, labels, amount=1):
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + amount
+    
+    def gauge(self, name, read, kind='gauge'):
+        self.gauges[name] = (kind, read)
+    
+    def begin(self, kind, name):
+        """Start timing a command or button and make it the current operation."""
+        operation = {'labels': (('kind', kind), ('name', name)), 'started': time.perf_counter(), 'db_calls': 0}
+        current_operation.set(operation)
+        task = asyncio.current_task()
+        if task is not None:
+            self.active_operations[task] = f"{kind} {name}"
+        return operation
+    
+    def finish(self, operation, failed=False):
+        labels = operation['labels']
+        self.observe('lf_operation_seconds', labels, time.perf_counter() - operation['started'])
+        self.observe('lf_operation_db_calls', labels, operation['db_calls'], COUNT_BUCKETS)
+        if failed:
+            self.inc('lf_operation_errors_total', labels)
+    
+    @contextlib.asynccontextmanager
+    async def track(self, kind, name):
+        """Time the body as one operation, counting it as an error if it raises."""
+        operation = self.begin(kind, name)
+        failed = True
+        try:
+            yield operation
+            failed = False
+        finally:
+            self.finish(operation, failed)
+    
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = []
+        for key, value in list(labels) + list(extra):
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+            pairs.append(f'{key}="{value}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+    
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for name, series in sorted(self.histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, n in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        for name, series in sorted(self.counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{self._labels(labels)} {value}")
+        for name, (kind, read) in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {read()}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def timed_helper(func):
+    """Record latency and raised errors for a database helper."""
+    labels = (('helper', func.__name__),)
+    
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            metrics.inc('lf_db_helper_errors_total', labels)
+            raise
+        finally:
+            metrics.observe('lf_db_helper_seconds', labels, time.perf_counter() - started)
+    return wrapper
+
+class LoopWatchdog:
+    """Helper thread that catches the event loop stalling and records what blocked it.
+    
+    monitor_loop_lag beats every LOOP_LAG_INTERVAL. When a beat is more than
+    `threshold` late, the thread grabs the loop thread's stack and the running
+    task's command, then reports the stall once the loop beats again.
+    """
+    
+    def __init__(self, threshold=LOOP_STALL_THRESHOLD):
+        self.threshold = threshold
+        self.last_beat = time.monotonic()
+        self.loop = None
+        self.loop_thread_id = None
+        self.recent = deque(maxlen=RECENT_STALLS_SIZE)
+    
+    def start(self, loop):
+        """Start watching `loop`; must be called from the loop's thread."""
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.beat()
+        threading.Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+    
+    def beat(self):
+        self.last_beat = time.monotonic()
+    
+    def _watch(self):
+        stall = None
+        while True:
+            time.sleep(self.threshold / 4)
+            beat = self.last_beat
+            if stall is not None and beat != stall['beat']:
+                stall['seconds'] = beat - stall['beat'] - LOOP_LAG_INTERVAL
+                self._report(stall)
+                stall = None
+            if stall is None and time.monotonic() - beat - LOOP_LAG_INTERVAL > self.threshold:
+                stall = self._capture(beat)
+    
+    def _capture(self, beat):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        stack = traceback.extract_stack(frame)[-20:] if frame is not None else []
+        task = asyncio.current_task(self.loop)
+        if task is None:
+            label = "loop callback"
+        else:
+            label = metrics.active_operations.get(task) or f"task {task.get_name()}"
+        return {
+            'beat': beat,
+            'label': label,
+            'where': f"{os.path.basename(stack[-1].filename)}:{stack[-1].lineno} in {stack[-1].name}" if stack else "unknown",
+            'stack': "".join(traceback.format_list(stack)),
+            'at': datetime.now()
+        }
+    
+    def _report(self, stall):
+        print(f"Event loop blocked for {stall['seconds'] * 1000:.0f}ms during {stall['label']} at {stall['where']}:\n{stall['stack']}")
+        self.recent.append(stall)
+        self.loop.call_soon_threadsafe(metrics.inc, 'lf_event_loop_stalls_total', (('operation', stall['label']),))
+
+loop_watchdog = LoopWatchdog()
+
+async def monitor_loop_lag():
+    """Measure how late the event loop wakes up from a fixed sleep, beating the watchdog."""
+    loop = asyncio.get_running_loop()
+    loop_watchdog.start(loop)
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        loop_watchdog.beat()
+        metrics.observe('lf_event_loop_lag_seconds', (), max(0.0, loop.time() - started - LOOP_LAG_INTERVAL))
+
+class CommandProfiler:
+    """Moderator-started cProfile sessions over live commands.
+    
+    A session profiles the next N invocations of one command, or everything
+    the event loop runs for T seconds, then dumps a .pstats file to
+    PROFILE_DIR and posts the top functions. Only one session runs at a time,
+    and with none running the command hooks just check `session is None`.
+    """
+    
+    def __init__(self):
+        self.session = None
+    
+    def start(self, channel, command_name=None, invocations=0, seconds=0):
+        self.session = {
+            'channel': channel,
+            'command': command_name,
+            'remaining': invocations,
+            'runs': 0,
+            'active': 0,
+            'profile': cProfile.Profile(),
+            'started': datetime.now(),
+            'timer': None
+        }
+        if seconds:
+            self.session['profile'].enable()
+            loop = asyncio.get_running_loop()
+            self.session['timer'] = loop.call_later(seconds, lambda: background_tasks.add(asyncio.create_task(self.finish())))
+    
+    def command_started(self, ctx):
+        session = self.session
+        if session['command'] != ctx.command.qualified_name or session['remaining'] <= 0:
+            return
+        session['remaining'] -= 1
+        if session['active'] == 0:
+            session['profile'].enable()
+        session['active'] += 1
+        ctx.profile_session = session
+    
+    async def command_finished(self, ctx):
+        session = getattr(ctx, 'profile_session', None)
+        if session is None or session is not self.session:
+            return
+        session['active'] -= 1
+        session['runs'] += 1
+        if session['active'] == 0:
+            session['profile'].disable()
+            if session['remaining'] == 0:
+                await self.finish()
+    
+    async def finish(self):
+        """End the session, write its .pstats file and post the summary."""
+        session, self.session = self.session, None
+        if session is None:
+            return
+        if session['timer'] is not None:
+            session['timer'].cancel()
+        session['profile'].disable()
+        
+        label = session['command'] or 'all-commands'
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{label}-{session['started']:%Y%m%d-%H%M%S}.pstats")
+            session['profile'].dump_stats(path)
+            await session['channel'].send(embed=build_profile_embed(session, path))
+        except Exception as e:
+            print(f"Error finishing profile of {label}: {e}")
+
+command_profiler = CommandProfiler()
+
+async def handle_metrics_request(reader, writer):
+    """Serve GET /metrics over a bare-bones HTTP/1.1 connection."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b'\r\n', b'\n', b''):
+            pass
+        
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[1].split(b'?')[0] == b'/metrics':
+            status, body = "200 OK", metrics.render().encode()
+        else:
+            status, body = "404 Not Found", b"Not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except Exception as e:
+        print(f"Error serving metrics: {e}")
+    finally:
+        writer.close()
+
+async def start_metrics_server():
+    """Start the Prometheus endpoint unless METRICS_PORT is 0."""
+    if not METRICS_PORT:
+        return None
+    try:
+        server = await asyncio.start_server(handle_metrics_request, METRICS_HOST, METRICS_PORT)
+        print(f"Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+        return server
+    except Exception as e:
+        print(f"Error starting metrics server: {e}")
+        return None
+
+# ========================= Player Identity =========================
+
+class PlayerIdentityIndex:
+    """In-memory casefolded map from every known alias (names and Discord user IDs) to a player.
+    
+    Each player is a shared record {'player_id': ..., 'username': ...} where username is the
+    player's key in the player_stats table, so any alias resolves to it in a single dict hit.
+    """
+    
+    def __init__(self):
+        self.aliases = {}   # alias key -> identity record
+        self.players = {}   # player_id -> identity record
+        self.loaded = False
+        self.version = 0    # bumped whenever an alias changes which player it maps to
+    
+    @staticmethod
+    def alias_key(alias):
+        """Normalize a name or Discord user ID into an alias key."""
+        if isinstance(alias, int):
+            return f"id:{alias}"
+        return str(alias).strip().casefold()
+    
+    def lookup(self, alias):
+        """Return the identity record for a name or Discord user ID, or None."""
+        return self.aliases.get(self.alias_key(alias))
+    
+    def player_key(self, name):
+        """Return a key for comparing players: the player ID if known, else the casefolded name."""
+        key = self.alias_key(name)
+        record = self.aliases.get(key)
+        return record['player_id'] if record else key
+    
+    def add_player(self, player_id, username):
+        """Add (or fetch) a player record and map its username to it."""
+        record = self.players.get(player_id)
+        if record is None:
+            record = {'player_id': player_id, 'username': username}
+            self.players[player_id] = record
+        self.aliases.setdefault(self.alias_key(username), record)
+        self.version += 1
+        return record
+    
+    def add_alias(self, alias, record):
+        """Map an alias to a player. Returns False if the alias is already taken."""
+        key = self.alias_key(alias)
+        if not key or key in self.aliases:
+            return False
+        self.aliases[key] = record
+        self.version += 1
+        return True
+    
+    def merge(self, old_record, new_record):
+        """Point every alias of old_record at new_record."""
+        for key, record in self.aliases.items():
+            if record is old_record:
+                self.aliases[key] = new_record
+        self.players.pop(old_record['player_id'], None)
+        self.version += 1
+    
+    def load(self, stats_rows, alias_rows):
+        """Rebuild the index from player_stats rows and player_aliases rows."""
+        self.aliases = {}
+        self.players = {}
+        for row in stats_rows:
+            record = self.add_player(row['player_id'], row['discord_username'])
+            display_name = row.get('display_name')
+            if display_name and display_name != "None":
+                self.add_alias(display_name, record)
+        # Stored aliases (historical names, Discord IDs, merges) take precedence.
+        # Name aliases go first so players without stats yet get a username.
+        for row in sorted(alias_rows, key=lambda r: r['alias'].startswith('id:')):
+            record = self.players.get(row['player_id'])
+            if record is None:
+                if row['alias'].startswith('id:'):
+                    continue
+                record = self.add_player(row['player_id'], row['alias'])
+            self.aliases[row['alias']] = record
+        self.loaded = True
+        self.version += 1
+
+player_identity = PlayerIdentityIndex()
+
+class _TrieNode:
+    __slots__ = ('children', 'top')
+    
+    def __init__(self):
+        self.children = {}
+        self.top = []   # best-weighted (-weight, name key) pairs under this prefix, sorted
+
+class PlayerNameIndex:
+    """Prefix trie and trigram index over known player names.
+    
+    Each trie node keeps its highest-weighted names, so a prefix lookup costs
+    O(len(prefix)) no matter how many names are indexed. Names are indexed at
+    every word start, so "bjer" finds "TSM Bjergsen". Trigrams catch typos.
+    """
+    
+    MAX_RESULTS = 25
+    MIN_SIMILARITY = 0.3
+    
+    def __init__(self):
+        self.root = _TrieNode()
+        self.trigrams = {}  # trigram -> set of name keys
+        self.names = {}     # name key -> display name
+        self.weights = {}   # name key -> weight (games played)
+    
+    @staticmethod
+    def name_trigrams(key):
+        padded = f"  {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+    
+    def add(self, name, weight=0):
+        """Index a name (or raise its weight if already indexed)."""
+        name = str(name).strip()
+        key = name.casefold()
+        if not key or (key in self.names and self.weights[key] >= weight):
+            return
+        reindex = key in self.names
+        if not reindex:
+            for trigram in self.name_trigrams(key):
+                self.trigrams.setdefault(trigram, set()).add(key)
+        self.names[key] = name
+        self.weights[key] = weight
+        
+        # Word starts can share trie paths ("aa aa", or any name at the root), so offer each node once
+        self._offer(self.root, key, weight, reindex)
+        offered = {id(self.root)}
+        starts = [0] + [i + 1 for i, char in enumerate(key) if char == ' ' and i + 1 < len(key)]
+        for start in starts:
+            node = self.root
+            for char in key[start:]:
+                node = node.children.setdefault(char, _TrieNode())
+                if id(node) not in offered:
+                    offered.add(id(node))
+                    self._offer(node, key, weight, reindex)
+    
+    def _offer(self, node, key, weight, reindex):
+        top = node.top
+        entry = (-weight, key)
+        if len(top) >= self.MAX_RESULTS and entry >= top[-1]:
+            return
+        if reindex:
+            for i, existing in enumerate(top):
+                if existing[1] == key:
+                    del top[i]
+                    break
+        bisect.insort(top, entry)
+        del top[self.MAX_RESULTS:]
+    
+    def build(self, weighted_names):
+        """Rebuild the index from (name, weight) pairs."""
+        self.__init__()
+        for name, weight in weighted_names:
+            self.add(name, weight)
+    
+    def suggest(self, query, limit=MAX_RESULTS):
+        """Return up to `limit` names: prefix matches by weight, then fuzzy matches by similarity."""
+        query = str(query or '').strip().casefold()
+        node = self.root
+        for char in query:
+            node = node.children.get(char)
+            if node is None:
+                break
+        results = [key for _, key in node.top] if node is not None else []
+        
+        if len(results) < limit and len(query) >= 2:
+            query_trigrams = self.name_trigrams(query)
+            shared = {}
+            for trigram in query_trigrams:
+                for key in self.trigrams.get(trigram, ()):
+                    shared[key] = shared.get(key, 0) + 1
+            scored = []
+            for key, count in shared.items():
+                similarity = count / (len(query_trigrams) + len(key) + 1 - count)
+                if similarity >= self.MIN_SIMILARITY and key not in results:
+                    scored.append((-similarity, -self.weights[key], key))
+            scored.sort()
+            results.extend(key for _, _, key in scored[:limit - len(results)])
+        
+        return [self.names[key] for key in results[:limit]]
+
+player_name_index = PlayerNameIndex()
+
+def name_suggestion_text(name):
+    """Return a "did you mean" hint for an unknown player name, or an empty string."""
+    if player_identity.lookup(name) is not None:
+        return ""
+    suggestions = player_name_index.suggest(name, 3)
+    if not suggestions:
+        return ""
+    return "\n💡 Did you mean: " + ", ".join(f"**{s}**" for s in suggestions) + "?"
+
+async def player_name_autocomplete(interaction: discord.Interaction, current: str):
+    """Autocomplete player names for slash commands."""
+    return [app_commands.Choice(name=name[:100], value=name[:100]) for name in player_name_index.suggest(current)]
+
+player_alias_rows = []  # player_aliases rows as last loaded, plus ones registered since (for the warm cache)
+
+def alias_row(alias, record):
+    """Build a player_aliases row for an alias."""
+    key = PlayerIdentityIndex.alias_key(alias)
+    return {'alias': key, 'player_id': record['player_id'], 'kind': 'discord_id' if key.startswith('id:') else 'name'}
+
+@timed_helper
+async def load_player_identities():
+    """Load all players and aliases into the identity index, assigning missing player IDs."""
+    try:
+        stats, aliases = await asyncio.gather(
+            db_execute(supabase.table('player_stats').select('*')),
+            db_execute(supabase.table('player_aliases').select('*'))
+        )
+        
+        missing_ids = [row for row in stats.data if not row.get('player_id')]
+        for row in missing_ids:
+            row['player_id'] = uuid.uuid4().hex
+        for i in range(0, len(missing_ids), DB_WRITE_BATCH_SIZE):
+            batch = missing_ids[i:i + DB_WRITE_BATCH_SIZE]
+            await db_execute(supabase.table('player_stats').upsert(batch, on_conflict='discord_username'))
+        
+        index_players(stats.data, aliases.data)
+        print(f"Loaded {len(player_identity.players)} players and {len(player_identity.aliases)} aliases")
+        return True
+    except Exception as e:
+        print(f"Error loading player identities: {e}")
+        return False
+
+def index_players(stats_rows, alias_rows):
+    """Rebuild the identity index, name index and stats cache from player_stats and player_aliases rows."""
+    global player_alias_rows
+    player_identity.load(stats_rows, alias_rows)
+    cache_player_stats(stats_rows)
+    player_alias_rows = list(alias_rows)
+    
+    weighted_names = []
+    for row in stats_rows:
+        weighted_names.append((row['discord_username'], row.get('total_matches', 0)))
+        if row.get('display_name') and row['display_name'] != "None":
+            weighted_names.append((row['display_name'], row.get('total_matches', 0)))
+    weighted_names.extend((row['alias'], 0) for row in alias_rows if row.get('kind') != 'discord_id')
+    player_name_index.build(weighted_names)
+
+def cache_queue_member(guild, member):
+    """Fetch a queue player into the member cache so their renames reach on_member_update."""
+    if guild is None or guild.get_member(member.id) is not None:
+        return
+    task = asyncio.create_task(_query_member(guild, member.id))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def _query_member(guild, user_id):
+    try:
+        await guild.query_members(user_ids=[user_id], cache=True)
+    except Exception as e:
+        print(f"Error caching member {user_id}: {e}")
+
+@timed_helper
+async def register_player_alias(user_id, name, create=True):
+    """Link a Discord user and the name they play under to one player identity."""
+    if not player_identity.loaded:
+        return
+    try:
+        by_id = player_identity.lookup(user_id)
+        by_name = player_identity.lookup(name)
+        
+        if by_id is not None and by_name is not None:
+            return
+        if by_id is None and not create:
+            return
+        if by_id is None and by_name is None:
+            record = player_identity.add_player(uuid.uuid4().hex, name)
+        else:
+            record = by_id or by_name
+        
+        new_aliases = [alias for alias in (user_id, name) if player_identity.add_alias(alias, record)]
+        player_name_index.add(name)
+        new_aliases.append(record['username'])
+        rows = [alias_row(alias, record) for alias in new_aliases]
+        await db_execute(supabase.table('player_aliases').upsert(rows, on_conflict='alias'))
+        player_alias_rows.extend(rows)
+    except Exception as e:
+        print(f"Error registering alias {name} for {user_id}: {e}")
+
 # ========================= Database Functions =========================
 
+# The Supabase client is synchronous, so queries run on a thread pool instead of the event loop
+DB_MAX_WORKERS = int(os.getenv('DB_MAX_WORKERS', '10'))
+db_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix='supabase')
+
+DB_TIMEOUT_SECONDS = float(os.getenv('DB_TIMEOUT_SECONDS', '10'))
+DB_READ_ATTEMPTS = 3
+DB_RETRY_BASE_DELAY = 0.2  # seconds, doubled after each failed attempt
+DB_RETRY_MAX_DELAY = 2.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30
+
+class BackendUnavailable(Exception):
+    """Raised without calling Supabase while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """Fails fast once the backend keeps failing.
+    
+    Closed, calls go through. After `threshold` consecutive failures it opens
+    and rejects calls for `reset_after` seconds, then goes half-open and lets a
+    single probe through; the probe's outcome closes or re-opens it.
+    """
+    
+    def __init__(self, threshold=BREAKER_FAILURE_THRESHOLD, reset_after=BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = 'closed'
+        self.failures = 0  # consecutive
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.counters = {'calls': 0, 'failures': 0, 'timeouts': 0, 'retries': 0, 'rejected': 0, 'opened': 0}
+    
+    def is_open(self):
+        """True while calls are being rejected outright."""
+        return self.state == 'open' and time.monotonic() - self.opened_at < self.reset_after
+    
+    def allow(self):
+        if self.state == 'open':
+            if self.is_open():
+                return False
+            self.state = 'half_open'
+        if self.state == 'half_open':
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+        return True
+    
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+        self.probe_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self.counters['failures'] += 1
+        if self.state == 'half_open' or self.failures >= self.threshold:
+            if self.state != 'open':
+                self.counters['opened'] += 1
+                print(f"Database circuit breaker opened after {self.failures} consecutive failures")
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+    
+    def snapshot(self):
+        """Current state and counters, for metrics."""
+        snapshot = {'state': 'open' if self.is_open() else self.state, 'consecutive_failures': self.failures}
+        snapshot.update(self.counters)
+        return snapshot
+
+backend_breaker = CircuitBreaker()
+metrics.gauge('lf_db_breaker_open', lambda: int(backend_breaker.is_open()))
+metrics.gauge('lf_db_breaker_consecutive_failures', lambda: backend_breaker.failures)
+for counter in backend_breaker.counters:
+    metrics.gauge(f'lf_db_breaker_{counter}_total', lambda counter=counter: backend_breaker.counters[counter], 'counter')
+
+def is_backend_fault(error):
+    """True for errors that say the backend is unhealthy rather than that the request was wrong."""
+    if isinstance(error, APIError):
+        # PostgREST answered; only gateway errors (an HTTP status instead of an error body) count
+        return re.fullmatch(r'5\d\d', str(error.code)) is not None
+    return True
+
+def is_transient_error(error):
+    """True for write failures worth replaying later: the backend was down, unreachable or too slow."""
+    if isinstance(error, (BackendUnavailable, TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    return isinstance(error, APIError) and is_backend_fault(error)
+
+def describe_query(query):
+    """Return (HTTP method, table) for a postgrest query builder."""
+    # postgrest 1.x+ keeps these on a RequestConfig; older builders carried them directly
+    request = getattr(query, 'request', query)
+    method = str(getattr(request, 'http_method', None) or 'unknown')
+    table = str(getattr(request, 'path', '')).rstrip('/').rsplit('/', 1)[-1] or 'unknown'
+    return method, table
+
+async def db_execute(query):
+    """Execute a Supabase query on the database thread pool under the backend policy.
+    
+    Reads (GET) have a deadline per attempt and are retried with jittered
+    exponential backoff. Writes run once under the HTTP client's timeout
+    only: a deadline here can't stop the worker thread, so a write that
+    missed it could still commit. BackendUnavailable is raised without
+    calling Supabase while the circuit breaker is open.
+    """
+    loop = asyncio.get_running_loop()
+    method, table = describe_query(query)
+    attempts = DB_READ_ATTEMPTS if method == 'GET' else 1
+    labels = (('method', method), ('table', table))
+    operation = current_operation.get()
+    delay = DB_RETRY_BASE_DELAY
+    for attempt in range(1, attempts + 1):
+        if not backend_breaker.allow():
+            backend_breaker.counters['rejected'] += 1
+            raise BackendUnavailable("Database is unavailable (circuit breaker open)")
+        probe = backend_breaker.state == 'half_open'
+        backend_breaker.counters['calls'] += 1
+        if operation is not None:
+            operation['db_calls'] += 1
+        
+        started = time.perf_counter()
+        try:
+            call = loop.run_in_executor(db_executor, query.execute)
+            if method == 'GET':
+                call = asyncio.wait_for(call, DB_TIMEOUT_SECONDS)
+            result = await call
+            metrics.observe('lf_db_call_seconds', labels, time.perf_counter() - started)
+            backend_breaker.record_success()
+            return result
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            backend_breaker.counters['timeouts'] += 1
+            error = TimeoutError(f"Database call timed out after {DB_TIMEOUT_SECONDS:g}s")
+        except Exception as e:
+            if not is_backend_fault(e):
+                metrics.observe('lf_db_call_seconds', labels, time.perf_counter() - started)
+                backend_breaker.record_success()
+                raise
+            error = e
+        finally:
+            # A cancelled probe records no outcome; free the slot so the next call can probe
+            if probe:
+                backend_breaker.probe_in_flight = False
+        
+        metrics.observe('lf_db_call_seconds', labels, time.perf_counter() - started)
+        metrics.inc('lf_db_call_errors_total', labels)
+        backend_breaker.record_failure()
+        if attempt == attempts or backend_breaker.is_open():
+            raise error
+        backend_breaker.counters['retries'] += 1
+        await asyncio.sleep(random.uniform(0, delay))  # full jitter
+        delay = min(delay * 2, DB_RETRY_MAX_DELAY)
+
+HTTP_KEEPALIVE_SECONDS = float(os.getenv('HTTP_KEEPALIVE_SECONDS', '60'))
+HTTP2_ENABLED = os.getenv('SUPABASE_HTTP2', 'true').lower() not in ('0', 'false', 'no')
+HTTP_WARM_CONNECTIONS = min(DB_MAX_WORKERS, int(os.getenv('HTTP_WARM_CONNECTIONS', '4')))
+
+def build_http_client():
+    """Build the Supabase client's connection pool, sized to the database thread pool.
+    
+    One connection per worker means no query waits for a socket, keep-alive
+    outlasts the quiet gaps between bursts of commands (httpx drops idle
+    connections after 5s by default), and the request timeout matches
+    DB_TIMEOUT_SECONDS so a read that hit its deadline frees its worker;
+    it is the only timeout writes get.
+    HTTP/2 stays on, as in postgrest's own client, unless SUPABASE_HTTP2=0.
+    """
+    http2 = HTTP2_ENABLED
+    if http2 and importlib.util.find_spec('h2') is None:
+        print("The h2 package isn't installed (pip install httpx[http2]); using HTTP/1.1 for Supabase")
+        http2 = False
+    
+    return httpx.Client(
+        timeout=httpx.Timeout(DB_TIMEOUT_SECONDS, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=DB_MAX_WORKERS,
+            max_keepalive_connections=DB_MAX_WORKERS,
+            keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+        ),
+        http2=http2,
+        follow_redirects=True
+    )
+
+# Initialize Supabase client
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=build_http_client()))
+
+async def warm_http_pool():
+    """Open pooled connections before the first burst of commands needs them."""
+    try:
+        await asyncio.gather(*(
+            db_execute(supabase.table('player_stats').select('discord_username').limit(1))
+            for _ in range(HTTP_WARM_CONNECTIONS)
+        ))
+    except Exception as e:
+        print(f"Error warming database connections: {e}")
+
+HOT_READ_FRESH_SECONDS = 30
+HOT_READ_STALE_SECONDS = 300
+
+class ReadCoalescer:
+    """Single-flight, stale-while-revalidate cache for hot read queries.
+    
+    Concurrent calls with the same key share one in-flight future. Results newer
+    than `fresh_for` seconds are returned as-is; results newer than `stale_for` are
+    returned immediately while one background refresh runs. Only successful
+    (data, True) results are cached, and the last good result is served if a
+    refresh fails or the circuit breaker is open. invalidate() drops everything
+    after a write.
+    """
+    
+    def __init__(self, fresh_for=HOT_READ_FRESH_SECONDS, stale_for=HOT_READ_STALE_SECONDS):
+        self.fresh_for = fresh_for
+        self.stale_for = stale_for
+        self.entries = {}    # key -> (fetched_at, result)
+        self.in_flight = {}  # (generation, key) -> future
+        self.generation = 0
+    
+    async def get(self, key, fetch):
+        entry = self.entries.get(key)
+        if entry is not None and backend_breaker.is_open():
+            return entry[1]
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.fresh_for:
+                return entry[1]
+            if age < self.stale_for:
+                self._refresh(key, fetch)
+                return entry[1]
+        # Shield the shared future so one cancelled caller doesn't cancel it for everyone
+        return await asyncio.shield(self._refresh(key, fetch))
+    
+    def _refresh(self, key, fetch):
+        flight_key = (self.generation, key)
+        future = self.in_flight.get(flight_key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(flight_key, fetch))
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self.in_flight[flight_key] = future
+        return future
+    
+    async def _load(self, flight_key, fetch):
+        generation, key = flight_key
+        try:
+            result = await fetch()
+        finally:
+            self.in_flight.pop(flight_key, None)
+        
+        if result[1]:
+            # Don't cache data that was read before a newer write invalidated it
+            if generation == self.generation:
+                self.entries[key] = (time.monotonic(), result)
+            return result
+        
+        entry = self.entries.get(key)
+        return entry[1] if entry is not None else result
+    
+    def seed(self, key, result, age):
+        """Cache a result fetched `age` seconds ago, e.g. restored from a snapshot.
+        
+        However old it is, the next read gets it at once and revalidates it.
+        """
+        self.entries[key] = (time.monotonic() - min(age, self.fresh_for), result)
+    
+    def invalidate(self):
+        self.generation += 1
+        self.entries.clear()
+
+hot_reads = ReadCoalescer()
+
+def hot_read_key(name, *args, **kwargs):
+    """The ReadCoalescer key of a call to the coalesced read function `name`."""
+    return (name, args, tuple(sorted(kwargs.items())))
+
+def coalesced_read(func):
+    """Route calls to a read-only query function through the shared ReadCoalescer."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await hot_reads.get(hot_read_key(func.__name__, *args, **kwargs), lambda: func(*args, **kwargs))
+    return wrapper
+
+# ========================= Write-Ahead Journal =========================
+
+JOURNAL_PATH = os.getenv('JOURNAL_PATH', 'lof_journal.db')
+JOURNAL_REPLAY_SECONDS = 15
+JOURNAL_RETENTION_DAYS = 7
+JOURNAL_MAX_ATTEMPTS = 5  # replay failures, while the backend is otherwise healthy, before an entry is dead-lettered
+WRITE_QUEUED = "The database is unreachable, so this was saved locally and will be written as soon as it's back."
+
+class WriteJournal:
+    """Append-only SQLite log of database mutations.
+    
+    Every mutation is appended and synced to disk before it's sent to Supabase.
+    Entries that fail against the backend form the backlog, which is replayed in
+    order; new mutations queue behind a non-empty backlog so ordering holds.
+    Entries the backend rejects, or that keep failing while it is otherwise
+    healthy, are dead-lettered: kept in the file but never replayed again.
+    SQLite runs on its own single thread, which also keeps appends in order.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.backlog = []          # seqs waiting for replay, oldest first
+        self.pending_matches = {}  # match_id -> match row not yet confirmed in the database
+        self.dead_lettered = 0     # entries dead-lettered since startup
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='journal')
+    
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+    
+    def _open(self):
+        if self.conn is not None:
+            return []
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+            "created_at TEXT NOT NULL, applied_at TEXT, outcome TEXT, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, "
+            "dead_at TEXT, stage TEXT)"
+        )
+        conn.commit()
+        self.conn = conn
+        rows = conn.execute(
+            "SELECT seq, kind, payload FROM journal WHERE applied_at IS NULL AND dead_at IS NULL ORDER BY seq"
+        ).fetchall()
+        return [(seq, kind, json.loads(payload)) for seq, kind, payload in rows]
+    
+    async def open(self):
+        """Open the journal, queueing every entry that was never confirmed as applied."""
+        entries = await self._run(self._open)
+        for seq, kind, payload in entries:
+            self.backlog.append(seq)
+            if kind == 'create_match':
+                self.pending_matches[payload['match_id']] = payload
+        if entries:
+            print(f"Write journal has {len(entries)} pending entries to replay")
+    
+    def _append(self, kind, payload):
+        cursor = self.conn.execute(
+            "INSERT INTO journal (kind, payload, created_at) VALUES (?, ?, ?)",
+            (kind, json.dumps(payload), datetime.now().isoformat())
+        )
+        self.conn.commit()
+        return cursor.lastrowid
+    
+    async def append(self, kind, payload):
+        """Durably record a mutation and return its sequence number."""
+        await self.open()
+        seq = await self._run(self._append, kind, payload)
+        if kind == 'create_match':
+            self.pending_matches[payload['match_id']] = payload
+        return seq
+    
+    def _entry(self, seq):
+        kind, payload, stage = self.conn.execute("SELECT kind, payload, stage FROM journal WHERE seq = ?", (seq,)).fetchone()
+        return kind, json.loads(payload), stage
+    
+    async def entry(self, seq):
+        """Return (kind, payload, stage) for an entry."""
+        return await self._run(self._entry, seq)
+    
+    def _mark_stage(self, seq, stage):
+        self.conn.execute("UPDATE journal SET stage = ? WHERE seq = ?", (stage, seq))
+        self.conn.commit()
+    
+    async def mark_stage(self, seq, stage):
+        """Record that part of a multi-write entry reached the backend, so replay skips it."""
+        await self._run(self._mark_stage, seq, stage)
+    
+    def _mark_applied(self, seq, outcome):
+        self.conn.execute("UPDATE journal SET applied_at = ?, outcome = ? WHERE seq = ?", (datetime.now().isoformat(), outcome, seq))
+        self.conn.commit()
+    
+    async def mark_applied(self, seq, kind, payload, outcome):
+        """Close an entry once the backend has accepted it (or refused it for good)."""
+        await self._run(self._mark_applied, seq, outcome)
+        if seq in self.backlog:
+            self.backlog.remove(seq)
+        if kind == 'create_match':
+            self.pending_matches.pop(payload['match_id'], None)
+    
+    def _mark_failed(self, seq, error, counted):
+        self.conn.execute(
+            "UPDATE journal SET attempts = attempts + ?, last_error = ? WHERE seq = ?", (int(counted), error, seq)
+        )
+        self.conn.commit()
+        return self.conn.execute("SELECT attempts FROM journal WHERE seq = ?", (seq,)).fetchone()[0]
+    
+    async def mark_failed(self, seq, error, counted=True):
+        """Record a backend failure, leave the entry in the backlog and return its attempt count.
+        
+        Failures during an outage pass counted=False so they don't use up the entry's attempts.
+        """
+        attempts = await self._run(self._mark_failed, seq, error, counted)
+        if seq not in self.backlog:
+            bisect.insort(self.backlog, seq)
+        return attempts
+    
+    def _mark_dead(self, seq, error):
+        self.conn.execute("UPDATE journal SET dead_at = ?, last_error = ? WHERE seq = ?", (datetime.now().isoformat(), error, seq))
+        self.conn.commit()
+    
+    async def mark_dead(self, seq, kind, payload, error):
+        """Give up on an entry: it stays in the file for inspection but is never replayed."""
+        await self._run(self._mark_dead, seq, error)
+        self.dead_lettered += 1
+        if seq in self.backlog:
+            self.backlog.remove(seq)
+        if kind == 'create_match':
+            self.pending_matches.pop(payload['match_id'], None)
+    
+    def _prune(self, cutoff):
+        self.conn.execute("DELETE FROM journal WHERE applied_at IS NOT NULL AND applied_at < ?", (cutoff,))
+        self.conn.commit()
+    
+    async def prune(self, days=JOURNAL_RETENTION_DAYS):
+        """Drop applied entries older than `days` so the file doesn't grow forever."""
+        cutoff = datetime.fromtimestamp(time.time() - days * 86400).isoformat()
+        await self._run(self._prune, cutoff)
+
+write_journal = WriteJournal(JOURNAL_PATH)
+metrics.gauge('lf_journal_backlog', lambda: len(write_journal.backlog))
+metrics.gauge('lf_journal_dead_letters_total', lambda: write_journal.dead_lettered, 'counter')
+journal_replay_lock = asyncio.Lock()
+
+async def run_journaled(kind, payload, apply):
+    """Journal a mutation, then apply it now unless older entries are still waiting.
+    
+    `apply(seq)` returns (success, message) and raises on errors. Mutations that hit a
+    transient backend failure are queued and report (True, WRITE_QUEUED); any
+    other error is dead-lettered and raised to the caller.
+    """
+    seq = await write_journal.append(kind, payload)
+    if write_journal.backlog:
+        write_journal.backlog.append(seq)
+        return True, WRITE_QUEUED
+    
+    try:
+        success, message = await apply(seq)
+    except Exception as e:
+        print(f"Error applying {kind} (journal entry {seq}): {e}")
+        if not is_transient_error(e):
+            await write_journal.mark_dead(seq, kind, payload, str(e))
+            raise
+        await write_journal.mark_failed(seq, str(e))
+        return True, WRITE_QUEUED
+    
+    await write_journal.mark_applied(seq, kind, payload, message)
+    return success, message
+
+async def apply_journal_entry(seq, kind, payload, stage):
+    """Apply a journaled mutation during replay."""
+    if kind == 'create_match':
+        return await _apply_create_match(payload, replay=True)
+    if kind == 'match_result':
+        async with match_locks.hold(payload['match_id']):
+            return await _apply_match_result(
+                seq, payload['match_id'], payload['winner'], payload['moderator'],
+                payload['updated_at'], None, payload['pending_only'], stats_written=stage == STATS_WRITTEN, replay=True
+            )
+    return False, f"Unknown journal entry kind {kind}"
+
+async def replay_journal():
+    """Replay the backlog in order, stopping at the first transient backend failure.
+    
+    Entries that fail for any other reason, or that have failed
+    JOURNAL_MAX_ATTEMPTS times while the backend was otherwise healthy, are
+    dead-lettered so the entries behind them still go through.
+    """
+    async with journal_replay_lock:
+        while write_journal.backlog:
+            seq = write_journal.backlog[0]
+            kind, payload, stage = await write_journal.entry(seq)
+            try:
+                success, message = await apply_journal_entry(seq, kind, payload, stage)
+            except Exception as e:
+                print(f"Error replaying journal entry {seq}: {e}")
+                if is_transient_error(e):
+                    # Only failures the breaker doesn't blame on an outage count against the entry
+                    attempts = await write_journal.mark_failed(seq, str(e), counted=not backend_breaker.is_open())
+                    if attempts < JOURNAL_MAX_ATTEMPTS:
+                        return False
+                print(f"Journal entry {seq} ({kind}) moved to dead letters: {e}")
+                await write_journal.mark_dead(seq, kind, payload, str(e))
+                await announce_replayed_result(kind, payload, False, f"Error updating match: {e}")
+                continue
+            
+            if not success:
+                print(f"Journal entry {seq} ({kind}) was not applied: {message}")
+            await write_journal.mark_applied(seq, kind, payload, message)
+            await announce_replayed_result(kind, payload, success, message)
+        return True
+
+async def announce_replayed_result(kind, payload, success, message):
+    """Tell the moderator who queued a match result whether replay recorded it."""
+    notify = payload.get('notify')
+    if kind != 'match_result' or not notify:
+        return
+    match_id = payload['match_id']
+    team_label = "Team A" if payload['winner'] == 'team1' else "Team B"
+    if success:
+        text = f"✅ <@{notify['user_id']}> The queued **{team_label}** win for match `{match_id}` has been recorded."
+    else:
+        text = f"❌ <@{notify['user_id']}> The queued **{team_label}** win for match `{match_id}` was not recorded: {message}"
+        if message not in (MATCH_NOT_FOUND, RESULT_ALREADY_SET):
+            text += f"\nUse `!lf result {match_id} {'teama' if payload['winner'] == 'team1' else 'teamb'}` to try again."
+    try:
+        await bot.get_partial_messageable(notify['channel_id']).send(text)
+    except Exception as e:
+        print(f"Error announcing replayed result for match {match_id}: {e}")
+
+@tasks.loop(seconds=JOURNAL_REPLAY_SECONDS)
+async def journal_replay():
+    """Drain the write journal whenever the backend is reachable again."""
+    try:
+        if write_journal.backlog:
+            if await replay_journal():
+                print("Write journal backlog replayed")
+        elif journal_replay.current_loop % 240 == 0:
+            await write_journal.prune()
+    except Exception as e:
+        print(f"Error replaying write journal: {e}")
+
 def generate_match_id():
     """Generate a unique 6-character match ID."""
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
+@timed_helper
 async def create_match(team1_name, team1_players, team2_name, team2_players):
-    """Create a new match in the database."""
+    """Create a new match in the database (journaled, so it survives outages)."""
     try:
         match_id = generate_match_id()
         
         # Ensure match_id is unique
-        while True:
-            existing = supabase.table('matches').select('match_id').eq('match_id', match_id).execute()
-            if not existing.data:
-                break
-            match_id = generate_match_id()
+        try:
+            while not write_journal.backlog:
+                existing = await db_execute(supabase.table('matches').select('match_id').eq('match_id', match_id))
+                if not existing.data and match_id not in write_journal.pending_matches:
+                    break
+                match_id = generate_match_id()
+        except Exception as e:
+            # Can't check while the database is down; a clash among 36^6 IDs is unlikely
+            print(f"Error checking match ID {match_id}: {e}")
         
         match_data = {
             'match_id': match_id,
@@ -147,203 +1313,454 @@ async def create_match(team1_name, team1_players, team2_name, team2_players):
             'updated_by': None
         }
         
-        result = supabase.table('matches').insert(match_data).execute()
+        await run_journaled('create_match', match_data, lambda seq: _apply_create_match(match_data))
+        # Teammate counts include pending matches
+        bump_data_versions(stats_username(player) for player in team1_players + team2_players)
         return match_id, True
     except Exception as e:
         print(f"Error creating match: {e}")
         return None, False
 
-async def update_match_result(match_id, winner_team, moderator_name):
-    """Update match result and player stats."""
-    try:
-        # Get match details
-        match_result = supabase.table('matches').select('*').eq('match_id', match_id).execute()
-        if not match_result.data:
-            return False, "Match not found"
+async def _apply_create_match(match_data, replay=False):
+    """Write a new match row.
+    
+    Live writes insert, so an ID clash fails instead of overwriting another
+    match. Replays upsert on match_id, since the row may already have been
+    written before a crash.
+    """
+    if replay:
+        await db_execute(supabase.table('matches').upsert(match_data, on_conflict='match_id'))
+    else:
+        await db_execute(supabase.table('matches').insert(match_data))
+    if match_store.ready:
+        match_store.upsert(match_data)
+    return True, "Match created"
+
+class KeyedLocks:
+    """Per-key asyncio locks, dropped once nobody holds or waits on them."""
+    
+    def __init__(self):
+        self.locks = {}   # key -> asyncio.Lock
+        self.users = {}   # key -> number of holders and waiters
+    
+    @contextlib.asynccontextmanager
+    async def hold(self, *keys):
+        """Hold the locks for all keys, taken in sorted order so overlapping holders can't deadlock."""
+        entered = []
+        acquired = []
+        try:
+            for key in sorted(set(keys)):
+                lock = self.locks.setdefault(key, asyncio.Lock())
+                self.users[key] = self.users.get(key, 0) + 1
+                entered.append(key)
+                await lock.acquire()
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(entered):
+                if key in acquired:
+                    self.locks[key].release()
+                self.users[key] -= 1
+                if self.users[key] == 0:
+                    del self.users[key]
+                    del self.locks[key]
+
+# Result writes are serialized per match, and stats writes per player, without a global lock
+match_locks = KeyedLocks()
+player_locks = KeyedLocks()
+
+MATCH_NOT_FOUND = "Match not found"
+STATS_WRITTEN = 'stats_written'  # journal stage of a match result whose player stats are in the database
+RESULT_ALREADY_SET = "This match result has already been updated."
+
+RECENT_RESULTS_SIZE = 1000
+recent_results = OrderedDict()       # idempotency key -> (success, message)
+recent_match_winners = OrderedDict() # match_id -> winner last written by this process
+
+def remember_recent(entries, key, value):
+    """Record a value in a bounded most-recent map."""
+    entries[key] = value
+    entries.move_to_end(key)
+    while len(entries) > RECENT_RESULTS_SIZE:
+        entries.popitem(last=False)
+
+@timed_helper
+async def update_match_result(match_id, winner_team, moderator_name, match=None, idempotency_key=None, pending_only=False,
+                              notify=None):
+    """Update match result and player stats.
+    
+    Pass `match` if the caller already fetched it. Requests repeating an
+    `idempotency_key` return the first outcome without writing again, and
+    `pending_only` refuses to overwrite a result that is already set.
+    The result is journaled first; if the database is unreachable it's
+    queued for replay and (True, WRITE_QUEUED) is returned. `notify`
+    ({'channel_id', 'user_id'}) is where replay reports the final outcome.
+    """
+    async with match_locks.hold(match_id):
+        if idempotency_key is not None and idempotency_key in recent_results:
+            return recent_results[idempotency_key]
         
+        payload = {
+            'match_id': match_id,
+            'winner': winner_team,
+            'moderator': moderator_name,
+            'updated_at': datetime.now().isoformat(),
+            'pending_only': pending_only,
+            'notify': notify
+        }
+        try:
+            success, message = await run_journaled('match_result', payload, lambda seq: _apply_match_result(
+                seq, match_id, winner_team, moderator_name, payload['updated_at'], match, pending_only
+            ))
+        except Exception as e:
+            print(f"Error updating match result: {e}")
+            return False, f"Error updating match: {str(e)}"
+        if idempotency_key is not None and success:
+            remember_recent(recent_results, idempotency_key, (success, message))
+        return success, message
+
+async def _apply_match_result(seq, match_id, winner_team, moderator_name, updated_at, match, pending_only, stats_written=False, replay=False):
+    """Apply journal entry `seq`, a match result, raising on backend errors. The caller must hold the match lock.
+    
+    Player stats are written first, in one upsert, and the entry is marked
+    STATS_WRITTEN before the match row changes. A replay after the match
+    update failed then skips the stats instead of counting them twice, and
+    one after the stats write failed still finds the old winner and redoes it.
+    Stats rows are stamped last_played = `updated_at`, so a replay after a
+    write whose outcome was unknown reads them fresh and skips any row that
+    already carries this result.
+    """
+    # Get match details
+    if match is None:
+        match_result = await db_execute(supabase.table('matches').select('*').eq('match_id', match_id))
+        if not match_result.data:
+            return False, MATCH_NOT_FOUND
         match = match_result.data[0]
-        
-        # Check if this is the first time setting a result or editing an existing one
-        is_first_result = match['winner'] is None
-        previous_winner = match['winner']
+    
+    # A winner written under this lock is newer than a row fetched before we got it
+    if match_id in recent_match_winners:
+        match = dict(match, winner=recent_match_winners[match_id])
+    
+    if pending_only and match['winner'] is not None:
+        return False, RESULT_ALREADY_SET
+    if match['winner'] == winner_team:
+        return True, "Match result already recorded"
+    
+    # Check if this is the first time setting a result or editing an existing one
+    is_first_result = match['winner'] is None
+    previous_winner = match['winner']
+    
+    # Parse team players (they're stored as JSON strings)
+    team1_players = parse_team_players(match['team1_players'])
+    team2_players = parse_team_players(match['team2_players'])
+    
+    async with player_locks.hold(*(stats_username(player) for player in team1_players + team2_players)):
+        if not stats_written:
+            # Load every player's stats in one query before changing anything
+            stats_by_name, found = await get_players_stats_bulk(team1_players + team2_players, fresh=replay)
+            if not found:
+                raise ConnectionError("Error loading player stats")
+            
+            # Rows an earlier attempt already wrote, if its write timed out but still committed
+            played_at = parse_timestamp(updated_at)
+            applied = {
+                stats_username(player) for player, row in stats_by_name.items()
+                if parse_timestamp(row.get('last_played')) == played_at
+            }
+            
+            new_rows = {}
+            for player in team1_players + team2_players:
+                on_team1 = player in team1_players
+                username = stats_username(player)
+                if username in applied:
+                    continue
+                current_stats = new_rows.get(username) or stats_by_name.get(player)
+                
+                if not is_first_result and current_stats is not None:
+                    # Editing existing result - reverse the previous result first
+                    current_stats = reverse_player_stats_row(current_stats, on_team1 == (previous_winner == 'team1'))
+                
+                new_rows[username] = update_player_stats_row(current_stats, player, on_team1 == (winner_team == 'team1'), updated_at)
+            
+            if new_rows:
+                await write_player_stats(list(new_rows.values()))
+            await write_journal.mark_stage(seq, STATS_WRITTEN)
         
         # Update match result
         update_data = {
             'winner': winner_team,
             'updated_by': moderator_name,
-            'updated_at': datetime.now().isoformat()
+            'updated_at': updated_at
         }
-        supabase.table('matches').update(update_data).eq('match_id', match_id).execute()
+        await db_execute(supabase.table('matches').update(update_data).eq('match_id', match_id))
+        remember_recent(recent_match_winners, match_id, winner_team)
+        if match_store.ready:
+            match_store.upsert(dict(match, **update_data))
+    
+    return True, "Match result updated successfully"
+
+def stats_username(player_name):
+    """Return the player_stats username a name resolves to."""
+    record = player_identity.lookup(player_name)
+    return record['username'] if record else player_name
+
+def reverse_player_stats_row(current_stats, was_winner):
+    """Return a copy of a player's stats with one result reversed (used when editing match results)."""
+    # Subtract the previous result
+    new_total = max(0, current_stats['total_matches'] - 1)
+    new_wins = max(0, current_stats['wins'] - (1 if was_winner else 0))
+    new_losses = max(0, current_stats['losses'] - (0 if was_winner else 1))
+    new_win_rate = (new_wins / new_total * 100) if new_total > 0 else 0
+    
+    # Reverse recent form
+    current_form = current_stats.get('recent_form', '')
+    new_recent_form = current_form[:-1] if current_form else ''
+    
+    reversed_stats = dict(current_stats)
+    reversed_stats.update({
+        'total_matches': new_total,
+        'wins': new_wins,
+        'losses': new_losses,
+        'win_rate': round(new_win_rate, 2),
+        'recent_form': new_recent_form
+    })
+    return reversed_stats
+
+def update_player_stats_row(current_stats, player_name, won, played_at):
+    """Return a player's stats row with one more result, played at `played_at`, applied (or a new row for a new player)."""
+    if current_stats:
+        # Update existing player
+        new_total = current_stats['total_matches'] + 1
+        new_wins = current_stats['wins'] + (1 if won else 0)
+        new_losses = current_stats['losses'] + (0 if won else 1)
+        new_win_rate = (new_wins / new_total) * 100 if new_total > 0 else 0
         
-        # Parse team players (they're stored as JSON strings)
-        team1_players = json.loads(match['team1_players']) if isinstance(match['team1_players'], str) else match['team1_players']
-        team2_players = json.loads(match['team2_players']) if isinstance(match['team2_players'], str) else match['team2_players']
+        # Update recent form (last 5 games)
+        current_form = current_stats.get('recent_form', '')
+        new_form_char = 'W' if won else 'L'
+        new_recent_form = (current_form + new_form_char)[-5:]  # Keep only last 5
         
-        if is_first_result:
-            # First time setting result - add wins/losses normally
-            winning_players = team1_players if winner_team == 'team1' else team2_players
-            losing_players = team2_players if winner_team == 'team1' else team1_players
-            
-            # Update winners
-            for player in winning_players:
-                await update_player_stats(player, True)
-            
-            # Update losers
-            for player in losing_players:
-                await update_player_stats(player, False)
+        # Update streaks
+        current_streak = current_stats.get('current_streak', 0)
+        streak_type = current_stats.get('streak_type', '')
+        longest_win_streak = current_stats.get('longest_win_streak', 0)
+        
+        if won:
+            if streak_type == 'WIN':
+                current_streak += 1
+            else:
+                current_streak = 1
+                streak_type = 'WIN'
+            longest_win_streak = max(longest_win_streak, current_streak)
         else:
-            # Editing existing result - we need to reverse previous result and apply new one
-            # Get players from previous result
-            previous_winning_players = team1_players if previous_winner == 'team1' else team2_players
-            previous_losing_players = team2_players if previous_winner == 'team1' else team1_players
-            
-            # Reverse previous result
-            for player in previous_winning_players:
-                await reverse_player_stats(player, True)
-            for player in previous_losing_players:
-                await reverse_player_stats(player, False)
-            
-            # Apply new result
-            new_winning_players = team1_players if winner_team == 'team1' else team2_players
-            new_losing_players = team2_players if winner_team == 'team1' else team1_players
-            
-            for player in new_winning_players:
-                await update_player_stats(player, True)
-            for player in new_losing_players:
-                await update_player_stats(player, False)
+            if streak_type == 'LOSS':
+                current_streak += 1
+            else:
+                current_streak = 1
+                streak_type = 'LOSS'
         
-        return True, "Match result updated successfully"
-    except Exception as e:
-        print(f"Error updating match result: {e}")
-        return False, f"Error updating match: {str(e)}"
-async def reverse_player_stats(player_name, was_winner):
-    """Reverse player statistics (used when editing match results)."""
+        updated_stats = dict(current_stats)
+        updated_stats.update({
+            'total_matches': new_total,
+            'wins': new_wins,
+            'losses': new_losses,
+            'win_rate': round(new_win_rate, 2),
+            'last_played': played_at,
+            'recent_form': new_recent_form,
+            'current_streak': current_streak,
+            'streak_type': streak_type,
+            'longest_win_streak': longest_win_streak,
+            'display_name': player_name
+        })
+        return updated_stats
+    
+    # Create new player
+    record = player_identity.lookup(player_name)
+    if record is None:
+        record = player_identity.add_player(uuid.uuid4().hex, player_name)
+        player_name_index.add(player_name)
+    return {
+        'player_id': record['player_id'],
+        'discord_username': record['username'],
+        'display_name': player_name,
+        'total_matches': 1,
+        'wins': 1 if won else 0,
+        'losses': 0 if won else 1,
+        'win_rate': 100.0 if won else 0.0,
+        'last_played': played_at,
+        'recent_form': 'W' if won else 'L',
+        'current_streak': 1,
+        'streak_type': 'WIN' if won else 'LOSS',
+        'longest_win_streak': 1 if won else 0
+    }
+
+@timed_helper
+async def write_player_stats(rows):
+    """Write player stats rows with batched upserts and refresh the stats cache."""
+    for i in range(0, len(rows), DB_WRITE_BATCH_SIZE):
+        batch = rows[i:i + DB_WRITE_BATCH_SIZE]
+        await db_execute(supabase.table('player_stats').upsert(batch, on_conflict='discord_username', default_to_null=False))
+    cache_player_stats(rows)
+    hot_reads.invalidate()
+    bump_data_versions(row['discord_username'] for row in rows)
+
+@timed_helper
+async def get_match_details(match_id):
+    """Get match details from database, falling back to matches still in the write journal."""
     try:
-        result = supabase.table('player_stats').select('*').eq('discord_username', player_name).execute()
-        
+        result = await db_execute(supabase.table('matches').select('*').eq('match_id', match_id))
         if result.data:
-            current_stats = result.data[0]
-            # Subtract the previous result
-            new_total = max(0, current_stats['total_matches'] - 1)
-            new_wins = max(0, current_stats['wins'] - (1 if was_winner else 0))
-            new_losses = max(0, current_stats['losses'] - (0 if was_winner else 1))
-            new_win_rate = (new_wins / new_total * 100) if new_total > 0 else 0
-            
-            # Reverse recent form
-            current_form = current_stats.get('recent_form', '')
-            new_recent_form = current_form[:-1] if current_form else ''
-            
-            update_data = {
-                'total_matches': new_total,
-                'wins': new_wins,
-                'losses': new_losses,
-                'win_rate': round(new_win_rate, 2),
-                'recent_form': new_recent_form
-            }
-            
-            supabase.table('player_stats').update(update_data).eq('discord_username', player_name).execute()
+            return result.data[0], True
     except Exception as e:
-        print(f"Error reversing player stats for {player_name}: {e}")
-async def update_player_stats(player_name, won):
-    """Update individual player statistics."""
+        print(f"Error getting match details: {e}")
+    
+    pending = write_journal.pending_matches.get(match_id)
+    if pending is not None:
+        return dict(pending), True
+    return None, False
+
+PLAYER_STATS_CACHE_TTL = 60  # seconds
+player_stats_cache = {}  # discord_username -> (cached_at, stats row)
+
+# Data versions for rendered embeds, bumped on every write to stats or to a player's matches
+stats_data_version = 0
+player_data_versions = {}  # discord_username -> version
+
+def bump_data_versions(usernames):
+    """Mark stats data, and these players' data, as changed."""
+    global stats_data_version
+    stats_data_version += 1
+    for username in usernames:
+        player_data_versions[username] = player_data_versions.get(username, 0) + 1
+
+RENDER_CACHE_SIZE = 256
+RENDER_CACHE_TTL = 300  # seconds; bounds staleness from writes made outside the bot
+
+class RenderCache:
+    """LRU cache of rendered embeds, keyed by the data version they were built from."""
+    
+    def __init__(self, max_size=RENDER_CACHE_SIZE, ttl=RENDER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (rendered_at, embed)
+    
+    def get(self, key):
+        entry = self.entries.get(key) if key is not None else None
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+    
+    def put(self, key, embed):
+        if key is None:
+            return
+        self.entries[key] = (time.monotonic(), embed)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+render_cache = RenderCache()
+
+def cache_player_stats(rows, cached_at=None):
+    """Store player stats rows in the cache, as fetched now unless `cached_at` says otherwise."""
+    now = time.monotonic() if cached_at is None else cached_at
+    for row in rows:
+        player_stats_cache[row['discord_username']] = (now, row)
+
+@timed_helper
+async def get_players_stats_bulk(player_names, allow_stale=False, fresh=False):
+    """Get statistics for several players at once.
+    
+    Names resolve through the identity index; anything not cached is fetched
+    in a single `in_` query. With `allow_stale`, for display only, expired
+    rows are returned at once and refreshed in the background; with `fresh`
+    the cache is skipped and every row is read from the database. Returns
+    ({requested name: stats row}, success).
+    """
     try:
-        # Get existing player stats
-        result = supabase.table('player_stats').select('*').eq('discord_username', player_name).execute()
+        usernames = {}
+        for name in player_names:
+            if player_identity.loaded:
+                record = player_identity.lookup(name)
+                if record is not None:
+                    usernames[name] = record['username']
+            elif isinstance(name, str):
+                usernames[name] = name
         
-        if result.data:
-            # Update existing player
-            current_stats = result.data[0]
-            new_total = current_stats['total_matches'] + 1
-            new_wins = current_stats['wins'] + (1 if won else 0)
-            new_losses = current_stats['losses'] + (0 if won else 1)
-            new_win_rate = (new_wins / new_total) * 100 if new_total > 0 else 0
-            
-            # Update recent form (last 5 games)
-            current_form = current_stats.get('recent_form', '')
-            new_form_char = 'W' if won else 'L'
-            new_recent_form = (current_form + new_form_char)[-5:]  # Keep only last 5
-            
-            # Update streaks
-            current_streak = current_stats.get('current_streak', 0)
-            streak_type = current_stats.get('streak_type', '')
-            longest_win_streak = current_stats.get('longest_win_streak', 0)
-            
-            if won:
-                if streak_type == 'WIN':
-                    current_streak += 1
-                else:
-                    current_streak = 1
-                    streak_type = 'WIN'
-                longest_win_streak = max(longest_win_streak, current_streak)
+        stats_by_name = {}
+        missing = set()
+        stale = set()
+        now = time.monotonic()
+        for name, username in usernames.items():
+            cached = None if fresh else player_stats_cache.get(username)
+            # Expired rows are still better than nothing while the backend is failing fast
+            if cached and (now - cached[0] < PLAYER_STATS_CACHE_TTL or backend_breaker.is_open()):
+                stats_by_name[name] = cached[1]
+            elif cached and allow_stale:
+                stats_by_name[name] = cached[1]
+                stale.add(username)
             else:
-                if streak_type == 'LOSS':
-                    current_streak += 1
-                else:
-                    current_streak = 1
-                    streak_type = 'LOSS'
+                missing.add(username)
+        if stale:
+            refresh_player_stats_later(stale)
+        
+        if missing:
+            result = await db_execute(supabase.table('player_stats').select('*').in_('discord_username', list(missing)))
+            rows = {row['discord_username']: row for row in result.data}
             
-            update_data = {
-                'total_matches': new_total,
-                'wins': new_wins,
-                'losses': new_losses,
-                'win_rate': round(new_win_rate, 2),
-                'last_played': datetime.now().isoformat(),
-                'recent_form': new_recent_form,
-                'current_streak': current_streak,
-                'streak_type': streak_type,
-                'longest_win_streak': longest_win_streak,
-                'display_name': player_name
-            }
+            # Identities not loaded yet - also try unmatched names as display names
+            unmatched = missing - rows.keys()
+            if unmatched and not player_identity.loaded:
+                result = await db_execute(supabase.table('player_stats').select('*').in_('display_name', list(unmatched)))
+                for row in result.data:
+                    rows.setdefault(row['display_name'], row)
             
-            supabase.table('player_stats').update(update_data).eq('discord_username', player_name).execute()
-        else:
-            # Create new player
-            new_stats = {
-                'discord_username': player_name,
-                'display_name': player_name,
-                'total_matches': 1,
-                'wins': 1 if won else 0,
-                'losses': 0 if won else 1,
-                'win_rate': 100.0 if won else 0.0,
-                'last_played': datetime.now().isoformat(),
-                'recent_form': 'W' if won else 'L',
-                'current_streak': 1,
-                'streak_type': 'WIN' if won else 'LOSS',
-                'longest_win_streak': 1 if won else 0
-            }
-            supabase.table('player_stats').insert(new_stats).execute()
+            cache_player_stats(rows.values())
+            for name, username in usernames.items():
+                if name not in stats_by_name and username in rows:
+                    stats_by_name[name] = rows[username]
+        
+        return stats_by_name, True
     except Exception as e:
-        print(f"Error updating player stats for {player_name}: {e}")
+        print(f"Error getting bulk player stats: {e}")
+        return {}, False
 
-async def get_match_details(match_id):
-    """Get match details from database."""
+stats_refreshing = set()  # usernames with a background refresh in flight
+
+def refresh_player_stats_later(usernames):
+    """Refresh expired stats rows in the background, once per username at a time."""
+    usernames = set(usernames) - stats_refreshing
+    if not usernames:
+        return
+    stats_refreshing.update(usernames)
+    task = asyncio.create_task(_refresh_player_stats(usernames))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+async def _refresh_player_stats(usernames):
     try:
-        result = supabase.table('matches').select('*').eq('match_id', match_id).execute()
-        if result.data:
-            return result.data[0], True
-        return None, False
+        # Result writes hold these locks from their read to their write, so a refresh can't overwrite a newer row
+        async with player_locks.hold(*usernames):
+            result = await db_execute(supabase.table('player_stats').select('*').in_('discord_username', list(usernames)))
+            cache_player_stats(result.data)
     except Exception as e:
-        print(f"Error getting match details: {e}")
-        return None, False
+        print(f"Error refreshing player stats: {e}")
+    finally:
+        stats_refreshing.difference_update(usernames)
 
+@timed_helper
 async def get_player_stats(player_name):
-    """Get player statistics from database by name only."""
-    try:
-        # Try by username first
-        result = supabase.table('player_stats').select('*').eq('discord_username', player_name).execute()
-        if result.data:
-            return result.data[0], True
-        
-        # Try by display name
-        result = supabase.table('player_stats').select('*').eq('display_name', player_name).execute()
-        if result.data:
-            return result.data[0], True
-        
-        return None, False
-    except Exception as e:
-        print(f"Error getting player stats: {e}")
-        return None, False
+    """Get player statistics by name or Discord user ID, for display."""
+    stats_by_name, found = await get_players_stats_bulk([player_name], allow_stale=True)
+    if player_name in stats_by_name:
+        return stats_by_name[player_name], True
+    return None, False
 
+@timed_helper
+@coalesced_read
 async def get_all_player_stats(order_by='total_matches'):
     """Get all player statistics from database."""
     try:
@@ -351,12 +1768,14 @@ async def get_all_player_stats(order_by='total_matches'):
         if order_by not in valid_orders:
             order_by = 'total_matches'
         
-        result = supabase.table('player_stats').select('*').order(order_by, desc=True).execute()
+        result = await db_execute(supabase.table('player_stats').select('*').order(order_by, desc=True))
         return result.data, True
     except Exception as e:
         print(f"Error getting all player stats: {e}")
         return [], False
 
+@timed_helper
+@coalesced_read
 async def get_leaderboard(order_by='total_matches', min_games=3):
     """Get player leaderboard sorted by specified criteria."""
     try:
@@ -364,23 +1783,139 @@ async def get_leaderboard(order_by='total_matches', min_games=3):
         if order_by not in valid_orders:
             order_by = 'total_matches'
         
-        result = supabase.table('player_stats').select('*').gte('total_matches', min_games).order(order_by, desc=True).limit(15).execute()
+        result = await db_execute(supabase.table('player_stats').select('*').gte('total_matches', min_games).order(order_by, desc=True).limit(15))
         return result.data, True
     except Exception as e:
         print(f"Error getting leaderboard: {e}")
         return [], False
 
+# Roster lookups go through GIN indexes on the roster columns instead of a full scan:
+#   create index if not exists matches_team1_players_gin on matches using gin (team1_players);
+#   create index if not exists matches_team2_players_gin on matches using gin (team2_players);
+DB_WRITE_BATCH_SIZE = 100
+
+def parse_team_players(team_players):
+    """Return a roster as a list of names (rosters may be stored as JSON strings)."""
+    if isinstance(team_players, str):
+        try:
+            team_players = json.loads(team_players)
+        except json.JSONDecodeError:
+            team_players = []
+    return [p for p in (team_players or []) if p is not None and str(p).strip()]
+
+@timed_helper
+async def find_matches_with_player(player_name):
+    """Get every match whose roster contains the player, keyed by match ID."""
+    roster_filter = json.dumps([player_name])
+    results = await asyncio.gather(*(
+        db_execute(supabase.table('matches').select('*').contains(column, roster_filter))
+        for column in ('team1_players', 'team2_players')
+    ))
+    matches = {}
+    for result in results:
+        for match in result.data:
+            matches[match['match_id']] = match
+    return matches
+
+@timed_helper
+async def rewrite_match_rosters(matches, old_player, new_player):
+    """Replace old_player with new_player in the given matches and write them back in batches."""
+    rewritten = []
+    for match in matches:
+        updated_match = dict(match)
+        for column in ('team1_players', 'team2_players'):
+            roster = []
+            for player in parse_team_players(match.get(column)):
+                name = new_player if str(player).lower() == old_player.lower() else player
+                if name not in roster:
+                    roster.append(name)
+            updated_match[column] = roster
+        rewritten.append(updated_match)
+    
+    for i in range(0, len(rewritten), DB_WRITE_BATCH_SIZE):
+        batch = rewritten[i:i + DB_WRITE_BATCH_SIZE]
+        await db_execute(supabase.table('matches').upsert(batch, on_conflict='match_id'))
+    if match_store.ready:
+        for match in rewritten:
+            match_store.upsert(match)
+    
+    return rewritten
+
+def replay_player_history(player_name, matches):
+    """Rebuild recent form and streaks by replaying a player's completed matches in order."""
+    history = {
+        'recent_form': '',
+        'current_streak': 0,
+        'streak_type': '',
+        'longest_win_streak': 0,
+        'last_played': None
+    }
+    
+    completed = [m for m in matches if m.get('winner') is not None]
+    completed.sort(key=lambda m: m.get('created_at') or '')
+    
+    for match in completed:
+        team1_players = [str(p).lower() for p in parse_team_players(match.get('team1_players'))]
+        team2_players = [str(p).lower() for p in parse_team_players(match.get('team2_players'))]
+        
+        if player_name.lower() in team1_players:
+            won = match['winner'] == 'team1'
+        elif player_name.lower() in team2_players:
+            won = match['winner'] == 'team2'
+        else:
+            continue
+        
+        history['recent_form'] = (history['recent_form'] + ('W' if won else 'L'))[-5:]
+        streak_type = 'WIN' if won else 'LOSS'
+        if history['streak_type'] == streak_type:
+            history['current_streak'] += 1
+        else:
+            history['current_streak'] = 1
+            history['streak_type'] = streak_type
+        if won:
+            history['longest_win_streak'] = max(history['longest_win_streak'], history['current_streak'])
+        history['last_played'] = match.get('updated_at') or match.get('created_at')
+    
+    return history
+
+@timed_helper
 async def merge_player_accounts(old_player, new_player):
-    """Merge two player accounts together."""
+    """Merge two player accounts together, including their match rosters and aliases."""
     try:
+        # Resolve both names to their stats rows
+        old_record = player_identity.lookup(old_player)
+        new_record = player_identity.lookup(new_player)
+        if old_record is not None and old_record is new_record:
+            return False, f"{old_player} and {new_player} are already the same player"
+        if old_record is not None:
+            old_player = old_record['username']
+        if new_record is not None:
+            new_player = new_record['username']
+        
         # Get both player stats
-        old_result = supabase.table('player_stats').select('*').eq('discord_username', old_player).execute()
-        new_result = supabase.table('player_stats').select('*').eq('discord_username', new_player).execute()
+        old_result, new_result = await asyncio.gather(
+            db_execute(supabase.table('player_stats').select('*').eq('discord_username', old_player)),
+            db_execute(supabase.table('player_stats').select('*').eq('discord_username', new_player))
+        )
         
         if not old_result.data:
             return False, f"Player {old_player} not found"
         
-        old_stats = old_result.data[0]
+        old_stats = old_result.data[0]
+        
+        # Rewrite every roster that still holds the old name so h2h/teammates see one history
+        if new_result.data:
+            old_matches, player_matches = await asyncio.gather(
+                find_matches_with_player(old_player),
+                find_matches_with_player(new_player)
+            )
+        else:
+            old_matches, player_matches = await find_matches_with_player(old_player), {}
+        rewritten_matches = await rewrite_match_rosters(old_matches.values(), old_player, new_player)
+        
+        # Replay the combined history to rebuild form and streaks
+        player_matches.update({m['match_id']: m for m in rewritten_matches})
+        history = replay_player_history(new_player, player_matches.values())
         
         if new_result.data:
             # Merge into existing new player
@@ -389,21 +1924,57 @@ async def merge_player_accounts(old_player, new_player):
                 'total_matches': old_stats['total_matches'] + new_stats['total_matches'],
                 'wins': old_stats['wins'] + new_stats['wins'],
                 'losses': old_stats['losses'] + new_stats['losses'],
-                'longest_win_streak': max(old_stats.get('longest_win_streak', 0), new_stats.get('longest_win_streak', 0))
+                'longest_win_streak': max(old_stats.get('longest_win_streak', 0), new_stats.get('longest_win_streak', 0), history['longest_win_streak'])
             }
-            merged_stats['win_rate'] = (merged_stats['wins'] / merged_stats['total_matches'] * 100) if merged_stats['total_matches'] > 0 else 0
-            
+            merged_stats['win_rate'] = round(merged_stats['wins'] / merged_stats['total_matches'] * 100, 2) if merged_stats['total_matches'] > 0 else 0
+            last_played = history['last_played'] or max(old_stats.get('last_played') or '', new_stats.get('last_played') or '') or None
+        else:
+            merged_stats = {
+                'discord_username': new_player,
+                'display_name': new_player,
+                'longest_win_streak': max(old_stats.get('longest_win_streak', 0), history['longest_win_streak'])
+            }
+            last_played = history['last_played'] or old_stats.get('last_played')
+        
+        if history['recent_form']:
+            merged_stats['recent_form'] = history['recent_form']
+            merged_stats['current_streak'] = history['current_streak']
+            merged_stats['streak_type'] = history['streak_type']
+        if last_played:
+            merged_stats['last_played'] = last_played
+        
+        if new_result.data:
             # Update new player with merged stats
-            supabase.table('player_stats').update(merged_stats).eq('discord_username', new_player).execute()
+            await db_execute(supabase.table('player_stats').update(merged_stats).eq('discord_username', new_player))
+            # Delete old player record (only when we merged into an existing player)
+            await db_execute(supabase.table('player_stats').delete().eq('discord_username', old_player))
         else:
             # Rename old player to new player
-            supabase.table('player_stats').update({'discord_username': new_player, 'display_name': new_player}).eq('discord_username', old_player).execute()
+            await db_execute(supabase.table('player_stats').update(merged_stats).eq('discord_username', old_player))
+        
+        player_stats_cache.pop(old_player, None)
+        player_stats_cache.pop(new_player, None)
+        hot_reads.invalidate()
+        bump_data_versions([old_player, new_player])
         
-        # Delete old player record
-        if new_result.data:  # Only delete if we merged into existing player
-            supabase.table('player_stats').delete().eq('discord_username', old_player).execute()
+        # Point every alias of the merged accounts at the surviving player
+        if old_record is not None:
+            if new_result.data and new_record is not None:
+                source, target = old_record, new_record
+            else:
+                source, target = new_record, old_record
+                target['username'] = new_player
+            if source is not None:
+                player_identity.merge(source, target)
+                await db_execute(supabase.table('player_aliases').update({'player_id': target['player_id']}).eq('player_id', source['player_id']))
+            player_identity.aliases[PlayerIdentityIndex.alias_key(old_player)] = target
+            player_identity.aliases[PlayerIdentityIndex.alias_key(new_player)] = target
+            player_identity.version += 1
+            player_name_index.add(new_player)
+            rows = [alias_row(old_player, target), alias_row(new_player, target)]
+            await db_execute(supabase.table('player_aliases').upsert(rows, on_conflict='alias'))
         
-        return True, f"Successfully merged {old_player} into {new_player}"
+        return True, f"Successfully merged {old_player} into {new_player} ({len(rewritten_matches)} match rosters updated)"
     except Exception as e:
         print(f"Error merging players: {e}")
         return False, f"Error merging players: {str(e)}"
@@ -417,6 +1988,7 @@ def get_display_name(player_data):
     return display_name
 
 
+@timed_helper
 async def get_daily_server_stats():
     """Get server statistics for today."""
     try:
@@ -424,14 +1996,14 @@ async def get_daily_server_stats():
         today_start = f"{today}T00:00:00"
         today_end = f"{today}T23:59:59"
         
-        # Get matches played today
-        matches_today = supabase.table('matches').select('*').gte('created_at', today_start).lte('created_at', today_end).execute()
+        # Get matches played today and total stats
+        matches_today, total_players, total_matches = await asyncio.gather(
+            db_execute(supabase.table('matches').select('*').gte('created_at', today_start).lte('created_at', today_end)),
+            db_execute(supabase.table('player_stats').select('discord_username')),
+            db_execute(supabase.table('matches').select('match_id'))
+        )
         completed_matches_today = [m for m in matches_today.data if m['winner'] is not None]
         
-        # Get total stats
-        total_players = supabase.table('player_stats').select('discord_username').execute()
-        total_matches = supabase.table('matches').select('match_id').execute()
-        
         return {
             'matches_today': len(matches_today.data),
             'completed_today': len(completed_matches_today),
@@ -442,13 +2014,286 @@ async def get_daily_server_stats():
         print(f"Error getting daily stats: {e}")
         return {}, False
 
+# ========================= Warm Cache =========================
+
+WARM_CACHE_PATH = os.getenv('WARM_CACHE_PATH', 'lof_warm_cache.bin')
+WARM_CACHE_MAGIC = b'LOFWARM'
+WARM_CACHE_VERSION = 3  # bump when the snapshot layout changes; older snapshots are ignored
+WARM_CACHE_SAVE_SECONDS = 300
+MATCH_SYNC_SECONDS = 60
+MATCH_SYNC_OVERLAP_SECONDS = 300  # re-read this far behind the watermark to catch rows committed out of order
+
+def parse_timestamp(stamp):
+    """Parse a stored timestamp as an aware UTC datetime; naive ones are UTC, as Postgres stores them."""
+    try:
+        parsed = datetime.fromisoformat(stamp.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+class MatchStore:
+    """Compact in-memory copy of the matches table for head-to-head and teammate lookups.
+    
+    Roster names are interned to integer IDs and every name keeps a posting
+    list of the matches it played in, so a lookup touches only those matches
+    instead of downloading the whole table. Names resolve to players through
+    the identity index at query time, so renamed and merged accounts still
+    count as one player.
+    """
+    
+    WINNERS = (None, 'team1', 'team2')
+    
+    def __init__(self):
+        self.names = []             # name id -> roster name
+        self.name_ids = {}          # roster name -> name id
+        self.postings = []          # name id -> positions of the matches it played in
+        self.match_ids = []         # position -> match_id
+        self.positions = {}         # match_id -> position
+        self.created = []           # position -> created_at
+        self.winners = bytearray()  # position -> index into WINNERS
+        self.teams = []             # position -> (team1 name ids, team2 name ids)
+        self.watermark = None       # newest created_at/updated_at returned by sync(), in UTC
+        self.ready = False
+        self._keys = None           # (identity index, version, name id -> player key, key -> name ids)
+    
+    def intern(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self.name_ids[name] = name_id
+            self.postings.append([])
+        return name_id
+    
+    def upsert(self, row):
+        """Add a match row, or update the one with the same match_id."""
+        teams = tuple(
+            tuple(self.intern(str(player)) for player in parse_team_players(row.get(column)))
+            for column in ('team1_players', 'team2_players')
+        )
+        winner = self.WINNERS.index(row['winner']) if row.get('winner') in self.WINNERS else 0
+        position = self.positions.get(row['match_id'])
+        if position is None:
+            position = len(self.match_ids)
+            self.positions[row['match_id']] = position
+            self.match_ids.append(row['match_id'])
+            self.created.append(row.get('created_at') or '')
+            self.winners.append(winner)
+            self.teams.append(())
+        self.winners[position] = winner
+        if teams != self.teams[position]:
+            for name_id in set(self.teams[position][0] + self.teams[position][1]) if self.teams[position] else ():
+                self.postings[name_id].remove(position)
+            for name_id in set(teams[0] + teams[1]):
+                self.postings[name_id].append(position)
+            self.teams[position] = teams
+    
+    def _player_keys(self):
+        """Player keys for every interned name, recomputed when the identity index changes."""
+        cached = self._keys
+        if cached is None or cached[0] is not player_identity or cached[1] != player_identity.version:
+            cached = (player_identity, player_identity.version, [], {})
+        keys, ids_by_key = cached[2], cached[3]
+        for name_id in range(len(keys), len(self.names)):
+            key = player_identity.player_key(self.names[name_id])
+            keys.append(key)
+            ids_by_key.setdefault(key, []).append(name_id)
+        self._keys = cached
+        return ids_by_key
+    
+    def rows_with(self, *players, completed_only=False):
+        """Match rows (as the matches table returns them) that every given player played in."""
+        ids_by_key = self._player_keys()
+        shared = None
+        for player in players:
+            positions = set()
+            for name_id in ids_by_key.get(player_identity.player_key(player), ()):
+                positions.update(self.postings[name_id])
+            shared = positions if shared is None else shared & positions
+    
+        rows = []
+        for position in sorted(shared or ()):
+            if completed_only and not self.winners[position]:
+                continue
+            team1, team2 = self.teams[position]
+            rows.append({
+                'match_id': self.match_ids[position],
+                'created_at': self.created[position],
+                'winner': self.WINNERS[self.winners[position]],
+                'team1_players': [self.names[name_id] for name_id in team1],
+                'team2_players': [self.names[name_id] for name_id in team2]
+            })
+        return rows
+    
+    async def sync(self):
+        """Catch up with matches created or updated since the watermark (everything on the first run).
+        
+        Only rows read back here advance the watermark; the bot's own
+        write-through upserts carry its local clock, not the server's.
+        """
+        try:
+            if self.watermark:
+                since = (self.watermark - timedelta(seconds=MATCH_SYNC_OVERLAP_SECONDS)).isoformat()
+                created, updated = await asyncio.gather(
+                    db_execute(supabase.table('matches').select('*').gte('created_at', since)),
+                    db_execute(supabase.table('matches').select('*').gte('updated_at', since))
+                )
+                rows = created.data + updated.data
+            else:
+                rows = (await db_execute(supabase.table('matches').select('*'))).data
+                rows.sort(key=lambda row: row.get('created_at') or '')
+            for row in rows:
+                self.upsert(row)
+                for stamp in (row.get('created_at'), row.get('updated_at')):
+                    stamp = parse_timestamp(stamp)
+                    if stamp and (self.watermark is None or stamp > self.watermark):
+                        self.watermark = stamp
+            self.ready = True
+            return True
+        except Exception as e:
+            print(f"Error syncing matches: {e}")
+            return False
+    
+    def export(self):
+        """Flatten the store into arrays for the snapshot."""
+        sizes = bytearray()
+        rosters = array.array('i')
+        for team1, team2 in self.teams:
+            sizes += bytes((len(team1), len(team2)))
+            rosters.extend(team1)
+            rosters.extend(team2)
+        return {
+            'names': list(self.names),
+            'match_ids': list(self.match_ids),
+            'created': list(self.created),
+            'winners': bytes(self.winners),
+            'team_sizes': bytes(sizes),
+            'rosters': rosters,
+            'watermark': self.watermark
+        }
+    
+    @classmethod
+    def restore(cls, state):
+        store = cls()
+        for name in state['names']:
+            store.intern(name)
+        store.match_ids = state['match_ids']
+        store.positions = {match_id: position for position, match_id in enumerate(store.match_ids)}
+        store.created = state['created']
+        store.winners = bytearray(state['winners'])
+        sizes, rosters, offset = state['team_sizes'], state['rosters'], 0
+        for position in range(len(store.match_ids)):
+            team1_size, team2_size = sizes[2 * position], sizes[2 * position + 1]
+            team1 = tuple(rosters[offset:offset + team1_size])
+            team2 = tuple(rosters[offset + team1_size:offset + team1_size + team2_size])
+            offset += team1_size + team2_size
+            store.teams.append((team1, team2))
+            for name_id in set(team1 + team2):
+                store.postings[name_id].append(position)
+        store.watermark = state['watermark']
+        store.ready = True
+        return store
+
+match_store = MatchStore()
+warm_cache_restored = False
+warm_cache_saved_at = time.monotonic()
+
+def capture_warm_cache():
+    """Copy out the state worth keeping across restarts."""
+    now = time.monotonic()
+    return {
+        'saved_at': time.time(),
+        # Each row's age, since monotonic timestamps mean nothing to the next process
+        'player_stats': [(now - cached_at, row) for cached_at, row in player_stats_cache.values()],
+        'player_aliases': list(player_alias_rows),
+        'matches': match_store.export()
+    }
+
+def write_warm_cache(state):
+    """Write a snapshot: a magic header and layout version, then a pickle, swapped in atomically."""
+    payload = WARM_CACHE_MAGIC + struct.pack('<H', WARM_CACHE_VERSION) + pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    temp_path = f"{WARM_CACHE_PATH}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, WARM_CACHE_PATH)
+
+async def save_warm_cache():
+    """Snapshot the warm state to disk without blocking the event loop on the write."""
+    global warm_cache_saved_at
+    if not match_store.ready or not player_identity.loaded:
+        return
+    try:
+        state = capture_warm_cache()
+        await asyncio.get_running_loop().run_in_executor(None, write_warm_cache, state)
+        warm_cache_saved_at = time.monotonic()
+    except Exception as e:
+        print(f"Error saving warm cache: {e}")
+
+def load_warm_cache():
+    """Restore players, aliases, stats and matches from the snapshot. Returns True if it was loaded.
+    
+    The file is the bot's own local state. Each stats row keeps the age it had
+    when saved plus the downtime, so it counts as fresh only for whatever is
+    left of its TTL; older rows are served stale to display reads while they
+    revalidate. The full player list is seeded into get_all_player_stats the
+    same way, which also gives the overall leaderboard without a query.
+    """
+    global match_store, warm_cache_restored
+    try:
+        with open(WARM_CACHE_PATH, 'rb') as f:
+            payload = f.read()
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f"Error reading warm cache: {e}")
+        return False
+    
+    header = len(WARM_CACHE_MAGIC)
+    if payload[:header] != WARM_CACHE_MAGIC or struct.unpack('<H', payload[header:header + 2])[0] != WARM_CACHE_VERSION:
+        print("Ignoring warm cache written by a different version")
+        return False
+    try:
+        state = pickle.loads(payload[header + 2:])
+        downtime = max(0.0, time.time() - state['saved_at'])
+        now = time.monotonic()
+        stats = state['player_stats']
+        index_players([row for _, row in stats], state['player_aliases'])
+        for age, row in stats:
+            player_stats_cache[row['discord_username']] = (now - downtime - age, row)
+        if stats:
+            rows = sorted((row for _, row in stats), key=lambda row: row.get('total_matches', 0), reverse=True)
+            oldest = downtime + max(age for age, _ in stats)
+            hot_reads.seed(hot_read_key('get_all_player_stats', 'total_matches'), (rows, True), oldest)
+        match_store = MatchStore.restore(state['matches'])
+    except Exception as e:
+        print(f"Error loading warm cache: {e}")
+        return False
+    warm_cache_restored = True
+    return True
+
+@tasks.loop(seconds=MATCH_SYNC_SECONDS)
+async def warm_cache_sync():
+    """Keep the match store current with writes made outside the bot and save snapshots."""
+    if warm_cache_sync.current_loop == 0 and warm_cache_restored:
+        # The snapshot may be behind the database; refresh players in the background
+        await load_player_identities()
+    await match_store.sync()
+    if time.monotonic() - warm_cache_saved_at >= WARM_CACHE_SAVE_SECONDS:
+        await save_warm_cache()
+
 # ========================= NEW DATABASE FUNCTIONS FOR HEAD-TO-HEAD =========================
 
+@timed_helper
 async def get_head_to_head_stats(player1, player2):
     """Get head-to-head statistics between two players."""
     try:
         # Get all matches where both players participated
-        all_matches = supabase.table('matches').select('*').not_.is_('winner', 'null').execute()
+        if match_store.ready:
+            all_matches = match_store.rows_with(player1, player2, completed_only=True)
+        else:
+            all_matches = (await db_execute(supabase.table('matches').select('*').not_.is_('winner', 'null'))).data
         
         head_to_head = {
             'total_matches': 0,
@@ -457,15 +2302,19 @@ async def get_head_to_head_stats(player1, player2):
             'recent_matches': []
         }
         
-        for match in all_matches.data:
-            team1_players = match.get('team1_players', [])
-            team2_players = match.get('team2_players', [])
+        # Compare by player identity so renamed accounts count as one player
+        player1_key = player_identity.player_key(player1)
+        player2_key = player_identity.player_key(player2)
+        
+        for match in all_matches:
+            team1_keys = {player_identity.player_key(p) for p in parse_team_players(match.get('team1_players'))}
+            team2_keys = {player_identity.player_key(p) for p in parse_team_players(match.get('team2_players'))}
             
             # Check if both players are in this match
-            player1_in_team1 = any(p.lower() == player1.lower() for p in team1_players)
-            player1_in_team2 = any(p.lower() == player1.lower() for p in team2_players)
-            player2_in_team1 = any(p.lower() == player2.lower() for p in team1_players)
-            player2_in_team2 = any(p.lower() == player2.lower() for p in team2_players)
+            player1_in_team1 = player1_key in team1_keys
+            player1_in_team2 = player1_key in team2_keys
+            player2_in_team1 = player2_key in team1_keys
+            player2_in_team2 = player2_key in team2_keys
             
             # They played against each other
             if (player1_in_team1 and player2_in_team2) or (player1_in_team2 and player2_in_team1):
@@ -494,51 +2343,46 @@ async def get_head_to_head_stats(player1, player2):
         print(f"Error getting head-to-head stats: {e}")
         return {}, False
 
+@timed_helper
 async def get_most_played_with(player_name):
     """Get players this person has played with most often as teammates."""
     try:
         # Get all matches where this player participated
-        all_matches = supabase.table('matches').select('*').execute()
+        if match_store.ready:
+            all_matches = match_store.rows_with(player_name)
+        else:
+            all_matches = (await db_execute(supabase.table('matches').select('*'))).data
         
         teammate_counts = {}
+        teammate_names = {}
+        player_key = player_identity.player_key(player_name)
         
-        for match in all_matches.data:
+        for match in all_matches:
             # Parse team players - they might be stored as JSON strings
-            team1_players = match.get('team1_players', [])
-            team2_players = match.get('team2_players', [])
-            
-            # If they're strings, parse them as JSON
-            if isinstance(team1_players, str):
-                try:
-                    team1_players = json.loads(team1_players)
-                except json.JSONDecodeError:
-                    team1_players = []
+            team1_players = parse_team_players(match.get('team1_players', []))
+            team2_players = parse_team_players(match.get('team2_players', []))
             
-            if isinstance(team2_players, str):
-                try:
-                    team2_players = json.loads(team2_players)
-                except json.JSONDecodeError:
-                    team2_players = []
-            
-            # Ensure they're lists and filter out None values
-            team1_players = [p for p in (team1_players or []) if p is not None and str(p).strip()]
-            team2_players = [p for p in (team2_players or []) if p is not None and str(p).strip()]
-            
-            # Find which team the player was on
+            # Find which team the player was on (by identity, so old names still count)
+            team1_keys = [player_identity.player_key(str(p)) for p in team1_players]
+            team2_keys = [player_identity.player_key(str(p)) for p in team2_players]
             player_team = None
-            if any(str(p).lower() == str(player_name).lower() for p in team1_players):
-                player_team = team1_players
-            elif any(str(p).lower() == str(player_name).lower() for p in team2_players):
-                player_team = team2_players
+            if player_key in team1_keys:
+                player_team = zip(team1_players, team1_keys)
+            elif player_key in team2_keys:
+                player_team = zip(team2_players, team2_keys)
             
             if player_team:
                 # Count all other players on the same team as teammates
-                for teammate in player_team:
-                    if teammate and str(teammate).lower() != str(player_name).lower():
-                        teammate_counts[str(teammate)] = teammate_counts.get(str(teammate), 0) + 1
+                for teammate, teammate_key in player_team:
+                    if teammate_key != player_key:
+                        teammate_counts[teammate_key] = teammate_counts.get(teammate_key, 0) + 1
+                        teammate_names.setdefault(teammate_key, str(teammate))
         
-        # Sort by count and return top 10
-        sorted_teammates = sorted(teammate_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+        # Sort by count and return top 10, labelled with each player's current name
+        sorted_teammates = []
+        for teammate_key, count in sorted(teammate_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
+            record = player_identity.players.get(teammate_key)
+            sorted_teammates.append((record['username'] if record else teammate_names[teammate_key], count))
         
         return sorted_teammates, True
     except Exception as e:
@@ -646,6 +2490,8 @@ def calculate_overall_rating(player_stats):
     
     return round(overall_percentage, 2)
 
+@timed_helper
+@coalesced_read
 async def get_overall_leaderboard(min_games=20):
     """Get overall leaderboard with calculated ratings."""
     try:
@@ -661,8 +2507,8 @@ async def get_overall_leaderboard(min_games=20):
             if player.get('total_matches', 0) >= min_games:
                 overall_rating = calculate_overall_rating(player)
                 if overall_rating is not None:
-                    player['overall_rating'] = overall_rating
-                    rated_players.append(player)
+                    # Copy - the rows are shared with other cached readers
+                    rated_players.append(dict(player, overall_rating=overall_rating))
         
         # Sort by overall rating (highest first)
         rated_players.sort(key=lambda x: x['overall_rating'], reverse=True)
@@ -674,10 +2520,61 @@ async def get_overall_leaderboard(min_games=20):
 
 # ========================= Permission Check =========================
 
+MODERATOR_ROLE_NAMES = {"Moderators", "Admin", "Staff", "Moderator"}
+
+class GuildRoleIndex:
+    """Per-guild map from role ID to rank and moderator status.
+    
+    Built from each guild's roles on first use and rebuilt by the role events,
+    so checking a member is an intersection of their role IDs with the
+    guild's rank or moderator role IDs instead of a scan over role names.
+    """
+    
+    def __init__(self):
+        self.guilds = {}  # guild id -> {'ranks': {role id: (position, rank)}, 'moderators': set of role ids}
+    
+    def build(self, guild):
+        ranks = {}
+        moderators = set()
+        for role in guild.roles:
+            if role.name in ROLE_TO_RANK:
+                ranks[role.id] = (role.position, ROLE_TO_RANK[role.name])
+            if role.name in MODERATOR_ROLE_NAMES:
+                moderators.add(role.id)
+        entry = {'ranks': ranks, 'moderators': moderators}
+        self.guilds[guild.id] = entry
+        return entry
+    
+    def forget(self, guild):
+        self.guilds.pop(guild.id, None)
+    
+    def _entry(self, guild):
+        entry = self.guilds.get(guild.id)
+        return entry if entry is not None else self.build(guild)
+    
+    @staticmethod
+    def member_role_ids(member):
+        return {role.id for role in member.roles}
+    
+    def rank_for(self, member, guild):
+        """The rank of the member's rank role (the lowest one, if they have several), or None."""
+        if guild is None:
+            return None
+        ranks = self._entry(guild)['ranks']
+        matches = [ranks[role_id] for role_id in self.member_role_ids(member) if role_id in ranks]
+        return min(matches)[1] if matches else None
+    
+    def is_moderator(self, member, guild):
+        if guild is None:
+            return False
+        moderators = self._entry(guild)['moderators']
+        return not moderators.isdisjoint(self.member_role_ids(member))
+
+guild_roles = GuildRoleIndex()
+
 async def check_moderator_permission(ctx):
     """Check if the user has moderator permissions."""
-    allowed_roles = ["Moderators", "Admin", "Staff", "Moderator"]
-    has_permission = any(role.name in allowed_roles for role in ctx.author.roles)
+    has_permission = guild_roles.is_moderator(ctx.author, ctx.guild)
     
     if ctx.guild and ctx.author.id == ctx.guild.owner_id:
         has_permission = True
@@ -689,8 +2586,7 @@ async def check_moderator_permission(ctx):
 
 def check_moderator_permission_interaction(interaction):
     """Check if the user has moderator permissions for interactions."""
-    allowed_roles = ["Moderators", "Admin", "Staff", "Moderator"]
-    has_permission = any(role.name in allowed_roles for role in interaction.user.roles)
+    has_permission = guild_roles.is_moderator(interaction.user, interaction.guild)
     
     if interaction.guild and interaction.user.id == interaction.guild.owner_id:
         has_permission = True
@@ -699,167 +2595,386 @@ def check_moderator_permission_interaction(interaction):
 
 # ========================= UI Components =========================
 
-class MatchResultView(View):
-    """View for match result buttons in the results channel."""
-    
-    def __init__(self, match_id, team1_name, team2_name):
-        super().__init__(timeout=None)
-        self.match_id = match_id
-        self.team1_name = team1_name
-        self.team2_name = team2_name
+RESULT_JOB_ATTEMPTS = 4
+RESULT_JOB_RETRY_DELAY = 2  # seconds, doubled after each failed attempt
+result_jobs = OrderedDict()  # job id -> job dict, most recent last
+
+def start_result_job(match_id, winner_team, moderator_name, job_id, on_complete, pending_only=False, notify=None):
+    """Run update_match_result as a tracked background job with retries.
     
-    async def _handle_expired_interaction(self, interaction: discord.Interaction, winning_team: str):
-        """Handle expired interactions with appropriate moderator guidance."""
-        if not check_moderator_permission_interaction(interaction):
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message("❌ You need moderator permissions to update match results.", ephemeral=True)
-                else:
-                    await interaction.followup.send("❌ You need moderator permissions to update match results.", ephemeral=True)
-            except:
-                pass
-            return
-        
-        team_name = self.team1_name if winning_team == 'team1' else self.team2_name
-        team_letter = "teama" if winning_team == 'team1' else "teamb"
-        
-        expired_message = (
-            f"⏰ **Button Expired** - These buttons only work for 15 minutes after posting.\n\n"
-            f"✅ **To record that {team_name} won, use this command:**\n"
-            f"```!lf result {self.match_id} {team_letter}```\n\n"
-            f"💡 **Tip:** You can use this manual command anytime to update match results!"
+    The job ID doubles as the idempotency key, so once an attempt succeeds,
+    repeating the job returns its outcome instead of writing again.
+    on_complete(success, message) runs once the job finishes; `notify` is
+    passed on to update_match_result.
+    """
+    job = {
+        'id': job_id,
+        'match_id': match_id,
+        'winner': winner_team,
+        'moderator': moderator_name,
+        'status': 'pending',
+        'attempts': 0,
+        'message': '',
+        'created_at': datetime.now()
+    }
+    remember_recent(result_jobs, job_id, job)
+    task = asyncio.create_task(_run_result_job(job, on_complete, pending_only, notify))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return job
+
+async def _run_result_job(job, on_complete, pending_only, notify):
+    delay = RESULT_JOB_RETRY_DELAY
+    success, message = False, ""
+    for attempt in range(1, RESULT_JOB_ATTEMPTS + 1):
+        job['attempts'] = attempt
+        job['status'] = 'running'
+        success, message = await update_match_result(
+            job['match_id'], job['winner'], job['moderator'],
+            idempotency_key=job['id'], pending_only=pending_only, notify=notify
         )
-        
+        job['message'] = message
+        # Only backend errors are worth retrying
+        if success or message in (MATCH_NOT_FOUND, RESULT_ALREADY_SET) or attempt == RESULT_JOB_ATTEMPTS:
+            break
+        job['status'] = 'retrying'
+        await asyncio.sleep(delay)
+        delay *= 2
+    
+    job['status'] = 'done' if success else 'failed'
+    try:
+        await on_complete(success, message)
+    except Exception as e:
+        print(f"Error finishing result job {job['id']}: {e}")
+
+def component_template(view):
+    """Stop a view so sending it only renders its components.
+    
+    Clicks are routed by custom_id to the handlers registered in setup_hook,
+    so nothing is kept in memory per message and buttons survive restarts.
+    """
+    view.stop()
+    return view
+
+async def handle_expired_result_click(interaction: discord.Interaction, match_id, winning_team):
+    """Handle result clicks that can no longer be acknowledged with moderator guidance."""
+    if not check_moderator_permission_interaction(interaction):
         try:
             if not interaction.response.is_done():
-                await interaction.response.send_message(expired_message, ephemeral=True)
+                await interaction.response.send_message("❌ You need moderator permissions to update match results.", ephemeral=True)
             else:
-                await interaction.followup.send(expired_message, ephemeral=True)
+                await interaction.followup.send("❌ You need moderator permissions to update match results.", ephemeral=True)
         except:
-            try:
-                await interaction.user.send(f"Button expired for match {self.match_id}. Use: `!lf result {self.match_id} {team_letter}`")
-            except:
-                pass
-    
-    @discord.ui.button(label="Team A Won", style=discord.ButtonStyle.primary, emoji="🔵")
-    async def team_a_won(self, interaction: discord.Interaction, button: Button):
-        if not check_moderator_permission_interaction(interaction):
-            await interaction.response.send_message("❌ You need moderator permissions to update match results.", ephemeral=True)
-            return
-        
-        # Check if buttons are already disabled (match already completed)
-        if button.disabled:
-            await interaction.response.send_message("❌ This match result has already been updated.", ephemeral=True)
-            return
-        
+            pass
+        return
+    
+    team_label = "Team A" if winning_team == 'team1' else "Team B"
+    team_letter = "teama" if winning_team == 'team1' else "teamb"
+    
+    expired_message = (
+        f"⏰ **Click Expired** - Discord didn't get a response in time.\n\n"
+        f"✅ **To record that {team_label} won, use this command:**\n"
+        f"```!lf result {match_id} {team_letter}```\n\n"
+        f"💡 **Tip:** You can use this manual command anytime to update match results!"
+    )
+    
+    try:
+        if not interaction.response.is_done():
+            await interaction.response.send_message(expired_message, ephemeral=True)
+        else:
+            await interaction.followup.send(expired_message, ephemeral=True)
+    except:
         try:
-            success, message = await update_match_result(self.match_id, 'team1', interaction.user.display_name)
+            await interaction.user.send(f"Button expired for match {match_id}. Use: `!lf result {match_id} {team_letter}`")
+        except:
+            pass
+
+async def report_match_result(interaction: discord.Interaction, match_id, winning_team):
+    """Acknowledge a result click immediately and record the result in a background job."""
+    if not check_moderator_permission_interaction(interaction):
+        await interaction.response.send_message("❌ You need moderator permissions to update match results.", ephemeral=True)
+        return
+    
+    team_label = "Team A" if winning_team == 'team1' else "Team B"
+    team_letter = "teama" if winning_team == 'team1' else "teamb"
+    moderator_name = interaction.user.display_name
+    
+    try:
+        # Acknowledge inside Discord's 3-second window; the update runs afterwards
+        await interaction.response.defer()
+    except discord.NotFound:
+        # Message was deleted or interaction expired
+        await handle_expired_result_click(interaction, match_id, winning_team)
+        return
+    
+    async def on_complete(success, message):
+        if success:
+            match_data, found = await get_match_details(match_id)
+            team_name_key = 'team1_name' if winning_team == 'team1' else 'team2_name'
+            team_name = match_data[team_name_key] if found else team_label
+            # A queued result can still be refused on replay, so it isn't announced as final
+            queued = message == WRITE_QUEUED
+            embed = discord.Embed(
+                title="⏳ Match Result Queued" if queued else "🏆 Match Result Updated!",
+                description=f"**{team_label}: {team_name}** " + ("win is waiting to be recorded." if queued else "wins!"),
+                color=ORANGE_COLOR if queued else GREEN_COLOR
+            )
+            embed.add_field(name="Match ID", value=match_id, inline=True)
+            embed.add_field(name="Updated by", value=moderator_name, inline=True)
+            if queued:
+                embed.add_field(name="⏳ Queued", value=f"{message} {moderator_name} will be pinged here once it is.", inline=False)
             
-            if success:
-                embed = discord.Embed(
-                    title="🏆 Match Result Updated!",
-                    description=f"**Team A: {self.team1_name}** wins!",
-                    color=GREEN_COLOR
-                )
-                embed.add_field(name="Match ID", value=self.match_id, inline=True)
-                embed.add_field(name="Updated by", value=interaction.user.display_name, inline=True)
-                
-                # Disable buttons
-                for item in self.children:
-                    item.disabled = True
-                
-                # Check if interaction is still valid
-                if not interaction.response.is_done():
-                    await interaction.response.edit_message(embed=embed, view=self)
-                else:
-                    # If interaction already responded, try followup
-                    await interaction.followup.edit_message(interaction.message.id, embed=embed, view=self)
-            else:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(f"❌ {message}", ephemeral=True)
-                else:
-                    await interaction.followup.send(f"❌ {message}", ephemeral=True)
-                    
-        except discord.NotFound:
-            # Message was deleted or interaction expired
-            await self._handle_expired_interaction(interaction, 'team1')
-        except discord.errors.InteractionResponded:
-            # Interaction already responded to
+            # Edit through the channel so this still works after the interaction token expires
+            view = component_template(MatchResultView(match_id, disabled=True))
+            await interaction.message.edit(embed=embed, view=view)
+        else:
+            failure = f"❌ {message}"
+            if message not in (MATCH_NOT_FOUND, RESULT_ALREADY_SET):
+                failure += f"\nUse `!lf result {match_id} {team_letter}` to try again."
+            await interaction.followup.send(failure, ephemeral=True)
+    
+    job_id = f"interaction:{interaction.id}"
+    notify = {'channel_id': interaction.channel.id, 'user_id': interaction.user.id}
+    start_result_job(match_id, winning_team, moderator_name, job_id, on_complete, pending_only=True, notify=notify)
+    try:
+        await interaction.followup.send(
+            f"⏳ Recording **{team_label}** win for match `{match_id}`. Use `!lf jobs` to check progress.",
+            ephemeral=True
+        )
+    except Exception as e:
+        print(f"Error sending result job notice: {e}")
+
+class MatchResultButton(discord.ui.DynamicItem[Button], template=r'lf:result:(?P<match_id>[A-Z0-9]+):(?P<winning_team>team[12])'):
+    """Result button whose custom_id carries the match ID and winning team."""
+    
+    def __init__(self, match_id, winning_team, disabled=False):
+        if winning_team == 'team1':
+            button = Button(label="Team A Won", style=discord.ButtonStyle.primary, emoji="🔵")
+        else:
+            button = Button(label="Team B Won", style=discord.ButtonStyle.danger, emoji="🔴")
+        button.custom_id = f"lf:result:{match_id}:{winning_team}"
+        button.disabled = disabled
+        super().__init__(button)
+        self.match_id = match_id
+        self.winning_team = winning_team
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match):
+        return cls(match['match_id'], match['winning_team'])
+    
+    async def callback(self, interaction: discord.Interaction):
+        async with metrics.track('button', 'match_result'):
+            await report_match_result(interaction, self.match_id, self.winning_team)
+
+class MatchResultView(View):
+    """View for match result buttons in the results channel."""
+    
+    def __init__(self, match_id, disabled=False):
+        super().__init__(timeout=None)
+        self.add_item(MatchResultButton(match_id, 'team1', disabled))
+        self.add_item(MatchResultButton(match_id, 'team2', disabled))
+
+# ========================= Queue Timers =========================
+
+QUEUE_TIMEOUT_SECONDS = 15 * 60
+QUEUE_TIMER_KEY = 'queue'
+TIMER_WHEEL_TICK = 1.0  # seconds per slot
+TIMER_WHEEL_SLOTS = 1024  # one lap covers 17 minutes; longer deadlines wait extra laps
+
+class TimerWheel:
+    """Hashed timing wheel that owns every queue deadline.
+    
+    Deadlines are bucketed by tick, so scheduling, rescheduling and cancelling
+    a key are O(1) dict operations. A single task advances the wheel once per
+    tick while anything is scheduled and fires the callbacks that come due,
+    instead of one sleeping task per queue.
+    """
+    
+    def __init__(self, tick=TIMER_WHEEL_TICK, slots=TIMER_WHEEL_SLOTS):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]  # slot -> {key: due tick}
+        self.entries = {}  # key -> (deadline, due tick, callback)
+        self.origin = None
+        self.position = 0  # last tick processed
+        self.task = None
+    
+    def _now(self):
+        return asyncio.get_running_loop().time()
+    
+    def schedule(self, key, delay, callback):
+        """Run `await callback()` after `delay` seconds, replacing any deadline for `key`."""
+        now = self._now()
+        if self.origin is None:
+            self.origin = now
+        if self.task is None or self.task.done():
+            # The wheel stops while empty; skip the ticks it slept through
+            self.position = int((now - self.origin) / self.tick)
+        self.cancel(key)
+        deadline = now + delay
+        due = max(self.position + 1, int((deadline - self.origin) / self.tick) + 1)
+        self.slots[due % len(self.slots)][key] = due
+        self.entries[key] = (deadline, due, callback)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+    
+    def cancel(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.slots[entry[1] % len(self.slots)].pop(key, None)
+    
+    def remaining(self, key):
+        """Seconds until `key` fires, or None if nothing is scheduled for it."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        return max(0.0, entry[0] - self._now())
+    
+    async def _run(self):
+        while self.entries:
+            next_tick = self.origin + (self.position + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_tick - self._now()))
+            # Catch up on every tick that passed, e.g. after the loop was blocked
+            current = int((self._now() - self.origin) / self.tick)
+            while self.position < current:
+                self.position += 1
+                self._fire(self.slots[self.position % len(self.slots)])
+    
+    def _fire(self, slot):
+        for key, due in list(slot.items()):
+            if due > self.position:
+                continue  # due on a later lap
+            del slot[key]
+            _, _, callback = self.entries.pop(key)
+            task = asyncio.create_task(callback())
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+
+queue_deadlines = TimerWheel()
+
+def arm_queue_timer(destination, delay=QUEUE_TIMEOUT_SECONDS):
+    """Start the inactivity countdown for the queue; expiry is announced in `destination`."""
+    queue_deadlines.schedule(QUEUE_TIMER_KEY, delay, lambda: expire_queue(destination))
+    queue_snapshots.deadline = time.time() + delay
+    queue_snapshots.channel_id = getattr(destination, 'channel', destination).id
+    queue_snapshots.mark_dirty()
+
+def cancel_queue_timer():
+    queue_deadlines.cancel(QUEUE_TIMER_KEY)
+    queue_snapshots.deadline = None
+    queue_snapshots.mark_dirty()
+
+def add_time_remaining_field(embed):
+    """Show the time left before the queue resets, if its countdown is running."""
+    remaining = queue_deadlines.remaining(QUEUE_TIMER_KEY)
+    if remaining is None:
+        return
+    minutes, seconds = divmod(int(remaining), 60)
+    embed.add_field(
+        name="⏰ Time Remaining",
+        value=f"**{minutes}m {seconds}s** until queue reset",
+        inline=False
+    )
+
+async def expire_queue(destination):
+    """Reset the queue after 15 minutes."""
+    global player_pool
+    
+    queue_snapshots.deadline = None
+    if player_pool:
+        player_pool = []
+        queue_snapshots.mark_dirty()
+        await destination.send("⏰ Queue has been reset due to inactivity (15 minutes timer expired).")
+        embed, view = await display_queue()
+        await destination.send(embed=embed, view=view)
+
+# ========================= Queue Snapshots =========================
+
+QUEUE_SNAPSHOT_PATH = os.getenv('QUEUE_SNAPSHOT_PATH', 'lof_queue.json')
+QUEUE_SNAPSHOT_VERSION = 1
+QUEUE_SNAPSHOT_DELAY = 0.5  # seconds; changes within this window share one write
+
+class QueueSnapshots:
+    """Keeps the queue on disk so restarts and deploys don't empty it.
+    
+    Every change marks the queue dirty and at most one write per
+    QUEUE_SNAPSHOT_DELAY saves the latest state, to a temporary file that
+    then atomically replaces the snapshot. The deadline is stored as a
+    wall-clock time, so the countdown keeps running across the restart.
+    """
+    
+    def __init__(self, path=QUEUE_SNAPSHOT_PATH):
+        self.path = path
+        self.deadline = None  # time.time() when the queue expires
+        self.channel_id = None  # where expiry is announced
+        self.pending = None
+        self.lock = asyncio.Lock()
+    
+    def capture(self):
+        return {
+            'version': QUEUE_SNAPSHOT_VERSION,
+            'saved_at': time.time(),
+            'players': [list(player) for player in player_pool],
+            'deadline': self.deadline,
+            'channel_id': self.channel_id
+        }
+    
+    def mark_dirty(self):
+        if self.pending is None:
+            self.pending = asyncio.create_task(self._flush())
+    
+    async def _flush(self):
+        await asyncio.sleep(QUEUE_SNAPSHOT_DELAY)
+        self.pending = None  # later changes schedule the next write
+        async with self.lock:
             try:
-                await interaction.followup.send("❌ Unable to process the request. Please try again.", ephemeral=True)
-            except:
-                pass
+                await asyncio.get_running_loop().run_in_executor(None, self._write, self.capture())
+            except Exception as e:
+                print(f"Error saving queue snapshot: {e}")
+    
+    def _write(self, state):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+    
+    def flush_now(self):
+        """Write the current state immediately, e.g. once the bot has shut down."""
+        try:
+            self._write(self.capture())
         except Exception as e:
-            print(f"Error in team_a_won: {e}")
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message("❌ An error occurred while processing the result.", ephemeral=True)
-                else:
-                    await interaction.followup.send("❌ An error occurred while processing the result.", ephemeral=True)
-            except:
-                pass
-    
-    @discord.ui.button(label="Team B Won", style=discord.ButtonStyle.danger, emoji="🔴")
-    async def team_b_won(self, interaction: discord.Interaction, button: Button):
-        if not check_moderator_permission_interaction(interaction):
-            await interaction.response.send_message("❌ You need moderator permissions to update match results.", ephemeral=True)
-            return
-        
-        # Check if buttons are already disabled (match already completed)
-        if button.disabled:
-            await interaction.response.send_message("❌ This match result has already been updated.", ephemeral=True)
-            return
+            print(f"Error saving queue snapshot: {e}")
+    
+    def restore(self):
+        """Load the saved queue and re-arm its countdown. Returns the number of players restored."""
+        global player_pool
         
         try:
-            success, message = await update_match_result(self.match_id, 'team2', interaction.user.display_name)
-            
-            if success:
-                embed = discord.Embed(
-                    title="🏆 Match Result Updated!",
-                    description=f"**Team B: {self.team2_name}** wins!",
-                    color=GREEN_COLOR
-                )
-                embed.add_field(name="Match ID", value=self.match_id, inline=True)
-                embed.add_field(name="Updated by", value=interaction.user.display_name, inline=True)
-                
-                # Disable buttons
-                for item in self.children:
-                    item.disabled = True
-                
-                # Check if interaction is still valid
-                if not interaction.response.is_done():
-                    await interaction.response.edit_message(embed=embed, view=self)
-                else:
-                    # If interaction already responded, try followup
-                    await interaction.followup.edit_message(interaction.message.id, embed=embed, view=self)
-            else:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message(f"❌ {message}", ephemeral=True)
-                else:
-                    await interaction.followup.send(f"❌ {message}", ephemeral=True)
-                    
-        except discord.NotFound:
-            # Message was deleted or interaction expired
-            await self._handle_expired_interaction(interaction, 'team2')
-        except discord.errors.InteractionResponded:
-            # Interaction already responded to
-            try:
-                await interaction.followup.send("❌ Unable to process the request. Please try again.", ephemeral=True)
-            except:
-                pass
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return 0
         except Exception as e:
-            print(f"Error in team_b_won: {e}")
-            try:
-                if not interaction.response.is_done():
-                    await interaction.response.send_message("❌ An error occurred while processing the result.", ephemeral=True)
-                else:
-                    await interaction.followup.send("❌ An error occurred while processing the result.", ephemeral=True)
-            except:
-                pass
+            print(f"Error loading queue snapshot: {e}")
+            return 0
+        if state.get('version') != QUEUE_SNAPSHOT_VERSION:
+            print(f"Ignoring queue snapshot with version {state.get('version')}")
+            return 0
+        
+        player_pool = [tuple(player) for player in state['players']]
+        self.channel_id = state.get('channel_id')
+        if player_pool and state.get('deadline') and self.channel_id:
+            # An expired deadline fires on the next tick and announces the reset
+            delay = max(0.0, state['deadline'] - time.time())
+            arm_queue_timer(bot.get_partial_messageable(self.channel_id), delay)
+        return len(player_pool)
+
+queue_snapshots = QueueSnapshots()
 
 # ========================= Bot Functions =========================
 
-async def display_queue(ctx):
+async def display_queue():
     """Displays the current queue as an embed and includes a join button."""
     embed = discord.Embed(title="🎮 League of Legends Match Queue", color=BLUE_COLOR)
     
@@ -882,19 +2997,11 @@ async def display_queue(ctx):
             inline=False
         )
         
-        if queue_timer and not queue_timer.done():
-            elapsed = (asyncio.get_event_loop().time() - queue_start_time)  # in seconds
-            remaining_mins = max(0, (15*60 - elapsed) // 60)
-            remaining_secs = max(0, (15*60 - elapsed) % 60)
-            embed.add_field(
-                name="⏰ Time Remaining", 
-                value=f"**{int(remaining_mins)}m {int(remaining_secs)}s** until queue reset", 
-                inline=False
-            )
+        add_time_remaining_field(embed)
     
     embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
     
-    view = QueueView(ctx)
+    view = component_template(QueueView())
     return embed, view
 
 def create_progress_bar(current, maximum, length=10):
@@ -930,119 +3037,137 @@ def get_tier_emoji(tier):
     }
     return tier_emojis.get(tier, "❓")
 
-async def reset_queue_timer(ctx):
-    """Reset the queue after 15 minutes."""
-    global player_pool, queue_timer
+def get_position_emoji(idx):
+    """Returns the medal or number shown for a leaderboard position."""
+    if idx == 0:
+        return "🥇"
+    elif idx == 1:
+        return "🥈"
+    elif idx == 2:
+        return "🥉"
+    return f"`{idx+1}.`"
+
+def get_win_rate_emoji(win_rate):
+    """Returns an emoji for a win rate percentage."""
+    if win_rate >= 70:
+        return "🔥"
+    elif win_rate >= 50:
+        return "👍"
+    return "📉"
+
+def get_rating_emoji(rating):
+    """Returns an emoji for an overall rating percentage."""
+    if rating >= 70:
+        return "🔥"
+    elif rating >= 60:
+        return "⭐"
+    elif rating >= 50:
+        return "👍"
+    return "📊"
+
+async def queue_join_clicked(interaction: discord.Interaction):
+    """Handles join queue button click."""
+    global player_pool
     
-    try:
-        await asyncio.sleep(15 * 60) 
-        if player_pool:
-            await ctx.send("⏰ Queue has been reset due to inactivity (15 minutes timer expired).")
-            player_pool = []
-            embed, view = await display_queue(ctx)
-            await ctx.send(embed=embed, view=view)
-    except asyncio.CancelledError:
-        pass 
-    finally:
-        queue_timer = None
+    member = interaction.user
+    channel = interaction.channel
+    name = member.display_name
+    
+    for existing_player in player_pool:
+        if existing_player[0].lower() == name.lower():
+            await interaction.response.send_message(f"**{name}** is already in the queue. To update your rank, use `!lf leave` first, then rejoin with the correct rank.", ephemeral=True)
+            return
+    
+    found_rank = guild_roles.rank_for(member, interaction.guild)
+    
+    if found_rank is None:
+        await interaction.response.send_message(
+            "❌ No rank role detected. Please assign yourself a rank role or use `!lf join [name] [rank]` to specify your rank.", 
+            ephemeral=True
+        )
+        return
+    
+    player_info = (name, found_rank, TIER_POINTS[found_rank])  # Removed user_id
+    player_pool.append(player_info)
+    queue_snapshots.mark_dirty()
+    cache_queue_member(interaction.guild, member)
+    await register_player_alias(member.id, name)
 
-class QueueView(View):
-    """A view for the join and leave queue buttons."""
+    if len(player_pool) == 1:
+        arm_queue_timer(channel)
     
-    def __init__(self, ctx):
-        super().__init__(timeout=None)
-        self.ctx = ctx
+    embed, view = await display_queue()
+    await interaction.response.send_message(f"✅ **{name}** joined the queue as **{found_rank}**.", embed=embed, view=view)
     
-    @discord.ui.button(label="Join Queue", style=discord.ButtonStyle.green, emoji="✅")
-    async def join_queue_button(self, interaction: discord.Interaction, button: Button):
-        """Handles join queue button click."""
-        global player_pool, queue_timer, queue_start_time
-        
-        member = interaction.user
-        name = member.display_name
+    if len(player_pool) >= 10:
+        cancel_queue_timer()
         
-        for existing_player in player_pool:
-            if existing_player[0].lower() == name.lower():
-                await interaction.response.send_message(f"**{name}** is already in the queue. To update your rank, use `!lf leave` first, then rejoin with the correct rank.", ephemeral=True)
-                return
+        teams_embed, match_id = await create_balanced_teams(player_pool[:10])
+        await channel.send("🎮 **Queue is full! Creating balanced teams:**", embed=teams_embed)
         
-        found_rank = None
-        for role in member.roles:
-            role_name = role.name
-            if role_name in ROLE_TO_RANK:
-                found_rank = ROLE_TO_RANK[role_name]
-                break
+        # Post to results channel if it exists
+        if match_id:
+            await post_to_results_channel(interaction.guild, teams_embed, match_id)
         
-        if found_rank is None:
-            await interaction.response.send_message(
-                "❌ No rank role detected. Please assign yourself a rank role or use `!lf join [name] [rank]` to specify your rank.", 
-                ephemeral=True
-            )
-            return
+        del player_pool[:10]
+        queue_snapshots.mark_dirty()
         
-        player_info = (name, found_rank, TIER_POINTS[found_rank])  # Removed user_id
-        player_pool.append(player_info)
-
-        if len(player_pool) == 1:
-            queue_start_time = asyncio.get_event_loop().time()
-            if queue_timer:
-                queue_timer.cancel()
-            queue_timer = asyncio.create_task(reset_queue_timer(self.ctx))
+        if player_pool:
+            arm_queue_timer(channel)
+            remaining_embed, remaining_view = await display_queue()
+            await channel.send("**Players remaining in queue:**", embed=remaining_embed, view=remaining_view)
         
-        embed, view = await display_queue(self.ctx)
-        await interaction.response.send_message(f"✅ **{name}** joined the queue as **{found_rank}**.", embed=embed, view=view)
+        lobby_embed = discord.Embed(
+            title="🎮 Custom Game Lobby", 
+            description="Click the button below to join the queue!",
+            color=BLUE_COLOR
+        )
+        lobby_embed.add_field(name="Queue Status", value=f"{len(player_pool)}/10 players")
+        lobby_embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
         
-        if len(player_pool) >= 10:
-            if queue_timer and not queue_timer.done():
-                queue_timer.cancel()
-                queue_timer = None
-            
-            teams_embed, match_id = await create_balanced_teams(player_pool[:10])
-            await self.ctx.send("🎮 **Queue is full! Creating balanced teams:**", embed=teams_embed)
-            
-            # Post to results channel if it exists
-            if match_id:
-                await post_to_results_channel(self.ctx.guild, teams_embed, match_id)
-            
-            del player_pool[:10]
-            
-            if player_pool:
-                queue_start_time = asyncio.get_event_loop().time()
-                queue_timer = asyncio.create_task(reset_queue_timer(self.ctx))
-                remaining_embed, remaining_view = await display_queue(self.ctx)
-                await self.ctx.send("**Players remaining in queue:**", embed=remaining_embed, view=remaining_view)
-            
-            lobby_embed = discord.Embed(
-                title="🎮 Custom Game Lobby", 
-                description="Click the button below to join the queue!",
-                color=BLUE_COLOR
-            )
-            lobby_embed.add_field(name="Queue Status", value=f"{len(player_pool)}/10 players")
-            lobby_embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
-            
-            lobby_view = QueueView(self.ctx)
-            await interaction.message.edit(embed=lobby_embed, view=lobby_view)
+        lobby_view = component_template(QueueView())
+        await interaction.message.edit(embed=lobby_embed, view=lobby_view)
+
+async def queue_leave_clicked(interaction: discord.Interaction):
+    """Handles leave queue button click."""
+    global player_pool
     
-    @discord.ui.button(label="Leave Queue", style=discord.ButtonStyle.red, emoji="😩")
-    async def leave_queue_button(self, interaction: discord.Interaction, button: Button):
-        """Handles leave queue button click."""
-        global player_pool
-        
-        member = interaction.user
-        name = member.display_name
-        
-        player_found = False
-        for i, player in enumerate(player_pool):
-            if player[0].lower() == name.lower():
-                del player_pool[i]
-                player_found = True
-                break
-        
-        if player_found:
-            embed, view = await display_queue(self.ctx)
-            await interaction.response.send_message(f"❌ **{name}** has left the queue.", embed=embed, view=view)
-        else:
-            await interaction.response.send_message(f"You're not currently in the queue, **{name}**.", ephemeral=True)
+    member = interaction.user
+    name = member.display_name
+    
+    player_found = False
+    for i, player in enumerate(player_pool):
+        if player[0].lower() == name.lower():
+            del player_pool[i]
+            queue_snapshots.mark_dirty()
+            player_found = True
+            break
+    
+    if player_found:
+        embed, view = await display_queue()
+        await interaction.response.send_message(f"❌ **{name}** has left the queue.", embed=embed, view=view)
+    else:
+        await interaction.response.send_message(f"You're not currently in the queue, **{name}**.", ephemeral=True)
+
+class QueueView(View):
+    """A view for the join and leave queue buttons.
+    
+    The custom_ids are fixed, so the instance registered in setup_hook serves
+    every queue message, including ones posted before a restart.
+    """
+    
+    def __init__(self):
+        super().__init__(timeout=None)
+    
+    @discord.ui.button(label="Join Queue", style=discord.ButtonStyle.green, emoji="✅", custom_id="lf:queue:join")
+    async def join_queue_button(self, interaction: discord.Interaction, button: Button):
+        async with metrics.track('button', 'queue_join'):
+            await queue_join_clicked(interaction)
+    
+    @discord.ui.button(label="Leave Queue", style=discord.ButtonStyle.red, emoji="😩", custom_id="lf:queue:leave")
+    async def leave_queue_button(self, interaction: discord.Interaction, button: Button):
+        async with metrics.track('button', 'queue_leave'):
+            await queue_leave_clicked(interaction)
 
 async def create_balanced_teams(players):
     """Create balanced 5v5 teams from a list of players and store in database."""
@@ -1121,15 +3246,6 @@ async def post_to_results_channel(guild, embed, match_id):
                 break
         
         if results_channel:
-            # Get team names from embed
-            team1_name = "Team A"
-            team2_name = "Team B"
-            for field in embed.fields:
-                if "Team A:" in field.name:
-                    team1_name = field.name.split("Team A: ")[1].split(" (")[0]
-                elif "Team B:" in field.name:
-                    team2_name = field.name.split("Team B: ")[1].split(" (")[0]
-            
             # Create result embed
             result_embed = discord.Embed(
                 title="🎮 Match Created - Report Results",
@@ -1148,21 +3264,13 @@ async def post_to_results_channel(guild, embed, match_id):
                 inline=False
             )
             
-            view = MatchResultView(match_id, team1_name, team2_name)
+            view = component_template(MatchResultView(match_id))
             await results_channel.send(embed=result_embed, view=view)
     except Exception as e:
         print(f"Error posting to results channel: {e}")
 
-@bot.command(name='overall', aliases=['or', 'topoverall'])
-async def show_overall_leaderboard(ctx):
-    """Show the overall player rankings using Bayesian + Fairness algorithm."""
-    
-    leaderboard_data, found = await get_overall_leaderboard(20)
-    
-    if not found or not leaderboard_data:
-        await ctx.send("❌ No overall leaderboard data found. Players need at least **20 games** to be ranked.")
-        return
-    
+def build_overall_leaderboard_embed(leaderboard_data):
+    """Build the overall rankings embed."""
     embed = discord.Embed(
         title="🏆 Overall Player Rankings",
         description="*Bayesian Average (90%) + Performance Factors (10%)*\n*Minimum 20 games required*",
@@ -1173,25 +3281,11 @@ async def show_overall_leaderboard(ctx):
     leaderboard_lines = []
     for idx, player in enumerate(leaderboard_data):
         # Position emoji
-        if idx == 0:
-            position = "🥇"
-        elif idx == 1:
-            position = "🥈"
-        elif idx == 2:
-            position = "🥉"
-        else:
-            position = f"`{idx+1}.`"
+        position = get_position_emoji(idx)
         
         # Overall rating with visual indicator
         overall_rating = player['overall_rating']
-        if overall_rating >= 70:
-            rating_emoji = "🔥"
-        elif overall_rating >= 60:
-            rating_emoji = "⭐"
-        elif overall_rating >= 50:
-            rating_emoji = "👍"
-        else:
-            rating_emoji = "📊"
+        rating_emoji = get_rating_emoji(overall_rating)
         
         # Recent form
         recent_form = player.get('recent_form', '')
@@ -1247,17 +3341,81 @@ async def show_overall_leaderboard(ctx):
     )
     
     embed.set_footer(text=f"Use !lf stats [player] for detailed breakdown | {WEBSITE_URL}")
+    return embed
+
+@bot.command(name='overall', aliases=['or', 'topoverall'])
+async def show_overall_leaderboard(ctx):
+    """Show the overall player rankings using Bayesian + Fairness algorithm."""
+    cache_key = ('overall', stats_data_version)
+    embed = render_cache.get(cache_key)
+    if embed is None:
+        leaderboard_data, found = await get_overall_leaderboard(20)
+        
+        if not found or not leaderboard_data:
+            await ctx.send("❌ No overall leaderboard data found. Players need at least **20 games** to be ranked.")
+            return
+        
+        embed = build_overall_leaderboard_embed(leaderboard_data)
+        render_cache.put(cache_key, embed)
+    
     await ctx.send(embed=embed)
 
 
 # ========================= Auto Leaderboard Task =========================
 
 
+background_tasks = set()
+metrics_server = None
+
+@bot.event
+async def setup_hook():
+    """Register the persistent component handlers, restore saved state and start monitoring before connecting."""
+    bot.add_view(QueueView())
+    bot.add_dynamic_items(MatchResultButton)
+    restored = queue_snapshots.restore()
+    if restored:
+        print(f"Restored {restored} queued player(s) from {queue_snapshots.path}")
+    if load_warm_cache():
+        print(f"Restored {len(player_identity.players)} players and {len(match_store.match_ids)} matches from {WARM_CACHE_PATH}")
+    global metrics_server
+    background_tasks.add(asyncio.create_task(monitor_loop_lag()))
+    metrics_server = await start_metrics_server()
+
+@bot.before_invoke
+async def start_command_metrics(ctx):
+    ctx.operation = metrics.begin('command', ctx.command.qualified_name)
+    if command_profiler.session is not None:
+        command_profiler.command_started(ctx)
+
+@bot.after_invoke
+async def finish_command_metrics(ctx):
+    if command_profiler.session is not None:
+        await command_profiler.command_finished(ctx)
+    if getattr(ctx, 'operation', None) is not None:
+        metrics.finish(ctx.operation, failed=ctx.command_failed)
+
 @bot.event
 async def on_ready():
     print(f'{bot.user} has connected to Discord!')
     activity = discord.Game(name="League of Flex | !lf information")
     await bot.change_presence(activity=activity)
+    await write_journal.open()
+    if not journal_replay.is_running():
+        journal_replay.start()
+    await warm_http_pool()
+    if not player_identity.loaded:
+        await load_player_identities()
+    if not warm_cache_sync.is_running():
+        warm_cache_sync.start()
+    for guild in bot.guilds:
+        guild_roles.build(guild)
+    global slash_commands_synced
+    if not slash_commands_synced:
+        try:
+            await bot.tree.sync()
+            slash_commands_synced = True
+        except Exception as e:
+            print(f"Error syncing slash commands: {e}")
     if not auto_leaderboard.is_running():
         auto_leaderboard.start()
 
@@ -1272,23 +3430,15 @@ async def start_lobby(ctx):
     
     embed.add_field(name="Queue Status", value=f"{len(player_pool)}/10 players")
     
-    if queue_timer and not queue_timer.done() and queue_start_time:
-        elapsed = (asyncio.get_event_loop().time() - queue_start_time)  # in seconds
-        remaining_mins = max(0, (15*60 - elapsed) // 60)
-        remaining_secs = max(0, (15*60 - elapsed) % 60)
-        embed.add_field(
-            name="⏰ Time Remaining", 
-            value=f"**{int(remaining_mins)}m {int(remaining_secs)}s** until queue reset",
-            inline=False
-        )
+    add_time_remaining_field(embed)
     
     embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
-    view = QueueView(ctx)
+    view = component_template(QueueView())
     
     lobby_message = await ctx.send(embed=embed, view=view)
     
     if player_pool:
-        queue_embed, queue_view = await display_queue(ctx)
+        queue_embed, queue_view = await display_queue()
         await ctx.send("Current queue:", embed=queue_embed, view=queue_view)
 
 @bot.command(name='tiers')
@@ -1317,6 +3467,12 @@ async def tiers_command(ctx):
 async def auto_leaderboard():
     """Automatically post leaderboard every 3 hours."""
     try:
+        # The data is the same for every guild, so load it once with both queries in flight together
+        (leaderboard_data, found), (daily_stats, stats_found) = await asyncio.gather(
+            get_leaderboard('total_matches', 1),
+            get_daily_server_stats()
+        )
+        
         for guild in bot.guilds:
             # Try multiple channel name variations
             possible_names = ["📊︱customs-leaderboard", "customs-leaderboard", "📊customs-leaderboard", "leaderboard"]
@@ -1328,10 +3484,6 @@ async def auto_leaderboard():
                     break
             
             if leaderboard_channel:
-                # Get leaderboard data
-                leaderboard_data, found = await get_leaderboard('total_matches', 1)
-                daily_stats, stats_found = await get_daily_server_stats()
-                
                 if found and leaderboard_data:
                     embed = discord.Embed(
                         title="🏆 Server Leaderboard",
@@ -1354,23 +3506,10 @@ async def auto_leaderboard():
                     leaderboard_lines = []
                     for idx, player in enumerate(leaderboard_data[:10]):
                         # Position emoji
-                        if idx == 0:
-                            position = "🥇"
-                        elif idx == 1:
-                            position = "🥈"
-                        elif idx == 2:
-                            position = "🥉"
-                        else:
-                            position = f"`{idx+1}.`"
+                        position = get_position_emoji(idx)
                         
                         # Win rate emoji
-                        win_rate = player['win_rate']
-                        if win_rate >= 70:
-                            wr_emoji = "🔥"
-                        elif win_rate >= 50:
-                            wr_emoji = "👍"
-                        else:
-                            wr_emoji = "📉"
+                        wr_emoji = get_win_rate_emoji(player['win_rate'])
                         
                         # Recent form
                         recent_form = player.get('recent_form', '')
@@ -1436,11 +3575,12 @@ async def leave_queue(ctx, name=None):
     for i, player in enumerate(player_pool):
         if player[0].lower() == name.lower():
             del player_pool[i]
+            queue_snapshots.mark_dirty()
             player_found = True
             break
     
     if player_found:
-        embed, view = await display_queue(ctx)
+        embed, view = await display_queue()
         await ctx.send(f"❌ **{name}** has left the queue.", embed=embed, view=view)
     else:
         await ctx.send(f"**{name}** is not currently in the queue.")
@@ -1448,7 +3588,7 @@ async def leave_queue(ctx, name=None):
 @bot.command(name='queueclear')
 async def clear_queue(ctx):
     """Clears the current queue and cancels the timer."""
-    global player_pool, queue_timer
+    global player_pool
     
     if not player_pool:
         await ctx.send("Queue is already empty.")
@@ -1457,19 +3597,17 @@ async def clear_queue(ctx):
     player_count = len(player_pool)
     player_pool = []
     
-    if queue_timer and not queue_timer.done():
-        queue_timer.cancel()
-        queue_timer = None
+    cancel_queue_timer()
     
     await ctx.send(f"🧹 Queue cleared. Removed **{player_count}** player(s).")
-    embed, view = await display_queue(ctx)
+    embed, view = await display_queue()
     await ctx.send(embed=embed, view=view)
 
 @bot.command(name='queue')
 async def show_queue(ctx):
     """Shows the current queue and creates one if it doesn't exist."""
     try:
-        embed, view = await display_queue(ctx)
+        embed, view = await display_queue()
         await ctx.send(embed=embed, view=view)
     except Exception as e:
         print(f"Error in queue command: {str(e)}")
@@ -1511,7 +3649,7 @@ async def team_balance(ctx, *, input_text=None):
 @bot.command(name='clear')
 async def clear_players(ctx):
     """Clears the player queue."""
-    global player_pool, queue_timer
+    global player_pool
     
     if not player_pool:
         await ctx.send("Queue is already empty.")
@@ -1520,9 +3658,7 @@ async def clear_players(ctx):
     player_count = len(player_pool)
     player_pool = []
     
-    if queue_timer and not queue_timer.done():
-        queue_timer.cancel()
-        queue_timer = None
+    cancel_queue_timer()
     
     await ctx.send(f"🧹 Player queue has been cleared. Removed **{player_count}** player(s).")
 
@@ -1554,26 +3690,38 @@ async def edit_result(ctx, match_id=None, winner=None):
     
     # Check if match exists first
     match_data, found = await get_match_details(match_id.upper())
-    if not found:
+    # While writes are queued the lookup may just be failing, so let the journal decide later
+    if not found and not write_journal.backlog:
         await ctx.send("❌ Match not found")
         return
     
-    if match_data['winner'] is None:
+    if found and match_data['winner'] is None:
         await ctx.send("❌ This match has no result to edit. Use `!lf result` instead.")
         return
     
-    success, message = await update_match_result(match_id.upper(), db_winner, ctx.author.display_name)
+    success, message = await update_match_result(
+        match_id.upper(), db_winner, ctx.author.display_name,
+        match=match_data if found else None, idempotency_key=f"message:{ctx.message.id}",
+        notify={'channel_id': ctx.channel.id, 'user_id': ctx.author.id}
+    )
     
     if success:
-        winning_team_name = match_data['team1_name'] if db_winner == 'team1' else match_data['team2_name']
+        if found:
+            winning_team_name = match_data['team1_name'] if db_winner == 'team1' else match_data['team2_name']
+        else:
+            winning_team_name = "Team A" if db_winner == 'team1' else "Team B"
         
+        # A queued edit can still be refused on replay, so it isn't announced as final
+        queued = message == WRITE_QUEUED
         embed = discord.Embed(
-            title="✏️ Match Result Edited!",
-            description=f"**{winning_team_name}** now wins!",
+            title="⏳ Match Result Edit Queued" if queued else "✏️ Match Result Edited!",
+            description=f"**{winning_team_name}** " + ("will win once the edit is recorded." if queued else "now wins!"),
             color=ORANGE_COLOR
         )
         embed.add_field(name="Match ID", value=match_id.upper(), inline=True)
         embed.add_field(name="Updated by", value=ctx.author.display_name, inline=True)
+        if queued:
+            embed.add_field(name="⏳ Queued", value=f"{message} You'll be pinged here once it is.", inline=False)
         embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
         
         await ctx.send(embed=embed)
@@ -1632,9 +3780,20 @@ async def help_command(ctx):
         "17. `!lf information`\n"
         "   - Shows this help message\n"
     )
+    
+    extra_commands = (
+        "**Slash Commands:**\n"
+        "• `/stats`, `/headtohead`, `/teammates`, `/merge` with player name autocomplete\n\n"
+        "**Moderator Tools:**\n"
+        "• `!lf jobs` - Show the status of recent result button jobs\n"
+        "• `!lf backend` - Show database health and circuit breaker state\n"
+        "• `!lf perf` - Show command latency and database round trips\n"
+        "• `!lf profile [command|all] [runs|seconds]` - Profile live commands\n"
+    )
 
     embed.add_field(name="Commands", value=commands_text, inline=False)
     embed.add_field(name="More Commands", value=match_commands, inline=False)
+    embed.add_field(name="Extras", value=extra_commands, inline=False)
     # Add overall rating explanation
     embed.add_field(
         name="🎯 Overall Rating System",
@@ -1667,8 +3826,9 @@ async def join_queue(ctx, name=None, rank=None):
     If no name is provided, uses the Discord username.
     If no rank is provided, attempts to detect from Discord roles.
     """
-    global player_pool, queue_timer, queue_start_time
+    global player_pool
     
+    joining_as_self = name is None or name.lower() == ctx.author.display_name.lower()
     if name is None:
         name = ctx.author.display_name
     
@@ -1688,8 +3848,9 @@ async def join_queue(ctx, name=None, rank=None):
             del player_pool[player_idx]
             player_info = (name, rank, TIER_POINTS[rank])  # Removed user_id
             player_pool.append(player_info)
+            queue_snapshots.mark_dirty()
             
-            embed, view = await display_queue(ctx)
+            embed, view = await display_queue()
             await ctx.send(f"✅ Updated **{name}**'s rank to **{rank}**.", embed=embed, view=view)
             return
         else:
@@ -1702,12 +3863,7 @@ async def join_queue(ctx, name=None, rank=None):
             await ctx.send(f"❌ Invalid rank '**{rank}**'. Use `!lf information` to see valid ranks.")
             return
     else:
-        found_rank = None
-        for role in ctx.author.roles:
-            role_name = role.name
-            if role_name in ROLE_TO_RANK:
-                found_rank = ROLE_TO_RANK[role_name]
-                break
+        found_rank = guild_roles.rank_for(ctx.author, ctx.guild)
         
         if found_rank is None:
             await ctx.send("❌ No rank role detected. Please assign yourself a rank role or use `!lf join [name] [rank]` to specify your rank.")
@@ -1717,20 +3873,19 @@ async def join_queue(ctx, name=None, rank=None):
     
     player_info = (name, rank, TIER_POINTS[rank])  # Removed user_id
     player_pool.append(player_info)
+    queue_snapshots.mark_dirty()
+    if joining_as_self:
+        cache_queue_member(ctx.guild, ctx.author)
+        await register_player_alias(ctx.author.id, name)
     
     if len(player_pool) == 1:
-        queue_start_time = asyncio.get_event_loop().time()
-        if queue_timer:
-            queue_timer.cancel()
-        queue_timer = asyncio.create_task(reset_queue_timer(ctx))
+        arm_queue_timer(ctx)
     
-    embed, view = await display_queue(ctx)
+    embed, view = await display_queue()
     await ctx.send(f"✅ **{name}** joined the queue as **{rank}**.", embed=embed, view=view)
 
     if len(player_pool) >= 10:
-        if queue_timer and not queue_timer.done():
-            queue_timer.cancel()
-            queue_timer = None
+        cancel_queue_timer()
         
         teams_embed, match_id = await create_balanced_teams(player_pool[:10])
         await ctx.send("🎮 **Queue is full! Creating balanced teams:**", embed=teams_embed)
@@ -1740,11 +3895,11 @@ async def join_queue(ctx, name=None, rank=None):
             await post_to_results_channel(ctx.guild, teams_embed, match_id)
         
         del player_pool[:10]
+        queue_snapshots.mark_dirty()
         
         if player_pool:
-            queue_start_time = asyncio.get_event_loop().time()
-            queue_timer = asyncio.create_task(reset_queue_timer(ctx))
-            remaining_embed, remaining_view = await display_queue(ctx)
+            arm_queue_timer(ctx)
+            remaining_embed, remaining_view = await display_queue()
             await ctx.send("**Players remaining in queue:**", embed=remaining_embed, view=remaining_view)
         
         lobby_embed = discord.Embed(
@@ -1755,7 +3910,7 @@ async def join_queue(ctx, name=None, rank=None):
         lobby_embed.add_field(name="Queue Status", value=f"{len(player_pool)}/10 players")
         lobby_embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
         
-        lobby_view = QueueView(ctx)
+        lobby_view = component_template(QueueView())
         await ctx.message.edit(embed=lobby_embed, view=lobby_view)
 # ========================= Match Result Commands =========================
 
@@ -1784,29 +3939,221 @@ async def update_result(ctx, match_id=None, winner=None):
     # Convert to database format (team1/team2)
     db_winner = 'team1' if winner == 'teama' else 'team2'
     
-    success, message = await update_match_result(match_id.upper(), db_winner, ctx.author.display_name)
+    # Fetch the match once; update_match_result reuses it and the announcement needs its team names
+    match_data, found = await get_match_details(match_id.upper())
+    # While writes are queued the lookup may just be failing, so let the journal decide later
+    if not found and not write_journal.backlog:
+        await ctx.send("❌ Match not found")
+        return
+    
+    success, message = await update_match_result(
+        match_id.upper(), db_winner, ctx.author.display_name,
+        match=match_data if found else None, idempotency_key=f"message:{ctx.message.id}",
+        notify={'channel_id': ctx.channel.id, 'user_id': ctx.author.id}
+    )
     
     if success:
-        # Get match details for announcement
-        match_data, found = await get_match_details(match_id.upper())
         if found:
             winning_team_name = match_data['team1_name'] if db_winner == 'team1' else match_data['team2_name']
-            
-            embed = discord.Embed(
-                title="🏆 Match Result Updated!",
-                description=f"**{winning_team_name}** wins!",
-                color=GREEN_COLOR
-            )
-            embed.add_field(name="Match ID", value=match_id.upper(), inline=True)
-            embed.add_field(name="Updated by", value=ctx.author.display_name, inline=True)
-            embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
-            
-            await ctx.send(embed=embed)
         else:
-            await ctx.send(f"✅ {message}")
+            winning_team_name = "Team A" if db_winner == 'team1' else "Team B"
+        
+        # A queued result can still be refused on replay, so it isn't announced as final
+        queued = message == WRITE_QUEUED
+        embed = discord.Embed(
+            title="⏳ Match Result Queued" if queued else "🏆 Match Result Updated!",
+            description=f"**{winning_team_name}** " + ("win is waiting to be recorded." if queued else "wins!"),
+            color=ORANGE_COLOR if queued else GREEN_COLOR
+        )
+        embed.add_field(name="Match ID", value=match_id.upper(), inline=True)
+        embed.add_field(name="Updated by", value=ctx.author.display_name, inline=True)
+        if queued:
+            embed.add_field(name="⏳ Queued", value=f"{message} You'll be pinged here once it is.", inline=False)
+        embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
+        
+        await ctx.send(embed=embed)
     else:
         await ctx.send(f"❌ {message}")
 
+@bot.command(name='jobs')
+async def show_result_jobs(ctx):
+    """Show the most recent background result jobs. Usage: !lf jobs"""
+    if not await check_moderator_permission(ctx):
+        return
+    
+    if not result_jobs:
+        await ctx.send("No result jobs have run yet.")
+        return
+    
+    status_emojis = {'pending': "⏳", 'running': "🔄", 'retrying': "🔁", 'done': "✅", 'failed': "❌"}
+    job_lines = []
+    for job in reversed(list(result_jobs.values())[-10:]):
+        team_letter = "Team A" if job['winner'] == 'team1' else "Team B"
+        job_lines.append(
+            f"{status_emojis.get(job['status'], '❓')} `{job['match_id']}` {team_letter} by {job['moderator']} "
+            f"- **{job['status']}** (attempt {job['attempts']}/{RESULT_JOB_ATTEMPTS}, {job['created_at'].strftime('%H:%M:%S')})"
+            + (f"\n    ↳ {job['message']}" if job['status'] in ('retrying', 'failed') else "")
+        )
+    
+    embed = discord.Embed(title="🧾 Recent Result Jobs", description="\n".join(job_lines), color=TEAL_COLOR)
+    if write_journal.backlog:
+        embed.add_field(name="⏳ Write Journal", value=f"**{len(write_journal.backlog)}** write(s) queued for replay", inline=False)
+    embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
+    await ctx.send(embed=embed)
+
+@bot.command(name='backend')
+async def show_backend_status(ctx):
+    """Show database circuit breaker state and call counters. Usage: !lf backend"""
+    if not await check_moderator_permission(ctx):
+        return
+    
+    snapshot = backend_breaker.snapshot()
+    state_emojis = {'closed': "🟢", 'half_open': "🟡", 'open': "🔴"}
+    embed = discord.Embed(
+        title="🗄️ Database Backend",
+        description=f"{state_emojis.get(snapshot['state'], '❓')} Circuit breaker is **{snapshot['state'].replace('_', '-')}**",
+        color=TEAL_COLOR
+    )
+    embed.add_field(name="Calls", value=f"**{snapshot['calls']}** sent\n**{snapshot['rejected']}** rejected", inline=True)
+    embed.add_field(name="Failures", value=f"**{snapshot['failures']}** total\n**{snapshot['timeouts']}** timeouts\n**{snapshot['retries']}** retries", inline=True)
+    embed.add_field(name="Breaker", value=f"**{snapshot['consecutive_failures']}** consecutive failures\nOpened **{snapshot['opened']}** times", inline=True)
+    embed.add_field(name="⏳ Write Journal", value=f"**{len(write_journal.backlog)}** write(s) queued for replay", inline=False)
+    embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
+    await ctx.send(embed=embed)
+
+def format_ms(seconds):
+    """Format a duration in seconds as milliseconds for summaries."""
+    return f"{seconds * 1000:.0f}ms" if seconds >= 0.01 else f"{seconds * 1000:.1f}ms"
+
+@bot.command(name='perf')
+async def show_perf(ctx):
+    """Show latency, database round trips and errors per command. Usage: !lf perf"""
+    if not await check_moderator_permission(ctx):
+        return
+    
+    operations = metrics.histograms.get('lf_operation_seconds', {})
+    if not operations:
+        await ctx.send("No commands have been timed yet.")
+        return
+    
+    db_calls = metrics.histograms.get('lf_operation_db_calls', {})
+    errors = metrics.counters.get('lf_operation_errors_total', {})
+    op_lines = []
+    for labels, histogram in sorted(operations.items(), key=lambda item: item[1].count, reverse=True)[:12]:
+        kind, name = dict(labels)['kind'], dict(labels)['name']
+        calls = db_calls.get(labels)
+        avg_calls = calls.sum / calls.count if calls and calls.count else 0
+        op_lines.append(
+            f"`{name}`{' 🔘' if kind == 'button' else ''} **{histogram.count}** runs · "
+            f"p50 {format_ms(histogram.quantile(0.5))} · p95 {format_ms(histogram.quantile(0.95))} · "
+            f"p99 {format_ms(histogram.quantile(0.99))} · {avg_calls:.1f} db calls"
+            + (f" · ❌ {errors[labels]}" if errors.get(labels) else "")
+        )
+    
+    embed = discord.Embed(title="⏱️ Performance", description="\n".join(op_lines), color=TEAL_COLOR)
+    
+    lag = metrics.histograms.get('lf_event_loop_lag_seconds', {}).get(())
+    if lag and lag.count:
+        embed.add_field(
+            name="Event Loop Lag",
+            value=f"p50 {format_ms(lag.quantile(0.5))} · p99 {format_ms(lag.quantile(0.99))} · max {format_ms(lag.max)}",
+            inline=False
+        )
+    
+    db_series = metrics.histograms.get('lf_db_call_seconds', {})
+    if db_series:
+        db_errors = metrics.counters.get('lf_db_call_errors_total', {})
+        db_lines = []
+        for labels, histogram in sorted(db_series.items(), key=lambda item: item[1].count, reverse=True)[:6]:
+            method, table = dict(labels)['method'], dict(labels)['table']
+            db_lines.append(
+                f"`{method} {table}` **{histogram.count}** · p95 {format_ms(histogram.quantile(0.95))}"
+                + (f" · ❌ {db_errors[labels]}" if db_errors.get(labels) else "")
+            )
+        embed.add_field(name="Database Calls", value="\n".join(db_lines), inline=False)
+    
+    if loop_watchdog.recent:
+        stall_lines = [
+            f"`{stall['label']}` blocked **{format_ms(stall['seconds'])}** at `{stall['where']}` ({stall['at'].strftime('%H:%M:%S')})"
+            for stall in reversed(list(loop_watchdog.recent)[-3:])
+        ]
+        embed.add_field(name="Recent Loop Stalls", value="\n".join(stall_lines), inline=False)
+    
+    embed.set_footer(text="Buttons are marked 🔘 · Quantiles are estimated from histogram buckets")
+    await ctx.send(embed=embed)
+
+def build_profile_embed(session, path, limit=10):
+    """Summarise a finished profiling session by the functions with the most own time."""
+    profile_stats = pstats.Stats(session['profile']).stats
+    rows = sorted(profile_stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    
+    function_lines = []
+    for (filename, lineno, function), (primitive_calls, calls, own_time, cumulative_time, callers) in rows:
+        where = f"{os.path.basename(filename)}:{lineno}" if lineno else "builtin"
+        function_lines.append(
+            f"`{function[:60]}` ({where}) own **{format_ms(own_time)}** · cum {format_ms(cumulative_time)} · {calls} calls"
+        )
+    
+    if session['command']:
+        scope = f"{session['runs']} run(s) of `{session['command']}`"
+    else:
+        scope = f"everything from {session['started'].strftime('%H:%M:%S')} to {datetime.now().strftime('%H:%M:%S')}"
+    embed = discord.Embed(
+        title="🔬 Profile Finished",
+        description=f"Profiled {scope}.\n\n" + ("\n".join(function_lines) or "Nothing was recorded."),
+        color=TEAL_COLOR
+    )
+    embed.add_field(name="Saved To", value=f"`{path}`", inline=False)
+    embed.set_footer(text="Includes anything else the event loop ran while profiling was on")
+    return embed
+
+@bot.command(name='profile')
+async def profile_commands(ctx, target=None, amount=None):
+    """Profile the next N runs of a command, or all commands for T seconds. Usage: !lf profile [command|all|stop] [N|seconds]"""
+    if not await check_moderator_permission(ctx):
+        return
+    
+    session = command_profiler.session
+    if target is None or target.lower() == 'status':
+        if session is None:
+            await ctx.send("No profiling session is running. Usage: `!lf profile [command] [runs]` or `!lf profile all [seconds]`")
+        elif session['command']:
+            await ctx.send(f"🔬 Profiling `{session['command']}`: **{session['runs']}** run(s) done, **{session['remaining']}** to go.")
+        else:
+            await ctx.send(f"🔬 Profiling all commands since {session['started'].strftime('%H:%M:%S')}.")
+        return
+    
+    if target.lower() in ('stop', 'off'):
+        if session is None:
+            await ctx.send("❌ No profiling session is running.")
+            return
+        await ctx.send("🛑 Stopping the profiling session...")
+        await command_profiler.finish()
+        return
+    
+    if session is not None:
+        await ctx.send("❌ A profiling session is already running. Use `!lf profile stop` to end it first.")
+        return
+    
+    if amount is not None and not amount.isdigit():
+        await ctx.send("❌ The run count or duration must be a whole number.")
+        return
+    
+    if target.lower() == 'all':
+        seconds = min(max(int(amount or 30), 1), PROFILE_MAX_SECONDS)
+        command_profiler.start(ctx.channel, seconds=seconds)
+        await ctx.send(f"🔬 Profiling everything for **{seconds}s**. Results will be posted here.")
+        return
+    
+    command = bot.get_command(target.lower())
+    if command is None:
+        await ctx.send(f"❌ Unknown command `{target}`.")
+        return
+    
+    invocations = min(max(int(amount or 5), 1), PROFILE_MAX_INVOCATIONS)
+    command_profiler.start(ctx.channel, command.qualified_name, invocations=invocations)
+    await ctx.send(f"🔬 Profiling the next **{invocations}** run(s) of `{command.qualified_name}`. Results will be posted here.")
+
 @bot.command(name='match')
 async def show_match(ctx, match_id=None):
     """Show details of a specific match. Usage: !lf match [match_id]"""
@@ -1863,23 +4210,8 @@ async def show_match(ctx, match_id=None):
     embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
     await ctx.send(embed=embed)
 
-@bot.command(name='stats')
-async def show_stats(ctx, *, player_name=None):
-    """Show player statistics. Usage: !lf stats [player_name] or !lf stats me"""
-    if not player_name or player_name.lower() == 'me':
-        player_name = ctx.author.display_name
-        # Also try with user ID for better matching
-        player_id = ctx.author.id
-        stats, found = await get_player_stats(player_id)
-        if not found:
-            stats, found = await get_player_stats(player_name)
-    else:
-        stats, found = await get_player_stats(player_name)
-    
-    if not found:
-        await ctx.send(f"❌ No statistics found for **{player_name}**. They haven't played any tracked matches yet.")
-        return
-    
+def build_stats_embed(stats, teammates, found_teammates):
+    """Build the player statistics embed."""
     # Use the helper function to get display name
     display_name = get_display_name(stats)
     
@@ -1895,15 +4227,8 @@ async def show_stats(ctx, *, player_name=None):
      
     # Win rate with visual bar
     win_rate = stats['win_rate']
-    if win_rate >= 70:
-        wr_emoji = "🔥"
-        wr_color = "🟢"
-    elif win_rate >= 50:
-        wr_emoji = "👍"
-        wr_color = "🟡"
-    else:
-        wr_emoji = "📉"
-        wr_color = "🔴"
+    wr_emoji = get_win_rate_emoji(win_rate)
+    wr_color = "🟢" if win_rate >= 70 else "🟡" if win_rate >= 50 else "🔴"
 
     embed.add_field(
         name="Win Rate",
@@ -1914,15 +4239,7 @@ async def show_stats(ctx, *, player_name=None):
     # Overall Rating (if qualified)
     overall_rating = calculate_overall_rating(stats)
     if overall_rating is not None:
-        if overall_rating >= 70:
-            overall_emoji = "🔥"
-        elif overall_rating >= 60:
-            overall_emoji = "⭐"
-        elif overall_rating >= 50:
-            overall_emoji = "👍"
-        else:
-            overall_emoji = "📊"
-        
+        overall_emoji = get_rating_emoji(overall_rating)
         embed.add_field(
             name="Overall Rating",
             value=f"**{overall_rating}%** {overall_emoji}",
@@ -1965,7 +4282,6 @@ async def show_stats(ctx, *, player_name=None):
         )
     
     # Most played with teammates
-    teammates, found_teammates = await get_most_played_with(display_name)
     if found_teammates and teammates:
         top_teammates = teammates[:3]  # Show top 3
         teammates_text = []
@@ -1996,16 +4312,44 @@ async def show_stats(ctx, *, player_name=None):
         )
     
     embed.set_footer(text=f"Use !lf overall for full rankings | {WEBSITE_URL}")
-    await ctx.send(embed=embed)
-@bot.command(name='players')
-async def show_all_players(ctx):
-    """Show all players and their statistics."""
-    players_data, found = await get_all_player_stats('total_matches')
+    return embed
+
+@bot.hybrid_command(name='stats')
+@app_commands.describe(player_name="Player name, or 'me' for yourself")
+@app_commands.autocomplete(player_name=player_name_autocomplete)
+async def show_stats(ctx, *, player_name=None):
+    """Show player statistics. Usage: !lf stats [player_name] or !lf stats me"""
+    await ctx.defer()
+    lookup = player_name
+    if not player_name or player_name.lower() == 'me':
+        player_name = ctx.author.display_name
+        # The Discord user ID alias follows the player across renames
+        lookup = ctx.author.id if player_identity.lookup(ctx.author.id) else player_name
+    
+    # Unchanged data reuses the last rendered embed without touching the database
+    record = player_identity.lookup(lookup)
+    cache_key = ('stats', record['username'], player_data_versions.get(record['username'], 0)) if record else None
+    embed = render_cache.get(cache_key)
+    if embed is not None:
+        await ctx.send(embed=embed)
+        return
+    
+    # Any alias identifies the player, so stats and teammates load concurrently
+    (stats, found), (teammates, found_teammates) = await asyncio.gather(
+        get_player_stats(lookup),
+        get_most_played_with(lookup)
+    )
     
-    if not found or not players_data:
-        await ctx.send("❌ No player statistics found. No matches have been played yet.")
+    if not found:
+        await ctx.send(f"❌ No statistics found for **{player_name}**. They haven't played any tracked matches yet.{name_suggestion_text(player_name)}")
         return
     
+    embed = build_stats_embed(stats, teammates, found_teammates)
+    render_cache.put(cache_key, embed)
+    await ctx.send(embed=embed)
+
+def build_all_players_embed(players_data):
+    """Build the all players statistics embed."""
     embed = discord.Embed(
         title="👥 All Players Statistics",
         description=f"Total players: **{len(players_data)}**",
@@ -2023,13 +4367,7 @@ async def show_all_players(ctx):
         player_lines = []
         for player in chunk:
             # Win rate emoji
-            win_rate = player['win_rate']
-            if win_rate >= 70:
-                wr_emoji = "🔥"
-            elif win_rate >= 50:
-                wr_emoji = "👍"
-            else:
-                wr_emoji = "📉"
+            wr_emoji = get_win_rate_emoji(player['win_rate'])
             
             # Use the helper function to get display name
             display_name = get_display_name(player)
@@ -2049,12 +4387,32 @@ async def show_all_players(ctx):
         )
     
     embed.set_footer(text=f"Use !lf stats [player] for detailed stats | {WEBSITE_URL}")
+    return embed
+
+@bot.command(name='players')
+async def show_all_players(ctx):
+    """Show all players and their statistics."""
+    cache_key = ('players', stats_data_version)
+    embed = render_cache.get(cache_key)
+    if embed is None:
+        players_data, found = await get_all_player_stats('total_matches')
+        
+        if not found or not players_data:
+            await ctx.send("❌ No player statistics found. No matches have been played yet.")
+            return
+        
+        embed = build_all_players_embed(players_data)
+        render_cache.put(cache_key, embed)
+    
     await ctx.send(embed=embed)
 
 
-@bot.command(name='headtohead', aliases=['h2h', 'vs'])
+@bot.hybrid_command(name='headtohead', aliases=['h2h', 'vs'])
+@app_commands.describe(player1="First player, or 'me'", player2="Second player, or 'me'")
+@app_commands.autocomplete(player1=player_name_autocomplete, player2=player_name_autocomplete)
 async def head_to_head(ctx, player1=None, player2=None):
     """Show head-to-head statistics between two players. Usage: !lf headtohead [player1] [player2]"""
+    await ctx.defer()
     if not player1 or not player2:
         await ctx.send("❌ Usage: `!lf headtohead [player1] [player2]`\nExample: `!lf headtohead PlayerA PlayerB`")
         return
@@ -2072,7 +4430,7 @@ async def head_to_head(ctx, player1=None, player2=None):
     h2h_stats, found = await get_head_to_head_stats(player1, player2)
     
     if not found or h2h_stats['total_matches'] == 0:
-        await ctx.send(f"❌ No head-to-head matches found between **{player1}** and **{player2}**.")
+        await ctx.send(f"❌ No head-to-head matches found between **{player1}** and **{player2}**.{name_suggestion_text(player1)}{name_suggestion_text(player2)}")
         return
     
     embed = discord.Embed(
@@ -2129,38 +4487,8 @@ async def head_to_head(ctx, player1=None, player2=None):
     await ctx.send(embed=embed)
 
 
-@bot.command(name='leaderboard', aliases=['lb', 'top'])
-async def show_leaderboard(ctx, leaderboard_type='matches'):
-    """Show leaderboards by different criteria. Usage: !lf leaderboard [matches/wins/losses/winrate/overall]"""
-    
-    # Handle overall leaderboard
-    if leaderboard_type.lower() in ['overall', 'or', 'topoverall']:
-        await show_overall_leaderboard(ctx)
-        return
-    
-    # Map user input to database columns
-    type_mapping = {
-        'matches': 'total_matches',
-        'wins': 'wins', 
-        'losses': 'losses',
-        'winrate': 'win_rate',
-        'wr': 'win_rate'
-    }
-    
-    if leaderboard_type.lower() not in type_mapping:
-        await ctx.send("❌ Invalid leaderboard type. Use: `matches`, `wins`, `losses`, `winrate`, or `overall`")
-        return
-    
-    order_by = type_mapping[leaderboard_type.lower()]
-    min_games = 3 if leaderboard_type.lower() in ['winrate', 'wr'] else 1
-    
-    leaderboard_data, found = await get_leaderboard(order_by, min_games)
-    
-    if not found or not leaderboard_data:
-        min_text = f" (min {min_games} games)" if min_games > 1 else ""
-        await ctx.send(f"❌ No leaderboard data found{min_text}.")
-        return
-    
+def build_leaderboard_embed(leaderboard_data, order_by, min_games):
+    """Build a leaderboard embed for one stats column."""
     # Set title based on type
     titles = {
         'total_matches': 'Most Matches Played',
@@ -2179,23 +4507,10 @@ async def show_leaderboard(ctx, leaderboard_type='matches'):
     leaderboard_lines = []
     for idx, player in enumerate(leaderboard_data):
         # Position emoji
-        if idx == 0:
-            position = "🥇"
-        elif idx == 1:
-            position = "🥈"
-        elif idx == 2:
-            position = "🥉"
-        else:
-            position = f"`{idx+1}.`"
+        position = get_position_emoji(idx)
         
         # Win rate emoji
-        win_rate = player['win_rate']
-        if win_rate >= 70:
-            wr_emoji = "🔥"
-        elif win_rate >= 50:
-            wr_emoji = "👍"
-        else:
-            wr_emoji = "📉"
+        wr_emoji = get_win_rate_emoji(player['win_rate'])
         
         # Recent form
         recent_form = player.get('recent_form', '')
@@ -2239,9 +4554,51 @@ async def show_leaderboard(ctx, leaderboard_type='matches'):
         )
     
     embed.set_footer(text=f"Use !lf overall for skill rankings | {WEBSITE_URL}")
+    return embed
+
+@bot.command(name='leaderboard', aliases=['lb', 'top'])
+async def show_leaderboard(ctx, leaderboard_type='matches'):
+    """Show leaderboards by different criteria. Usage: !lf leaderboard [matches/wins/losses/winrate/overall]"""
+    
+    # Handle overall leaderboard
+    if leaderboard_type.lower() in ['overall', 'or', 'topoverall']:
+        await show_overall_leaderboard(ctx)
+        return
+    
+    # Map user input to database columns
+    type_mapping = {
+        'matches': 'total_matches',
+        'wins': 'wins', 
+        'losses': 'losses',
+        'winrate': 'win_rate',
+        'wr': 'win_rate'
+    }
+    
+    if leaderboard_type.lower() not in type_mapping:
+        await ctx.send("❌ Invalid leaderboard type. Use: `matches`, `wins`, `losses`, `winrate`, or `overall`")
+        return
+    
+    order_by = type_mapping[leaderboard_type.lower()]
+    min_games = 3 if leaderboard_type.lower() in ['winrate', 'wr'] else 1
+    
+    cache_key = ('leaderboard', order_by, min_games, stats_data_version)
+    embed = render_cache.get(cache_key)
+    if embed is None:
+        leaderboard_data, found = await get_leaderboard(order_by, min_games)
+        
+        if not found or not leaderboard_data:
+            min_text = f" (min {min_games} games)" if min_games > 1 else ""
+            await ctx.send(f"❌ No leaderboard data found{min_text}.")
+            return
+        
+        embed = build_leaderboard_embed(leaderboard_data, order_by, min_games)
+        render_cache.put(cache_key, embed)
+    
     await ctx.send(embed=embed)
 
-@bot.command(name='merge')
+@bot.hybrid_command(name='merge')
+@app_commands.describe(old_player="Account to merge away", new_player="Account to keep")
+@app_commands.autocomplete(old_player=player_name_autocomplete, new_player=player_name_autocomplete)
 async def merge_players(ctx, old_player=None, new_player=None):
     """Merge two player accounts. Usage: !lf merge [old_player] [new_player]"""
     if not await check_moderator_permission(ctx):
@@ -2251,6 +4608,7 @@ async def merge_players(ctx, old_player=None, new_player=None):
         await ctx.send("❌ Usage: `!lf merge [old_player] [new_player]`\nExample: `!lf merge oldname newname`")
         return
     
+    await ctx.defer()
     success, message = await merge_player_accounts(old_player, new_player)
     
     if success:
@@ -2263,49 +4621,166 @@ async def merge_players(ctx, old_player=None, new_player=None):
         embed.set_footer(text=f"Visit {WEBSITE_URL} for more League of Flex features!")
         await ctx.send(embed=embed)
     else:
-        await ctx.send(f"❌ {message}")
+        await ctx.send(f"❌ {message}{name_suggestion_text(old_player)}")
+
+
+# ========================= Message Triggers =========================
+
+TRIGGERS_PATH = os.getenv('TRIGGERS_PATH')  # optional JSON file with per-guild trigger settings
+
+# Used for guilds without their own entry. "channels" lists channel IDs or
+# names to listen in (empty means everywhere); cooldowns are per channel.
+DEFAULT_TRIGGER_CONFIG = {
+    'channels': [],
+    'triggers': [
+        {
+            'name': 'customs',
+            'phrases': ["WHERE ARE CUSTOMS", "WHERE THE CUSTOMS", "WHERE ARE THE CUSTOMS", "WHERE CUSTOMS"],
+            'response': "Bro, just type in '!lf queue' to start a custom lobby and invite your friends. Also, please don't write that anymore; I have work to do as well.",
+            'cooldown': 30
+        },
+        # {
+        #     'name': 'tournament',
+        #     'phrases': ["DRILLER", "DREAMER DRILLER", "DREAMER"],
+        #     # A list of responses picks one at random
+        #     'response': [
+        #         # Main tournament intro
+        #         "🏆 **JULY 2025 CUSTOMS LEAGUE IS LIVE!** 🏆\n With 1350 RP and Legendary Skins on the line! Time to prove who's the best! 📈",
+        #     ],
+        #     'cooldown': 300
+        # },
+    ]
+}
+
+class TriggerEngine:
+    """One guild's phrase triggers, compiled into a single case-insensitive regex.
+    
+    The pattern is a lookahead over every phrase, longest first, so one pass
+    finds the longest phrase starting at each position. Any shorter phrase
+    matching at the same position is a prefix of it, so each phrase also
+    carries the triggers of its prefixes and no match is lost. Each phrase
+    has its own capture group, so a match maps to its triggers by group
+    number instead of by matched text, which case-insensitive matching and
+    casefold() don't always agree on (e.g. "İ").
+    """
+    
+    def __init__(self, config):
+        self.channels = {str(channel).casefold() for channel in config.get('channels', [])}
+        self.triggers = {trigger['name']: trigger for trigger in config.get('triggers', [])}
+        phrases = {}  # casefolded phrase -> names of triggers it fires
+        for trigger in self.triggers.values():
+            for phrase in trigger['phrases']:
+                phrases.setdefault(phrase.casefold(), set()).add(trigger['name'])
+        ordered = sorted(phrases, key=len, reverse=True)
+        # Group number -> triggers of that phrase and of every phrase that is a prefix of it
+        self.group_triggers = [set()] + [
+            set().union(*(names for other, names in phrases.items() if phrase.startswith(other)))
+            for phrase in ordered
+        ]
+        alternatives = '|'.join(f"({re.escape(phrase)})" for phrase in ordered)
+        self.pattern = re.compile(f"(?=(?:{alternatives}))", re.IGNORECASE) if ordered else None
+        self.last_fired = {}  # (trigger name, channel id) -> time.monotonic()
+    
+    def listens_in(self, channel):
+        if not self.channels:
+            return True
+        return str(channel.id) in self.channels or str(getattr(channel, 'name', '')).casefold() in self.channels
+    
+    def match(self, content):
+        """Names of the triggers whose phrases appear in `content`."""
+        fired = set()
+        if self.pattern is not None:
+            for found in self.pattern.finditer(content):
+                fired |= self.group_triggers[found.lastindex]
+        return fired
+    
+    def responses(self, message):
+        """Responses for the triggers this message fires that are off cooldown in its channel."""
+        if self.pattern is None or not self.listens_in(message.channel):
+            return []
+        now = time.monotonic()
+        responses = []
+        for name in sorted(self.match(message.content)):
+            trigger = self.triggers[name]
+            key = (name, message.channel.id)
+            if now - self.last_fired.get(key, float('-inf')) < trigger.get('cooldown', 0):
+                continue
+            self.last_fired[key] = now
+            response = trigger['response']
+            responses.append(random.choice(response) if isinstance(response, list) else response)
+        return responses
+
+def load_trigger_engines(path=TRIGGERS_PATH):
+    """Compile the default trigger settings and any per-guild overrides from `path`."""
+    configs = {'default': DEFAULT_TRIGGER_CONFIG}
+    if path:
+        try:
+            with open(path, encoding='utf-8') as f:
+                configs.update(json.load(f))
+        except Exception as e:
+            print(f"Error loading triggers from {path}: {e}")
+    return {str(guild_id): TriggerEngine(config) for guild_id, config in configs.items()}
+
+trigger_engines = load_trigger_engines()
 
+def trigger_engine_for(guild):
+    engine = trigger_engines.get(str(guild.id)) if guild is not None else None
+    return engine if engine is not None else trigger_engines['default']
 
 @bot.event
 async def on_message(message):
-    """Listen for specific phrases and respond with a custom message."""
+    """Listen for trigger phrases and respond with a custom message."""
     # Don't respond to bot messages to avoid loops
     if message.author.bot:
         return
-        
-    content = message.content.upper()
-    customs_phrases = ["WHERE ARE CUSTOMS", "WHERE THE CUSTOMS", "WHERE ARE THE CUSTOMS", "WHERE CUSTOMS"]
-    # name_phrases = ["DRILLER", "DREAMER DRILLER", "DREAMER"]
-    
-    # tournament_announcements = [
-    #     # Main tournament intro
-    #     "🏆 **JULY 2025 CUSTOMS LEAGUE IS LIVE!** 🏆\n With 1350 RP and Legendary Skins on the line! Time to prove who's the best! 📈",
-    # ]
     
-    # Check for customs phrases
-    if any(phrase in content for phrase in customs_phrases):
-        response = "Bro, just type in '!lf queue' to start a custom lobby and invite your friends. Also, please don't write that anymore; I have work to do as well."
+    for response in trigger_engine_for(message.guild).responses(message):
         await message.channel.send(response)
     
-    # # Check for driller/name phrases and respond with random tournament announcement
-    # if any(phrase in content for phrase in name_phrases):
-    #     # Randomly select a tournament announcement chunk
-    #     random_announcement = random.choice(tournament_announcements)
-    #     await message.channel.send(random_announcement)
-    
     # Process commands - this is necessary so that normal commands still work
     await bot.process_commands(message)
 
-@bot.command(name='teammates')
+@bot.event
+async def on_guild_join(guild):
+    guild_roles.build(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    guild_roles.forget(guild)
+
+@bot.event
+async def on_guild_role_create(role):
+    guild_roles.build(role.guild)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    """Renames can turn a role into a rank or moderator role, or stop it being one."""
+    if before.name != after.name or before.position != after.position:
+        guild_roles.build(after.guild)
+
+@bot.event
+async def on_guild_role_delete(role):
+    guild_roles.build(role.guild)
+
+@bot.event
+async def on_member_update(before, after):
+    """Record display name changes as aliases of the member's player identity."""
+    if before.display_name != after.display_name:
+        await register_player_alias(after.id, after.display_name, create=False)
+
+@bot.hybrid_command(name='teammates')
+@app_commands.describe(player_name="Player name, or 'me' for yourself")
+@app_commands.autocomplete(player_name=player_name_autocomplete)
 async def show_teammates(ctx, *, player_name=None):
     """Show who a player has played with most often. Usage: !lf teammates [player_name]"""
+    await ctx.defer()
     if not player_name or player_name.lower() == 'me':
         player_name = ctx.author.display_name
     
     teammates, found = await get_most_played_with(player_name)
     
     if not found or not teammates:
-        await ctx.send(f"❌ No teammate data found for **{player_name}**.")
+        await ctx.send(f"❌ No teammate data found for **{player_name}**.{name_suggestion_text(player_name)}")
         return
     
     embed = discord.Embed(
@@ -2317,14 +4792,7 @@ async def show_teammates(ctx, *, player_name=None):
     # Top teammates
     teammate_lines = []
     for idx, (teammate, count) in enumerate(teammates):
-        if idx == 0:
-            position = "🥇"
-        elif idx == 1:
-            position = "🥈"
-        elif idx == 2:
-            position = "🥉"
-        else:
-            position = f"`{idx+1}.`"
+        position = get_position_emoji(idx)
         
         teammate_lines.append(f"{position} **{teammate}** - {count} games together")
     
@@ -2745,6 +5213,12 @@ async def riot_esports(ctx, region='WORLD'):
     embed.set_footer(text=f"Esports data from official sources | {WEBSITE_URL}")
     await ctx.send(embed=embed)
 
-# Run the bot
-bot.run(DISCORD_TOKEN)
-    
\ No newline at end of file
+# Run the bot (importing the module, e.g. from benchmarks/, only sets it up)
+if __name__ == "__main__":
+    bot.run(DISCORD_TOKEN)
+    queue_snapshots.flush_now()
+    if match_store.ready and player_identity.loaded:
+        try:
+            write_warm_cache(capture_warm_cache())
+        except Exception as e:
+            print(f"Error saving warm cache: {e}")